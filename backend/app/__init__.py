@@ -12,6 +12,15 @@ db = SQLAlchemy()
 bcrypt = Bcrypt()
 login_manager = LoginManager()
 
+# Extensions that import db must come after it is defined
+from .cache import metrics_cache
+from .passwords import password_hasher
+from .user_cache import user_cache
+from .api_tokens import api_tokens
+from .pool import engine_options, pool_monitor
+from .timing import request_timing
+from .parallel import parallel_queries
+
 
 def create_app(config_overrides=None):
     app = Flask(__name__)
@@ -27,11 +36,12 @@ def create_app(config_overrides=None):
 
     if config_overrides:
         app.config.update(config_overrides)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
 
     CORS(app, 
         origins=["http://localhost:5173", "https://dora-ui.onrender.com"], 
         supports_credentials=True,
-        expose_headers=["Set-Cookie"],
+        expose_headers=["Set-Cookie", "X-Next-Cursor", "ETag", "Server-Timing"],
         allow_headers=["Content-Type", "Authorization"])
 
     @event.listens_for(Engine, "connect")
@@ -42,7 +52,14 @@ def create_app(config_overrides=None):
             cursor.close()
 
     db.init_app(app)
+    pool_monitor.init_app(app)
+    request_timing.init_app(app)
+    parallel_queries.init_app(app)
     bcrypt.init_app(app)
+    metrics_cache.init_app(app)
+    password_hasher.init_app(app)
+    user_cache.init_app(app)
+    api_tokens.init_app(app)
     login_manager.init_app(app)
     
     login_manager.login_view = None
@@ -53,15 +70,27 @@ def create_app(config_overrides=None):
     
     @login_manager.user_loader
     def load_user(user_id):
-        from .models import User
-        from . import db
-        return db.session.get(User, int(user_id))
+        return user_cache.load(int(user_id))
+
+    @login_manager.request_loader
+    def load_user_from_token(request):
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            return None
+        return api_tokens.verify(token.strip())
 
-    from .routes import auth, releases, metrics, users
+    from .routes import auth, releases, incidents, metrics, users, diagnostics
     app.register_blueprint(auth.bp)
     app.register_blueprint(releases.bp)
+    app.register_blueprint(incidents.bp)
     app.register_blueprint(metrics.bp)
     app.register_blueprint(users.bp)
+    app.register_blueprint(diagnostics.bp)
+
+    from .migrations import schema_cli
+    from .rollup import rollup_cli
+    app.cli.add_command(schema_cli)
+    app.cli.add_command(rollup_cli)
 
     @app.after_request
     def apply_security_headers(response):
@@ -0,0 +1,419 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import Integer, and_, case, cast, false, func, or_, select, true
+from . import db
+from .models import Commit, Release, Incident
+from .parallel import parallel_queries
+from .quantiles import P2Quantile, QuantileSummary
+from .utils import (
+    RESTORE_QUANTILES,
+    DayRange,
+    build_metrics,
+    change_failure_rate_from_stats,
+    get_metric_windows,
+    lead_time_hours,
+    restore_key,
+    set_lead_time_stats,
+    set_restore_percentiles,
+    time_to_restore_from_stats
+)
+
+# Commit rows are streamed into quantile estimators this many at a time
+LEAD_TIME_BATCH_SIZE = 10000
+
+
+def seconds_between(start_column, end_column):
+    """Dialect-aware SQL expression for (end - start) in seconds"""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        # julianday() is a float day count; rounding drops its sub-millisecond error
+        return func.round((func.julianday(end_column) - func.julianday(start_column)) * 86400, 3)
+    return func.extract('epoch', end_column - start_column)
+
+
+def in_days(column, days: Optional[DayRange]):
+    if days is None:
+        return false()
+    first_day, last_day = days
+    conditions = []
+    if first_day:
+        conditions.append(column >= first_day)
+    if last_day:
+        conditions.append(column <= last_day)
+    return and_(true(), *conditions)
+
+
+def _span(current: DayRange, previous: Optional[DayRange]) -> DayRange:
+    """Smallest day range covering both periods, used to narrow the scan"""
+    if previous is None:
+        return current
+    return previous[0], current[1]
+
+
+def _filter_platform_and_span(stmt, platform, current, previous):
+    if platform:
+        stmt = stmt.where(Release.platform == platform)
+    first_day, last_day = _span(current, previous)
+    if first_day:
+        stmt = stmt.where(Release.rollout_date >= first_day)
+    if last_day:
+        stmt = stmt.where(Release.rollout_date <= last_day)
+    return stmt
+
+
+def release_stats_query(platform: Optional[str], current: DayRange, previous: Optional[DayRange]):
+    """Single-row aggregate of deploy counts, failures and first/last rollout day for both periods"""
+    failed = or_(Release.is_successful.is_(False), Release.is_successful.is_(None))
+    columns = []
+    for prefix, days in (('cur', current), ('prev', previous)):
+        in_period = in_days(Release.rollout_date, days)
+        columns += [
+            func.count(case((in_period, 1))).label(f'{prefix}_deploys'),
+            func.count(case((and_(in_period, failed), 1))).label(f'{prefix}_failed'),
+            func.min(case((in_period, Release.rollout_date))).label(f'{prefix}_first_date'),
+            func.max(case((in_period, Release.rollout_date))).label(f'{prefix}_last_date'),
+        ]
+    return _filter_platform_and_span(select(*columns), platform, current, previous)
+
+
+def incident_in_current(current: DayRange, start: Optional[datetime], end: Optional[datetime]):
+    """Current-period incidents: on a release in `current` and, when given, inside [start, end]"""
+    in_current = in_days(Release.rollout_date, current)
+    if start:
+        in_current = and_(in_current, Incident.start_time >= start)
+    if end:
+        in_current = and_(in_current, Incident.end_time <= end)
+    return in_current
+
+
+def incident_stats_query(platform: Optional[str], current: DayRange, previous: Optional[DayRange],
+                         start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """Single-row aggregate of incident counts and restore hours for both periods.
+
+    Current-period incidents must also fall inside [start, end]; previous-period
+    incidents are matched on their release only, as in the in-memory path.
+    """
+    has_duration = Incident.duration_seconds.isnot(None)
+    columns = []
+    for prefix, in_period in (('cur', incident_in_current(current, start, end)),
+                              ('prev', in_days(Release.rollout_date, previous))):
+        restorable = and_(in_period, has_duration)
+        columns += [
+            func.count(case((in_period, 1))).label(f'{prefix}_incidents'),
+            func.sum(case((restorable, Incident.duration_seconds), else_=0)).label(f'{prefix}_restore_seconds'),
+            func.count(case((restorable, 1))).label(f'{prefix}_restore_count'),
+        ]
+    stmt = select(*columns).select_from(Incident).join(Release, Incident.release_id == Release.id)
+    return _filter_platform_and_span(stmt, platform, current, previous)
+
+
+def restore_percentiles_query(platform: Optional[str], current: DayRange, start: Optional[datetime] = None,
+                              end: Optional[datetime] = None, by_platform: bool = False):
+    """restore_p50/p90/p99 seconds of the current period's restored incidents, one row (per platform).
+
+    PostgreSQL computes them with percentile_cont. Other databases rank the
+    durations with window functions and interpolate between neighbouring
+    ranks the same way, so no incident rows are loaded either way.
+    """
+    duration = Incident.duration_seconds
+    conditions = [incident_in_current(current, start, end), duration.isnot(None)]
+    if platform:
+        conditions.append(Release.platform == platform)
+    group = [Release.platform] if by_platform else []
+
+    if db.session.get_bind().dialect.name == 'postgresql':
+        columns = [func.percentile_cont(q).within_group(duration).label(restore_key(q)) for q in RESTORE_QUANTILES]
+        return select(*columns, *group).select_from(Incident).join(Release, Incident.release_id == Release.id) \
+            .where(*conditions).group_by(*group)
+
+    window = {'partition_by': Release.platform} if by_platform else {}
+    ranked = select(
+        duration.label('duration'), *group,
+        (func.row_number().over(order_by=duration, **window) - 1).label('position'),
+        func.count().over(**window).label('total'),
+        func.lead(duration).over(order_by=duration, **window).label('next_duration'),
+    ).select_from(Incident).join(Release, Incident.release_id == Release.id).where(*conditions).subquery()
+    columns = []
+    for q in RESTORE_QUANTILES:
+        rank = q * (ranked.c.total - 1)
+        lower = cast(rank, Integer)
+        following = func.coalesce(ranked.c.next_duration, ranked.c.duration)
+        columns.append(func.max(case((ranked.c.position == lower,
+                                      ranked.c.duration + (rank - lower) * (following - ranked.c.duration))))
+                       .label(restore_key(q)))
+    group = [ranked.c.platform] if by_platform else []
+    return select(*columns, *group).group_by(*group)
+
+
+def add_restore_percentiles(stats: dict, platform: Optional[str], current: DayRange,
+                            start: Optional[datetime] = None, end: Optional[datetime] = None) -> None:
+    set_restore_percentiles(stats, db.session.execute(
+        restore_percentiles_query(platform, current, start, end)).mappings().one())
+
+
+def commit_lead_time_query(platform: Optional[str], current: DayRange, previous: Optional[DayRange]):
+    """(rollout_date, committed_at) of every commit shipped by a successful release in either period"""
+    stmt = select(Release.rollout_date, Commit.committed_at).join(Commit, Commit.release_id == Release.id) \
+        .where(Release.is_successful.is_(True))
+    return _filter_platform_and_span(stmt, platform, current, previous)
+
+
+def stream_commit_lead_times(stmt, executor=None):
+    """Yield (rollout_date, lead time hours, *extra columns) from a commit query without materializing the result"""
+    executor = executor or db.session
+    result = executor.execute(stmt.execution_options(yield_per=LEAD_TIME_BATCH_SIZE))
+    try:
+        for rollout_date, committed_at, *extra in result:
+            yield (rollout_date, lead_time_hours(rollout_date, committed_at), *extra)
+    finally:
+        result.close()
+
+
+def split_lead_times(stmt, current: DayRange, executor=None):
+    """(current, previous) QuantileSummary of lead times streamed from a commit_lead_time_query statement"""
+    current_lead_times, previous_lead_times = QuantileSummary(), QuantileSummary()
+    first_day, last_day = current
+    for day, hours in stream_commit_lead_times(stmt, executor):
+        if (first_day is None or day >= first_day) and (last_day is None or day <= last_day):
+            current_lead_times.add(hours)
+        else:
+            previous_lead_times.add(hours)
+    return current_lead_times, previous_lead_times
+
+
+def set_window_lead_times(current_stats: dict, previous_stats: Optional[dict], summaries) -> None:
+    current_lead_times, previous_lead_times = summaries
+    set_lead_time_stats(current_stats, current_lead_times)
+    if previous_stats is not None:
+        set_lead_time_stats(previous_stats, previous_lead_times)
+
+
+def add_lead_time_stats(current_stats: dict, previous_stats: Optional[dict], platform: Optional[str],
+                        current: DayRange, previous: Optional[DayRange]) -> None:
+    """Fill lead_time_p50/p90/count of both periods from one streamed pass over their commits"""
+    set_window_lead_times(current_stats, previous_stats,
+                          split_lead_times(commit_lead_time_query(platform, current, previous), current))
+
+
+# Stands in for the incident aggregate row of a platform that has no incidents
+NO_INCIDENTS = {f'{prefix}_{name}': None for prefix in ('cur', 'prev')
+                for name in ('incidents', 'restore_seconds', 'restore_count')}
+
+
+def _period_stats(release_row, incident_row, prefix: str) -> dict:
+    return {
+        'deploys': release_row[f'{prefix}_deploys'] or 0,
+        'failed': release_row[f'{prefix}_failed'] or 0,
+        'first_date': release_row[f'{prefix}_first_date'],
+        'last_date': release_row[f'{prefix}_last_date'],
+        'incidents': incident_row[f'{prefix}_incidents'] or 0,
+        'restore_hours': float(incident_row[f'{prefix}_restore_seconds'] or 0) / 3600,
+        'restore_count': incident_row[f'{prefix}_restore_count'] or 0,
+        'restore_p50': 0.0,
+        'restore_p90': 0.0,
+        'restore_p99': 0.0,
+        'lead_time_p50': 0.0,
+        'lead_time_p90': 0.0,
+        'lead_time_count': 0,
+    }
+
+
+def get_window_stats(platform: Optional[str], start: Optional[datetime], end: Optional[datetime]):
+    """Aggregate current and previous period stats: release and incident aggregates plus a commit stream"""
+    current, previous = get_metric_windows(start, end)
+    # Built on the request thread: the builders read the session's dialect, which worker threads must not touch
+    release_stmt = release_stats_query(platform, current, previous)
+    incident_stmt = incident_stats_query(platform, current, previous, start, end)
+    restore_stmt = restore_percentiles_query(platform, current, start, end)
+    commit_stmt = commit_lead_time_query(platform, current, previous)
+    release_row, incident_row, restore_row, lead_times = parallel_queries.run(
+        lambda executor: executor.execute(release_stmt).mappings().one(),
+        lambda executor: executor.execute(incident_stmt).mappings().one(),
+        lambda executor: executor.execute(restore_stmt).mappings().one(),
+        lambda executor: split_lead_times(commit_stmt, current, executor))
+    current_stats = _period_stats(release_row, incident_row, 'cur')
+    previous_stats = _period_stats(release_row, incident_row, 'prev') if previous else None
+    set_restore_percentiles(current_stats, restore_row)
+    set_window_lead_times(current_stats, previous_stats, lead_times)
+    return current_stats, previous_stats
+
+
+def get_window_stats_by_platform(platforms: Optional[List[str]], start: Optional[datetime],
+                                 end: Optional[datetime]) -> Dict[str, tuple]:
+    """{platform: (current_stats, previous_stats)} from the same aggregates grouped by platform.
+
+    Releases, incidents and restore percentiles take one GROUP BY statement each and commits one
+    streamed pass, however many platforms there are. Platforms without
+    releases in either period are left out.
+    """
+    current, previous = get_metric_windows(start, end)
+
+    def with_platform(stmt):
+        stmt = stmt.add_columns(Release.platform)
+        return stmt.where(Release.platform.in_(platforms)) if platforms else stmt
+
+    release_stmt = with_platform(release_stats_query(None, current, previous)).group_by(Release.platform)
+    incident_stmt = with_platform(incident_stats_query(None, current, previous, start, end)) \
+        .group_by(Release.platform)
+    restore_stmt = restore_percentiles_query(None, current, start, end, by_platform=True)
+    commit_stmt = with_platform(commit_lead_time_query(None, current, previous))
+
+    def platform_lead_times(executor):
+        lead_times = {}
+        first_day, last_day = current
+        for day, hours, platform in stream_commit_lead_times(commit_stmt, executor):
+            in_current = (first_day is None or day >= first_day) and (last_day is None or day <= last_day)
+            if platform not in lead_times:
+                lead_times[platform] = (QuantileSummary(), QuantileSummary())
+            lead_times[platform][0 if in_current else 1].add(hours)
+        return lead_times
+
+    release_rows, incident_rows, restore_rows, lead_times = parallel_queries.run(
+        lambda executor: {row['platform']: row for row in executor.execute(release_stmt).mappings()},
+        lambda executor: {row['platform']: row for row in executor.execute(incident_stmt).mappings()},
+        lambda executor: {row['platform']: row for row in executor.execute(restore_stmt).mappings()
+                          if not platforms or row['platform'] in platforms},
+        platform_lead_times)
+
+    stats = {}
+    for platform, release_row in release_rows.items():
+        if not release_row['cur_deploys'] and not (previous and release_row['prev_deploys']):
+            continue
+        incident_row = incident_rows.get(platform, NO_INCIDENTS)
+        current_stats = _period_stats(release_row, incident_row, 'cur')
+        previous_stats = _period_stats(release_row, incident_row, 'prev') if previous else None
+        set_restore_percentiles(current_stats, restore_rows.get(platform, {}))
+        current_lead_times, previous_lead_times = lead_times.get(platform, (QuantileSummary(), QuantileSummary()))
+        set_lead_time_stats(current_stats, current_lead_times)
+        if previous_stats is not None:
+            set_lead_time_stats(previous_stats, previous_lead_times)
+        stats[platform] = (current_stats, previous_stats)
+    return stats
+
+
+def calculate_metrics_by_platform(platforms: Optional[List[str]], start: Optional[datetime],
+                                  end: Optional[datetime]) -> Dict[str, dict]:
+    """{platform: DORA metrics} for every platform with releases, or only the requested ones"""
+    return {platform: build_metrics(current, previous)
+            for platform, (current, previous) in sorted(get_window_stats_by_platform(platforms, start, end).items())}
+
+
+def calculate_metrics_sql(platform: Optional[str], start: Optional[datetime], end: Optional[datetime]) -> Optional[dict]:
+    """DORA metrics computed with SQL aggregates; None when no releases match"""
+    current, previous = get_window_stats(platform, start, end)
+    if not current['deploys'] and not (previous and previous['deploys']):
+        return None
+    return build_metrics(current, previous)
+
+
+GRANULARITIES = ('day', 'week', 'month')
+
+
+def bucket_expression(column, granularity: str):
+    """SQL expression mapping a date column to its bucket start as 'YYYY-MM-DD'"""
+    if db.session.get_bind().dialect.name == 'sqlite':
+        modifiers = {'day': (), 'week': ('weekday 0', '-6 days'), 'month': ('start of month',)}
+        return func.date(column, *modifiers[granularity])
+    return func.to_char(func.date_trunc(granularity, column), 'YYYY-MM-DD')
+
+
+def bucket_start(day: date, granularity: str) -> date:
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(day: date, granularity: str) -> date:
+    if granularity == 'week':
+        return day + timedelta(days=7)
+    if granularity == 'month':
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def release_history_query(platform: Optional[str], days: DayRange, granularity: str):
+    bucket = bucket_expression(Release.rollout_date, granularity).label('bucket')
+    failed = or_(Release.is_successful.is_(False), Release.is_successful.is_(None))
+    stmt = select(
+        bucket,
+        func.count(Release.id).label('deploys'),
+        func.count(case((failed, 1))).label('failed'),
+        func.min(Release.rollout_date).label('first_date'),
+        func.max(Release.rollout_date).label('last_date'),
+    ).group_by(bucket)
+    return _filter_platform_and_span(stmt, platform, days, None)
+
+
+def incident_history_query(platform: Optional[str], days: DayRange, granularity: str,
+                           start: Optional[datetime] = None, end: Optional[datetime] = None):
+    bucket = bucket_expression(Release.rollout_date, granularity).label('bucket')
+    stmt = select(
+        bucket,
+        (func.sum(Incident.duration_seconds) / 3600).label('restore_hours'),
+        func.count(Incident.id).label('restore_count'),
+    ).select_from(Incident).join(Release, Incident.release_id == Release.id).where(
+        Incident.duration_seconds.isnot(None)).group_by(bucket)
+    if start:
+        stmt = stmt.where(Incident.start_time >= start)
+    if end:
+        stmt = stmt.where(Incident.end_time <= end)
+    return _filter_platform_and_span(stmt, platform, days, None)
+
+
+def get_metric_history(platform: Optional[str], start: Optional[datetime], end: Optional[datetime],
+                       granularity: str = 'day') -> dict:
+    """Per-bucket DORA metrics over the current period as dense, aligned arrays.
+
+    Releases and incidents are each aggregated with one grouped query. Buckets
+    are labelled by their first day (weeks start on Monday) and clipped to the
+    requested range when computing deployments per day.
+    """
+    (first_day, last_day), _ = get_metric_windows(start, end)
+
+    def bucket_lead_times(executor, days):
+        lead_times = {}
+        for day, hours in stream_commit_lead_times(commit_lead_time_query(platform, days, None), executor):
+            key = bucket_start(day, granularity).isoformat()
+            if key not in lead_times:
+                lead_times[key] = P2Quantile(0.5)
+            lead_times[key].add(hours)
+        return lead_times
+
+    release_stmt = release_history_query(platform, (first_day, last_day), granularity)
+    incident_stmt = incident_history_query(platform, (first_day, last_day), granularity, start, end)
+    tasks = [
+        lambda executor: {row.bucket: row for row in executor.execute(release_stmt)},
+        lambda executor: {row.bucket: row for row in executor.execute(incident_stmt)},
+    ]
+    # An open-ended range takes its bounds from the releases, so commits can only be read alongside a closed one
+    bounded = first_day is not None and last_day is not None
+    if bounded:
+        tasks.append(lambda executor: bucket_lead_times(executor, (first_day, last_day)))
+    releases, incidents, *lead_times = parallel_queries.run(*tasks)
+
+    history = {'granularity': granularity, 'buckets': [], 'deployment_frequency': [],
+               'lead_time': [], 'change_failure_rate': [], 'time_to_restore': []}
+    if releases:
+        first_day = first_day or min(row.first_date for row in releases.values())
+        last_day = last_day or max(row.last_date for row in releases.values())
+    if not releases or first_day > last_day:
+        return history
+
+    lead_times = lead_times[0] if bounded else bucket_lead_times(db.session, (first_day, last_day))
+
+    bucket = bucket_start(first_day, granularity)
+    while bucket <= last_day:
+        following = next_bucket(bucket, granularity)
+        key = bucket.isoformat()
+        deploys, failed = (releases[key].deploys, releases[key].failed) if key in releases else (0, 0)
+        restore_hours, restore_count = ((float(incidents[key].restore_hours or 0), incidents[key].restore_count)
+                                         if key in incidents else (0.0, 0))
+        days_in_bucket = (min(following - timedelta(days=1), last_day) - max(bucket, first_day)).days + 1
+        history['buckets'].append(key)
+        history['deployment_frequency'].append(round(deploys / days_in_bucket, 4))
+        history['lead_time'].append(round(lead_times[key].value(), 4) if key in lead_times else 0.0)
+        history['change_failure_rate'].append(round(change_failure_rate_from_stats(deploys, failed), 4))
+        history['time_to_restore'].append(round(time_to_restore_from_stats(restore_hours, restore_count), 4))
+        bucket = following
+    return history
@@ -0,0 +1,79 @@
+import hashlib
+import hmac
+import secrets
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+from flask import current_app
+from . import db
+from .cache import LRUTTLBackend
+from .models import ApiToken
+from .user_cache import CachedUser, user_cache
+
+TOKEN_PREFIX = 'sedo_'
+SCOPES = ('read', 'write')
+
+
+class ApiTokenState:
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+
+
+class ApiTokens:
+    """Issues and verifies bearer tokens.
+
+    Only HMAC-SHA256(SECRET_KEY, token) is stored, so verifying a token is a
+    keyed hash plus a unique-index lookup instead of a bcrypt check. Verified
+    digests are cached in-process for API_TOKEN_CACHE_TTL seconds; revoke()
+    drops the local entry at once, other processes notice within the TTL.
+    """
+
+    def init_app(self, app):
+        app.extensions['api_tokens'] = ApiTokenState(
+            LRUTTLBackend(app.config['API_TOKEN_CACHE_MAX_ENTRIES']), app.config['API_TOKEN_CACHE_TTL'])
+
+    @property
+    def state(self) -> ApiTokenState:
+        return current_app.extensions['api_tokens']
+
+    @staticmethod
+    def digest(token: str) -> str:
+        return hmac.new(current_app.config['SECRET_KEY'].encode('utf-8'), token.encode('utf-8'),
+                        hashlib.sha256).hexdigest()
+
+    def issue(self, user_id: int, name: str, scopes: Iterable[str]) -> Tuple[str, ApiToken]:
+        """Create a token row; the plaintext token is returned once and never stored"""
+        token = TOKEN_PREFIX + secrets.token_urlsafe(32)
+        row = ApiToken(user_id=user_id, name=name, prefix=token[:len(TOKEN_PREFIX) + 6],
+                       token_hash=self.digest(token), scopes=','.join(sorted(set(scopes))))
+        db.session.add(row)
+        return token, row
+
+    def verify(self, token: str) -> Optional[CachedUser]:
+        """The user a token authenticates, carrying the token's scopes; None if unknown or revoked"""
+        if not token.startswith(TOKEN_PREFIX):
+            return None
+        state = self.state
+        digest = self.digest(token)
+        entry = state.backend.get(digest)
+        if entry is None:
+            row = db.session.execute(db.select(ApiToken.user_id, ApiToken.token_hash, ApiToken.scopes).where(
+                ApiToken.token_hash == digest, ApiToken.revoked_at.is_(None))).first()
+            if row is None or not hmac.compare_digest(row.token_hash, digest):
+                return None
+            entry = {'user_id': row.user_id, 'scopes': tuple(row.scopes.split(','))}
+            state.backend.set(digest, entry, state.ttl)
+
+        # Role changes and deletions are picked up through the user cache's invalidation
+        user = user_cache.load(entry['user_id'], use_session=False)
+        if user is None:
+            return None
+        return CachedUser(user.id, user.username, user.role, entry['scopes'])
+
+    def revoke(self, row: ApiToken) -> None:
+        row.revoked_at = datetime.utcnow()
+        db.session.commit()
+        self.state.backend.delete(row.token_hash)
+
+
+api_tokens = ApiTokens()
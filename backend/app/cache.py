@@ -0,0 +1,180 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import date
+from typing import Iterable, Optional, Tuple
+from flask import current_app
+
+
+class CacheBackend(ABC):
+    """Storage interface for MetricsCache.
+
+    The in-process LRUTTLBackend is the default. A backend shared between
+    workers (e.g. Redis) implements the same methods and is passed to
+    MetricsCache.init_app; entries are plain dicts so they can be serialized.
+    A backend missing any method fails when it is instantiated.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, entry: dict, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    def items(self) -> Iterable[Tuple[str, dict]]:
+        ...
+
+    @abstractmethod
+    def clear(self) -> None:
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+
+class LRUTTLBackend(CacheBackend):
+    """Bounded in-process cache: least recently used entries are evicted first, and entries expire after their TTL"""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, entry = item
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def items(self):
+        with self._lock:
+            return [(key, entry) for key, (_, entry) in self._entries.items()]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class CacheState:
+    def __init__(self, backend: CacheBackend, enabled: bool, ttl: float):
+        self.backend = backend
+        self.enabled = enabled
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.lock = threading.Lock()
+
+
+class MetricsCache:
+    """Caches computed metrics payloads keyed by their normalized query parameters.
+
+    Each entry records the platform and inclusive day range its result was
+    computed from (None meaning "any"). A write touching (platform, day)
+    drops exactly the entries whose scope contains it. Entries also record the
+    data versions they were computed at; a lookup with different versions is a
+    miss, so a write committed by another process is never served from here.
+    """
+
+    def init_app(self, app, backend: Optional[CacheBackend] = None):
+        backend = backend or LRUTTLBackend(app.config['METRICS_CACHE_MAX_ENTRIES'])
+        app.extensions['metrics_cache'] = CacheState(
+            backend, app.config['METRICS_CACHE_ENABLED'], app.config['METRICS_CACHE_TTL'])
+
+    @property
+    def state(self) -> CacheState:
+        return current_app.extensions['metrics_cache']
+
+    @staticmethod
+    def make_key(endpoint: str, params: dict) -> str:
+        return endpoint + '?' + '&'.join(f'{name}={params[name] if params[name] is not None else ""}'
+                                         for name in sorted(params))
+
+    def get_or_compute(self, endpoint: str, params: dict, scope: Tuple[Optional[str], Optional[date], Optional[date]],
+                       compute, versions: Optional[dict] = None):
+        """Return the cached payload for (endpoint, params) at `versions`, computing and storing it on a miss"""
+        state = self.state
+        if not state.enabled:
+            return compute()
+        key = self.make_key(endpoint, params)
+        entry = state.backend.get(key)
+        if entry is not None and entry.get('versions') == versions:
+            with state.lock:
+                state.hits += 1
+            return entry['value']
+        with state.lock:
+            state.misses += 1
+        value = compute()
+        platform, first_day, last_day = scope
+        state.backend.set(key, {'value': value, 'platform': platform, 'first_day': first_day,
+                                'last_day': last_day, 'versions': versions}, state.ttl)
+        return value
+
+    def invalidate(self, touched: Iterable[Tuple[str, date]]) -> int:
+        """Drop entries whose scope overlaps any touched (platform, day); returns the number dropped"""
+        state = self.state
+        touched = set(touched)
+        if not touched:
+            return 0
+        dropped = 0
+        for key, entry in state.backend.items():
+            for platform, day in touched:
+                if ((entry['platform'] is None or entry['platform'] == platform) and
+                        (entry['first_day'] is None or day >= entry['first_day']) and
+                        (entry['last_day'] is None or day <= entry['last_day'])):
+                    state.backend.delete(key)
+                    dropped += 1
+                    break
+        with state.lock:
+            state.invalidations += dropped
+        return dropped
+
+    def clear(self):
+        self.state.backend.clear()
+
+    def stats(self) -> dict:
+        state = self.state
+        lookups = state.hits + state.misses
+        return {
+            'enabled': state.enabled,
+            'entries': len(state.backend),
+            'hits': state.hits,
+            'misses': state.misses,
+            'hit_rate': state.hits / lookups if lookups else 0.0,
+            'invalidations': state.invalidations,
+            'evictions': getattr(state.backend, 'evictions', None),
+        }
+
+
+metrics_cache = MetricsCache()
@@ -0,0 +1,27 @@
+from datetime import date, datetime
+from typing import Iterable, Set, Tuple
+from . import db
+from .cache import metrics_cache
+from .conditional import bump_data_versions
+from .rollup import refresh_rollup
+
+
+def release_key(release) -> Tuple[str, date]:
+    """(platform, rollout day) a release contributes to"""
+    day = release.rollout_date
+    return release.platform, day.date() if isinstance(day, datetime) else day
+
+
+def commit_release_changes(touched: Iterable[Tuple[str, date]], tables: Iterable[str] = ('release',)) -> None:
+    """Commit the session together with derived data for every touched (platform, day).
+
+    The daily rollup and the data version counters of `tables` are updated in
+    the same transaction; cached responses are dropped after the commit. Write paths collect the keys of rows before
+    and after modification and call this once per request, so a batch costs a
+    single refresh and invalidation pass.
+    """
+    touched: Set[Tuple[str, date]] = set(touched)
+    refresh_rollup(touched)
+    bump_data_versions(tables)
+    db.session.commit()
+    metrics_cache.invalidate(touched)
@@ -0,0 +1,69 @@
+import hashlib
+from functools import wraps
+from typing import Iterable
+from flask import current_app, g, make_response, request
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from . import db
+from .models import DataVersion
+
+
+def bump_data_versions(names: Iterable[str], executor=None) -> None:
+    """Increment the change counters for `names` inside the current transaction.
+
+    A single INSERT ... ON CONFLICT DO UPDATE, so concurrent first writes of a
+    counter both succeed instead of racing on its insert.
+    """
+    executor = executor or db.session
+    names = sorted(set(names))
+    if not names:
+        return
+    bind = getattr(executor, 'dialect', None) or executor.get_bind().dialect
+    table = DataVersion.__table__
+    stmt = (postgresql if bind.name == 'postgresql' else sqlite).insert(table)
+    stmt = stmt.on_conflict_do_update(index_elements=[table.c.name], set_={table.c.version: table.c.version + 1})
+    executor.execute(stmt, [{'name': name, 'version': 1} for name in names])
+
+
+def get_data_versions(names: Iterable[str]) -> dict:
+    rows = db.session.execute(select(DataVersion.name, DataVersion.version).where(DataVersion.name.in_(names)))
+    return dict(rows.all())
+
+
+def conditional(*tables):
+    """Serve a strong ETag derived from the data versions of `tables` and the request.
+
+    When If-None-Match matches, a 304 is returned without calling the view.
+    The tag covers the endpoint, query string and METRICS_ENGINE, so any
+    write that bumps one of the tables' counters changes it. The versions are
+    left in g.data_versions for the view, so cached bodies can be keyed on the
+    same counters as the tag.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            versions = get_data_versions(tables)
+            fingerprint = '|'.join([
+                request.endpoint,
+                repr(sorted(kwargs.items())),
+                repr(sorted(request.args.items(multi=True))),
+                repr(sorted((name, versions.get(name, 0)) for name in tables)),
+                str(current_app.config.get('METRICS_ENGINE')),
+            ])
+            etag = hashlib.sha256(fingerprint.encode()).hexdigest()[:32]
+
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                g.data_versions = versions
+                try:
+                    response = make_response(f(*args, **kwargs))
+                finally:
+                    g.pop('data_versions', None)
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,69 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date, datetime
+from flask import Response, current_app, stream_with_context
+from . import db
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+def _ndjson_chunks(partitions, fields):
+    for rows in partitions:
+        yield ''.join(json.dumps(dict(zip(fields, map(_plain, row)))) + '\n' for row in rows)
+
+
+def _csv_chunks(partitions, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for rows in partitions:
+        writer.writerows([_plain(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _gzip(chunks):
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(stmt, fields, fmt, filename, compress=False):
+    """Stream the rows of a Core select as NDJSON or CSV.
+
+    Rows are fetched in EXPORT_BATCH_SIZE partitions through a server-side
+    cursor where the driver supports one, so memory use does not grow with the
+    table. `fields` names the selected columns in order.
+    """
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+
+    def generate():
+        result = db.session.execute(stmt.execution_options(yield_per=batch_size))
+        try:
+            formatter = _ndjson_chunks if fmt == 'ndjson' else _csv_chunks
+            chunks = formatter(result.partitions(), fields)
+            yield from (_gzip(chunks) if compress else (chunk.encode() for chunk in chunks))
+        finally:
+            result.close()
+
+    response = Response(stream_with_context(generate()), mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}.{fmt}'
+    response.headers['Vary'] = 'Accept-Encoding'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
@@ -0,0 +1,113 @@
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, inspect, select
+from . import db
+from .models import SchemaVersion, Release, Incident, DailyPlatformStats, DataVersion, ApiToken, Commit
+from .aggregates import seconds_between
+from .rollup import rebuild_rollup
+
+schema_cli = AppGroup('schema', help='Manage database schema versions.')
+
+# Ordered list of (version, description, function(connection)). Every step must be
+# idempotent so it can run against databases created by db.create_all().
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(f):
+        MIGRATIONS.append((version, description, f))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return f
+    return register
+
+
+def get_index(model, name):
+    return next(index for index in model.__table__.indexes if index.name == name)
+
+
+@migration(1, 'Release and incident hot-filter indexes')
+def add_hot_filter_indexes(connection):
+    get_index(Release, 'ix_release_platform_rollout_date').create(connection, checkfirst=True)
+    get_index(Release, 'ix_release_rollout_date').create(connection, checkfirst=True)
+    get_index(Incident, 'ix_incident_release_id_start_time').create(connection, checkfirst=True)
+
+
+@migration(2, 'Daily platform stats rollup')
+def add_daily_platform_stats(connection):
+    DailyPlatformStats.__table__.create(connection, checkfirst=True)
+    # Filled by migration 6: the rollup sums incident.duration_seconds, which does not exist yet here
+
+
+@migration(3, 'Data version counters for conditional GET')
+def add_data_version(connection):
+    DataVersion.__table__.create(connection, checkfirst=True)
+
+
+@migration(4, 'API tokens')
+def add_api_token(connection):
+    ApiToken.__table__.create(connection, checkfirst=True)
+
+
+@migration(5, 'Release commits for lead time')
+def add_commit(connection):
+    Commit.__table__.create(connection, checkfirst=True)
+
+
+@migration(6, 'Incident duration column for restore time aggregates')
+def add_incident_duration(connection):
+    incident = Incident.__table__
+    column = incident.c.duration_seconds
+    if column.name not in {c['name'] for c in inspect(connection).get_columns(incident.name)}:
+        connection.exec_driver_sql(
+            f'ALTER TABLE {incident.name} ADD COLUMN {column.name} {column.type.compile(connection.dialect)}')
+    get_index(Incident, 'ix_incident_duration_seconds').create(connection, checkfirst=True)
+    connection.execute(incident.update().where(
+        incident.c.start_time.isnot(None), incident.c.end_time.isnot(None), column.is_(None)
+    ).values({column: seconds_between(incident.c.start_time, incident.c.end_time)}))
+    rebuild_rollup(connection)
+
+
+@migration(7, 'Incident external id for batch upserts')
+def add_incident_external_id(connection):
+    incident = Incident.__table__
+    column = incident.c.external_id
+    if column.name not in {c['name'] for c in inspect(connection).get_columns(incident.name)}:
+        connection.exec_driver_sql(
+            f'ALTER TABLE {incident.name} ADD COLUMN {column.name} {column.type.compile(connection.dialect)}')
+    get_index(Incident, 'ux_incident_external_id').create(connection, checkfirst=True)
+
+
+def current_version():
+    with db.engine.connect() as connection:
+        return connection.execute(select(func.max(SchemaVersion.version))).scalar() or 0
+
+
+def upgrade(target=None):
+    """Create missing tables, then apply pending migrations up to target. Returns applied versions."""
+    db.create_all()
+    applied = []
+    version = current_version()
+    for number, description, step in MIGRATIONS:
+        if number <= version or (target is not None and number > target):
+            continue
+        with db.engine.begin() as connection:
+            step(connection)
+            connection.execute(SchemaVersion.__table__.insert().values(version=number, description=description))
+        applied.append(number)
+    return applied
+
+
+@schema_cli.command('upgrade')
+@click.option('--target', type=int, default=None, help='Stop after this schema version.')
+def upgrade_command(target):
+    """Apply pending schema migrations."""
+    applied = upgrade(target)
+    if applied:
+        click.echo(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+    click.echo(f'Schema version: {current_version()}')
+
+
+@schema_cli.command('current')
+def current_command():
+    """Show the current schema version."""
+    click.echo(f'Schema version: {current_version()}')
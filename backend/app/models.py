@@ -1,7 +1,8 @@
 from . import db
 from flask_login import UserMixin
 from datetime import datetime
-from sqlalchemy import Date
+from typing import Optional
+from sqlalchemy import Date, event
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -17,7 +18,45 @@ class User(UserMixin, db.Model):
             'role': self.role
         }
 
+class ApiToken(db.Model):
+    """Revocable bearer token for automated callers; only an HMAC of the secret is stored"""
+    __tablename__ = 'api_token'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    name = db.Column(db.String(100), nullable=False)
+    prefix = db.Column(db.String(16), nullable=False)
+    token_hash = db.Column(db.String(64), unique=True, nullable=False)
+    scopes = db.Column(db.String(50), nullable=False, default='read')  # comma separated: 'read', 'write'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    revoked_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'prefix': self.prefix,
+            'scopes': self.scopes.split(','),
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'revoked_at': self.revoked_at.isoformat() if self.revoked_at else None
+        }
+
+class SchemaVersion(db.Model):
+    version = db.Column(db.Integer, primary_key=True)
+    description = db.Column(db.String(255))
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DataVersion(db.Model):
+    """Change counter per logical table, bumped by every write that commits through app.changes"""
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
 class Release(db.Model):
+    __table_args__ = (
+        db.Index('ix_release_platform_rollout_date', 'platform', 'rollout_date'),
+        db.Index('ix_release_rollout_date', 'rollout_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     platform = db.Column(db.String, nullable=False)
     release_type = db.Column(db.String(50))
@@ -28,6 +67,7 @@ class Release(db.Model):
     ci_job_link = db.Column(db.String(512))
     commit_list_link = db.Column(db.String(512))
     incident = db.relationship('Incident', backref='release', cascade='all, delete-orphan', passive_deletes=True)
+    commits = db.relationship('Commit', backref='release', cascade='all, delete-orphan', passive_deletes=True)
 
     def to_dict(self):
         return {
@@ -42,9 +82,68 @@ class Release(db.Model):
             'commit_list_link': self.commit_list_link
         }
 
+def incident_duration_seconds(start_time: Optional[datetime], end_time: Optional[datetime]) -> Optional[float]:
+    """Restore time of an incident, None while either end is unknown"""
+    if start_time is None or end_time is None:
+        return None
+    return (end_time - start_time).total_seconds()
+
+def _default_duration_seconds(context):
+    # Covers Core and bulk inserts, which bypass the mapper events below
+    parameters = context.get_current_parameters()
+    return incident_duration_seconds(parameters.get('start_time'), parameters.get('end_time'))
+
 class Incident(db.Model):
+    __table_args__ = (
+        db.Index('ix_incident_release_id_start_time', 'release_id', 'start_time'),
+        db.Index('ix_incident_duration_seconds', 'duration_seconds'),
+        db.Index('ux_incident_external_id', 'external_id', unique=True),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     release_id = db.Column(db.Integer, db.ForeignKey('release.id', ondelete='CASCADE'), nullable=False)
     start_time = db.Column(db.DateTime)
     end_time = db.Column(db.DateTime)
     description = db.Column(db.Text)
+    # end_time - start_time, maintained on every write so aggregates never compute it per row
+    duration_seconds = db.Column(db.Float, default=_default_duration_seconds)
+    # Id in the reporting system (pager, status page); batch writes upsert on it
+    external_id = db.Column(db.String(100))
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'release_id': self.release_id,
+            'external_id': self.external_id,
+            'start_time': self.start_time.isoformat() if self.start_time else None,
+            'end_time': self.end_time.isoformat() if self.end_time else None,
+            'duration_seconds': self.duration_seconds,
+            'description': self.description
+        }
+
+@event.listens_for(Incident, 'before_insert')
+@event.listens_for(Incident, 'before_update')
+def sync_duration_seconds(mapper, connection, target):
+    target.duration_seconds = incident_duration_seconds(target.start_time, target.end_time)
+
+class Commit(db.Model):
+    """A commit shipped by a release; lead time is measured from committed_at to the rollout day"""
+    id = db.Column(db.Integer, primary_key=True)
+    release_id = db.Column(db.Integer, db.ForeignKey('release.id', ondelete='CASCADE'), nullable=False, index=True)
+    sha = db.Column(db.String(40))
+    committed_at = db.Column(db.DateTime, nullable=False)
+
+class DailyPlatformStats(db.Model):
+    """Per (platform, rollout day) rollup of releases and their incidents, kept in sync by app.rollup"""
+    __tablename__ = 'daily_platform_stats'
+    __table_args__ = (
+        db.Index('ix_daily_platform_stats_day', 'day'),
+    )
+
+    platform = db.Column(db.String, primary_key=True)
+    day = db.Column(Date, primary_key=True)
+    deploy_count = db.Column(db.Integer, nullable=False, default=0)
+    failed_count = db.Column(db.Integer, nullable=False, default=0)
+    incident_count = db.Column(db.Integer, nullable=False, default=0)
+    restore_seconds = db.Column(db.Float, nullable=False, default=0.0)
+    restore_count = db.Column(db.Integer, nullable=False, default=0)
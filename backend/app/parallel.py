@@ -0,0 +1,98 @@
+import contextvars
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from flask import current_app
+from . import db
+
+
+class ParallelQueriesState:
+    def __init__(self, enabled, workers, concurrency):
+        self.enabled = enabled
+        self.workers = workers
+        self.concurrency = concurrency
+        self.pool = None
+        self.lock = threading.Lock()
+
+
+class ParallelQueries:
+    """Runs the independent read queries of one response concurrently.
+
+    Each task is a callable taking something with execute() and returning a
+    fully consumed result. Tasks must not touch db.session or other request
+    state; build their statements on the request thread and close over them. With METRICS_PARALLEL_QUERIES on, the first task
+    runs on the request's session and the others on a shared pool of
+    METRICS_QUERY_WORKERS threads, each on its own pooled connection, so a
+    response waits for its slowest query rather than the sum. At most
+    METRICS_QUERY_CONCURRENCY tasks of one request are in flight, the
+    request thread's included; a request holds at most that many
+    connections and the whole process at most one per request thread plus
+    METRICS_QUERY_WORKERS, which should fit in DB_POOL_SIZE + DB_MAX_OVERFLOW.
+    """
+
+    def init_app(self, app):
+        app.extensions['parallel_queries'] = ParallelQueriesState(
+            app.config['METRICS_PARALLEL_QUERIES'],
+            app.config['METRICS_QUERY_WORKERS'],
+            app.config['METRICS_QUERY_CONCURRENCY'])
+
+    @property
+    def state(self) -> ParallelQueriesState:
+        return current_app.extensions['parallel_queries']
+
+    def _pool(self, state: ParallelQueriesState) -> ThreadPoolExecutor:
+        # Created lazily so each forked server worker gets its own threads
+        with state.lock:
+            if state.pool is None:
+                state.pool = ThreadPoolExecutor(max_workers=state.workers, thread_name_prefix='metrics-query')
+            return state.pool
+
+    def run(self, *tasks) -> list:
+        """Results of `tasks` in order; sequential on the session when disabled or limited to one"""
+        state = self.state
+        slots = min(state.concurrency, len(tasks)) - 1
+        if not state.enabled or state.workers < 1 or slots < 1:
+            return [task(db.session) for task in tasks]
+
+        pool, engine = self._pool(state), db.engine
+
+        def on_connection(task):
+            with engine.connect() as connection:
+                return task(connection)
+
+        results = [None] * len(tasks)
+        queue = deque(range(1, len(tasks)))
+        futures = {}
+
+        def fill():
+            while queue and len(futures) < slots:
+                index = queue.popleft()
+                # A copied context keeps the request's g, so its queries still count in Server-Timing
+                futures[pool.submit(contextvars.copy_context().run, on_connection, tasks[index])] = index
+
+        fill()
+        try:
+            results[0] = tasks[0](db.session)
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[futures.pop(future)] = future.result()
+                fill()
+        except BaseException:
+            # Queries still running must finish before the request tears down its context
+            queue.clear()
+            for future in futures:
+                future.cancel()
+            wait(futures)
+            raise
+        return results
+
+    def shutdown(self, app) -> None:
+        state = app.extensions['parallel_queries']
+        with state.lock:
+            if state.pool is not None:
+                state.pool.shutdown()
+                state.pool = None
+
+
+parallel_queries = ParallelQueries()
@@ -0,0 +1,124 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+import bcrypt as _bcrypt
+from flask import current_app, jsonify
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when PASSWORD_HASH_QUEUE_DEPTH hashes are already in flight"""
+
+
+def _hash(password: bytes, rounds: int) -> str:
+    return _bcrypt.hashpw(password, _bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password_hash: bytes, password: bytes) -> bool:
+    return _bcrypt.checkpw(password, password_hash)
+
+
+def hash_rounds(password_hash: str) -> Optional[int]:
+    """Cost parameter of a "$2b$12$..." hash, None if it cannot be parsed"""
+    try:
+        return int(password_hash.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasherState:
+    def __init__(self, workers, queue_depth, rounds, retry_after):
+        self.workers = workers
+        self.rounds = rounds
+        self.retry_after = retry_after
+        self.slots = threading.BoundedSemaphore(queue_depth) if queue_depth > 0 else None
+        self.rejected = 0
+        self.pool = None
+        self.lock = threading.Lock()
+
+
+class PasswordHasher:
+    """bcrypt hashing off the request thread.
+
+    Hashes run in a process pool of PASSWORD_HASH_WORKERS processes (0 runs
+    them inline), so CPU-bound bcrypt work cannot hold the GIL of a worker
+    that is also serving metrics. At most PASSWORD_HASH_QUEUE_DEPTH hashes
+    are in flight per process (0 means unlimited); beyond that callers get
+    PasswordHasherBusy, which the app turns into 503 with Retry-After. Keep
+    the depth below the number of request threads so logins cannot occupy
+    all of them. A pool whose worker died (e.g. OOM-killed) is replaced and
+    the hash retried once.
+    """
+
+    def init_app(self, app):
+        app.extensions['password_hasher'] = PasswordHasherState(
+            app.config['PASSWORD_HASH_WORKERS'],
+            app.config['PASSWORD_HASH_QUEUE_DEPTH'],
+            app.config['BCRYPT_LOG_ROUNDS'],
+            app.config['PASSWORD_HASH_RETRY_AFTER'])
+
+        @app.errorhandler(PasswordHasherBusy)
+        def busy(error):
+            response = jsonify({'error': 'Too many concurrent sign-ins, please retry shortly'})
+            response.status_code = 503
+            response.headers['Retry-After'] = str(app.extensions['password_hasher'].retry_after)
+            return response
+
+    @property
+    def state(self) -> PasswordHasherState:
+        return current_app.extensions['password_hasher']
+
+    def _pool(self, state: PasswordHasherState) -> ProcessPoolExecutor:
+        # Created lazily so each forked server worker gets its own pool
+        with state.lock:
+            if state.pool is None:
+                state.pool = ProcessPoolExecutor(max_workers=state.workers)
+            return state.pool
+
+    def _discard_pool(self, state: PasswordHasherState, pool: ProcessPoolExecutor) -> None:
+        with state.lock:
+            if state.pool is pool:
+                state.pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, state: PasswordHasherState, fn, *args):
+        for _ in range(2):
+            pool = self._pool(state)
+            try:
+                return pool.submit(fn, *args).result()
+            except BrokenProcessPool:
+                self._discard_pool(state, pool)
+        raise PasswordHasherBusy()
+
+    def _run(self, fn, *args):
+        state = self.state
+        if state.slots is not None and not state.slots.acquire(blocking=False):
+            with state.lock:
+                state.rejected += 1
+            raise PasswordHasherBusy()
+        try:
+            if state.workers <= 0:
+                return fn(*args)
+            return self._submit(state, fn, *args)
+        finally:
+            if state.slots is not None:
+                state.slots.release()
+
+    def hash(self, password: str) -> str:
+        return self._run(_hash, password.encode('utf-8'), self.state.rounds)
+
+    def check(self, password_hash: str, password: str) -> bool:
+        return self._run(_check, password_hash.encode('utf-8'), password.encode('utf-8'))
+
+    def needs_rehash(self, password_hash: str) -> bool:
+        return hash_rounds(password_hash) != self.state.rounds
+
+    def shutdown(self, app) -> None:
+        state = app.extensions['password_hasher']
+        with state.lock:
+            if state.pool is not None:
+                state.pool.shutdown()
+                state.pool = None
+
+
+password_hasher = PasswordHasher()
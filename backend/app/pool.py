@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import deque
+from typing import Optional
+from flask import current_app
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from . import db
+from .quantiles import nearest_rank
+
+LATENCY_SAMPLES = 1024
+
+
+class PoolStats:
+    """Checkout latency and connection gauges of one engine's pool"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.recent_waits = deque(maxlen=LATENCY_SAMPLES)
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.connects = 0
+        self.invalidations = 0
+
+    def record_wait(self, seconds: float, timed_out: bool = False) -> None:
+        with self.lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.waits += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            self.recent_waits.append(seconds)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            recent = sorted(self.recent_waits)
+
+            def percentile_ms(q):
+                return round(nearest_rank(recent, q) * 1000, 3) if recent else 0.0
+
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'checkout_ms': {
+                    'mean': round(self.wait_seconds * 1000 / self.waits, 3) if self.waits else 0.0,
+                    'p50': percentile_ms(0.5),
+                    'p95': percentile_ms(0.95),
+                    'max': round(self.max_wait_seconds * 1000, 3),
+                },
+            }
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited for a connection"""
+
+    stats: Optional[PoolStats] = None
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            if self.stats is not None:
+                self.stats.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        if self.stats is not None:
+            self.stats.record_wait(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep reporting into the same stats
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+
+def engine_options(config) -> dict:
+    """SQLALCHEMY_ENGINE_OPTIONS from the DB_POOL_* settings.
+
+    In-memory SQLite gets a single shared connection from Flask-SQLAlchemy,
+    so only pre-ping and recycle apply there.
+    """
+    options = {'pool_pre_ping': config['DB_POOL_PRE_PING'], 'pool_recycle': config['DB_POOL_RECYCLE']}
+    uri = config.get('SQLALCHEMY_DATABASE_URI')
+    url = make_url(uri) if uri else None
+    if url is not None and url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return options
+    options.update(poolclass=TimedQueuePool, pool_size=config['DB_POOL_SIZE'],
+                   max_overflow=config['DB_MAX_OVERFLOW'], pool_timeout=config['DB_POOL_TIMEOUT'])
+    return options
+
+
+class PoolMonitor:
+    """Tracks connection checkouts on the app's engine through SQLAlchemy pool events.
+
+    Checkout/checkin maintain the in-use gauge, connect and invalidate count
+    new and discarded DBAPI connections. Wait times come from TimedQueuePool,
+    which engine_options() selects for server databases and SQLite files.
+    """
+
+    def init_app(self, app):
+        stats = PoolStats()
+        app.extensions['pool_monitor'] = stats
+        with app.app_context():
+            engine = db.engine
+        if isinstance(engine.pool, TimedQueuePool):
+            engine.pool.stats = stats
+
+        @event.listens_for(engine, 'checkout')
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            with stats.lock:
+                stats.checkouts += 1
+                stats.in_use += 1
+                stats.peak_in_use = max(stats.peak_in_use, stats.in_use)
+
+        @event.listens_for(engine, 'checkin')
+        def on_checkin(dbapi_connection, connection_record):
+            with stats.lock:
+                stats.in_use = max(0, stats.in_use - 1)
+
+        @event.listens_for(engine, 'connect')
+        def on_connect(dbapi_connection, connection_record):
+            with stats.lock:
+                stats.connects += 1
+
+        @event.listens_for(engine, 'invalidate')
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            with stats.lock:
+                stats.invalidations += 1
+
+    @property
+    def stats(self) -> PoolStats:
+        return current_app.extensions['pool_monitor']
+
+    def report(self) -> dict:
+        """Event gauges plus the pool's own view of its size and overflow"""
+        report = self.stats.snapshot()
+        pool = db.engine.pool
+        report['pool'] = {'class': type(pool).__name__, 'status': pool.status()}
+        if isinstance(pool, QueuePool):
+            report['pool'].update(size=pool.size(), checked_in=pool.checkedin(),
+                                  checked_out=pool.checkedout(), overflow=pool.overflow(),
+                                  timeout=pool.timeout())
+        return report
+
+
+pool_monitor = PoolMonitor()
@@ -0,0 +1,92 @@
+import math
+from bisect import bisect_right, insort
+from typing import Iterable, Sequence
+
+
+def nearest_rank(ordered: Sequence[float], q: float) -> float:
+    """Nearest-rank q-quantile of an ascending sequence: the smallest value with a share q of samples at or below it"""
+    return ordered[max(0, math.ceil(len(ordered) * q) - 1)]
+
+
+class P2Quantile:
+    """Streaming estimate of one quantile in constant memory (Jain & Chlamtac's P² algorithm).
+
+    Five markers track the minimum, the maximum, the target quantile and the
+    two quantiles halfway to either side; marker heights are adjusted with a
+    piecewise-parabolic fit as samples arrive. The first five samples are
+    kept exactly.
+    """
+
+    def __init__(self, q: float):
+        self.q = q
+        self.count = 0
+        self._heights = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self._increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        heights = self._heights
+        if self.count <= 5:
+            insort(heights, x)
+            return
+
+        if x < heights[0]:
+            heights[0] = x
+            cell = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            cell = 3
+        else:
+            cell = bisect_right(heights, x) - 1
+
+        positions = self._positions
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        for i in (1, 2, 3):
+            offset = self._desired[i] - positions[i]
+            if ((offset >= 1 and positions[i + 1] - positions[i] > 1) or
+                    (offset <= -1 and positions[i - 1] - positions[i] < -1)):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = heights[i] + step * (heights[i + step] - heights[i]) / (positions[i + step] - positions[i])
+                heights[i] = height
+                positions[i] += step
+
+    def _parabolic(self, i: int, step: int) -> float:
+        h, n = self._heights, self._positions
+        return h[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (h[i + 1] - h[i]) / (n[i + 1] - n[i]) +
+            (n[i + 1] - n[i] - step) * (h[i] - h[i - 1]) / (n[i] - n[i - 1]))
+
+    def value(self) -> float:
+        """Current estimate; exact (linear interpolation) while at most five samples were seen"""
+        if not self.count:
+            return 0.0
+        if self.count <= 5:
+            rank = self.q * (self.count - 1)
+            lower = int(rank)
+            upper = min(lower + 1, self.count - 1)
+            return self._heights[lower] + (rank - lower) * (self._heights[upper] - self._heights[lower])
+        return self._heights[2]
+
+
+class QuantileSummary:
+    """A set of P2Quantile estimators fed from the same stream"""
+
+    def __init__(self, quantiles: Iterable[float] = (0.5, 0.9)):
+        self.estimators = {q: P2Quantile(q) for q in quantiles}
+        self.count = 0
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        for estimator in self.estimators.values():
+            estimator.add(x)
+
+    def quantile(self, q: float) -> float:
+        return self.estimators[q].value()
@@ -0,0 +1,245 @@
+import hashlib
+from datetime import date, datetime
+from typing import Iterable, Optional, Tuple
+import click
+from flask.cli import AppGroup
+from sqlalchemy import and_, case, delete, func, insert, or_, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from . import db
+from .cache import metrics_cache
+from .conditional import bump_data_versions
+from .aggregates import add_lead_time_stats, add_restore_percentiles, in_days
+from .models import DailyPlatformStats, Release, Incident
+from .utils import DayRange, build_metrics, get_metric_windows
+
+rollup_cli = AppGroup('rollup', help='Maintain the daily_platform_stats rollup.')
+
+# Data version counters of the tables metrics responses are computed from
+METRICS_TABLES = ('release', 'incident')
+
+STAT_COLUMNS = ('deploy_count', 'failed_count', 'incident_count', 'restore_seconds', 'restore_count')
+
+# Keeps IN (...) lists well under SQLite's bound-parameter limit
+KEY_CHUNK_SIZE = 500
+
+
+def compute_daily_stats(executor=None, platforms=None, days=None) -> dict:
+    """Aggregate raw releases and incidents into {(platform, day): stats}, optionally restricted to some keys"""
+    executor = executor or db.session
+    failed = or_(Release.is_successful.is_(False), Release.is_successful.is_(None))
+    release_stmt = select(Release.platform, Release.rollout_date, func.count(Release.id),
+                          func.count(case((failed, 1)))).group_by(Release.platform, Release.rollout_date)
+
+    has_duration = Incident.duration_seconds.isnot(None)
+    incident_stmt = select(
+        Release.platform, Release.rollout_date, func.count(Incident.id),
+        func.sum(case((has_duration, Incident.duration_seconds), else_=0)),
+        func.count(case((has_duration, 1)))
+    ).select_from(Incident).join(Release, Incident.release_id == Release.id) \
+        .group_by(Release.platform, Release.rollout_date)
+
+    if platforms is not None:
+        release_stmt = release_stmt.where(Release.platform.in_(platforms), Release.rollout_date.in_(days))
+        incident_stmt = incident_stmt.where(Release.platform.in_(platforms), Release.rollout_date.in_(days))
+
+    stats = {}
+    for platform, day, deploys, failures in executor.execute(release_stmt):
+        stats[(platform, day)] = {'platform': platform, 'day': day, 'deploy_count': deploys,
+                                  'failed_count': failures, 'incident_count': 0,
+                                  'restore_seconds': 0.0, 'restore_count': 0}
+    for platform, day, incidents, seconds, restored in executor.execute(incident_stmt):
+        row = stats[(platform, day)]
+        row.update(incident_count=incidents, restore_seconds=float(seconds or 0), restore_count=restored)
+    return stats
+
+
+def executor_dialect(executor):
+    return getattr(executor, 'dialect', None) or executor.get_bind().dialect
+
+
+def rollup_lock_id(key: Tuple[str, date]) -> int:
+    """Stable signed 64-bit advisory lock id for a (platform, day) rollup key"""
+    digest = hashlib.blake2b(f'rollup|{key[0]}|{key[1].isoformat()}'.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def lock_rollup_keys(executor, keys: Iterable[Tuple[str, date]]) -> None:
+    """Serialize refreshes of the same keys until the caller's transaction ends.
+
+    On PostgreSQL each key takes a transaction-scoped advisory lock, in id
+    order so concurrent writers cannot deadlock; statements run after the
+    lock see the other writer's committed rows. SQLite already allows a
+    single writer at a time.
+    """
+    if executor_dialect(executor).name != 'postgresql':
+        return
+    for lock_id in sorted({rollup_lock_id(key) for key in keys}):
+        executor.execute(select(func.pg_advisory_xact_lock(lock_id)))
+
+
+def upsert_stats(executor, rows) -> None:
+    """INSERT ... ON CONFLICT (platform, day) DO UPDATE of rollup rows"""
+    table = DailyPlatformStats.__table__
+    stmt = (postgresql if executor_dialect(executor).name == 'postgresql' else sqlite).insert(table)
+    stmt = stmt.on_conflict_do_update(index_elements=[table.c.platform, table.c.day],
+                                      set_={column: stmt.excluded[column] for column in STAT_COLUMNS})
+    executor.execute(stmt, rows)
+
+
+def refresh_rollup(touched: Iterable[Tuple[str, date]], executor=None) -> None:
+    """Recompute rollup rows for the touched (platform, day) keys inside the caller's transaction.
+
+    Keys are grouped into platform x day blocks; recomputing a few untouched
+    neighbours in a block is harmless since rows are rebuilt from raw data.
+    The touched keys are locked first, so a concurrent writer's recomputation
+    of the same key waits for its commit and includes its rows instead of
+    overwriting them. Rows are upserted; keys left without releases are
+    deleted.
+    """
+    executor = executor or db.session
+    if executor is db.session:
+        db.session.flush()
+    touched = sorted(set(touched))
+    lock_rollup_keys(executor, touched)
+    platforms = sorted({platform for platform, _ in touched})
+    days = sorted({day for _, day in touched})
+    for p in range(0, len(platforms), KEY_CHUNK_SIZE):
+        platform_chunk = platforms[p:p + KEY_CHUNK_SIZE]
+        for d in range(0, len(days), KEY_CHUNK_SIZE):
+            day_chunk = days[d:d + KEY_CHUNK_SIZE]
+            stats = compute_daily_stats(executor, platform_chunk, day_chunk)
+            if stats:
+                upsert_stats(executor, list(stats.values()))
+            chunk_platforms, chunk_days = set(platform_chunk), set(day_chunk)
+            emptied = [key for key in touched
+                       if key[0] in chunk_platforms and key[1] in chunk_days and key not in stats]
+            for k in range(0, len(emptied), KEY_CHUNK_SIZE):
+                executor.execute(delete(DailyPlatformStats).where(
+                    tuple_(DailyPlatformStats.platform, DailyPlatformStats.day).in_(emptied[k:k + KEY_CHUNK_SIZE])))
+
+
+def rebuild_rollup(executor=None) -> int:
+    """Replace the whole rollup with a recomputation from raw tables; returns the row count.
+
+    The metrics data versions are bumped in the same transaction, so ETags
+    and cached responses computed from the old rollup stop matching.
+    """
+    executor = executor or db.session
+    executor.execute(delete(DailyPlatformStats))
+    rows = list(compute_daily_stats(executor).values())
+    if rows:
+        executor.execute(insert(DailyPlatformStats), rows)
+    bump_data_versions(METRICS_TABLES, executor)
+    return len(rows)
+
+
+def verify_rollup(executor=None) -> list:
+    """Keys whose stored rollup differs from a fresh recomputation"""
+    executor = executor or db.session
+    expected = compute_daily_stats(executor)
+    stored = {(row.platform, row.day): {column: getattr(row, column) for column in STAT_COLUMNS}
+              for row in executor.execute(select(*DailyPlatformStats.__table__.columns))}
+    mismatches = []
+    for key in sorted(set(expected) | set(stored)):
+        want = {column: expected[key][column] for column in STAT_COLUMNS} if key in expected else None
+        have = stored.get(key)
+        if want is None or have is None or any(
+                abs(want[column] - have[column]) > 1e-3 for column in STAT_COLUMNS):
+            mismatches.append({'platform': key[0], 'day': key[1].isoformat(), 'expected': want, 'stored': have})
+    return mismatches
+
+
+def rollup_stats_query(platform: Optional[str], current: DayRange, previous: Optional[DayRange]):
+    """Single-row aggregate over rollup rows, same shape as the raw release/incident stats"""
+    stats = DailyPlatformStats
+    columns = []
+    for prefix, days in (('cur', current), ('prev', previous)):
+        in_period = in_days(stats.day, days)
+        deployed = and_(in_period, stats.deploy_count > 0)
+        columns += [
+            func.sum(case((in_period, stats.deploy_count), else_=0)).label(f'{prefix}_deploys'),
+            func.sum(case((in_period, stats.failed_count), else_=0)).label(f'{prefix}_failed'),
+            func.min(case((deployed, stats.day))).label(f'{prefix}_first_date'),
+            func.max(case((deployed, stats.day))).label(f'{prefix}_last_date'),
+            func.sum(case((in_period, stats.incident_count), else_=0)).label(f'{prefix}_incidents'),
+            func.sum(case((in_period, stats.restore_seconds), else_=0)).label(f'{prefix}_restore_seconds'),
+            func.sum(case((in_period, stats.restore_count), else_=0)).label(f'{prefix}_restore_count'),
+        ]
+    stmt = select(*columns)
+    if platform:
+        stmt = stmt.where(stats.platform == platform)
+    first_day, last_day = (previous[0], current[1]) if previous else current
+    if first_day:
+        stmt = stmt.where(stats.day >= first_day)
+    if last_day:
+        stmt = stmt.where(stats.day <= last_day)
+    return stmt
+
+
+def calculate_metrics_rollup(platform: Optional[str], start: Optional[datetime], end: Optional[datetime]) -> Optional[dict]:
+    """DORA metrics from daily_platform_stats plus a commit stream for lead time; None when no releases match.
+
+    Incidents are attributed to their release's rollout day, so unlike the raw
+    engines the current period does not additionally require incidents to
+    start and end inside [start, end].
+    """
+    current, previous = get_metric_windows(start, end)
+    row = db.session.execute(rollup_stats_query(platform, current, previous)).mappings().one()
+
+    def period(prefix):
+        return {
+            'deploys': row[f'{prefix}_deploys'] or 0,
+            'failed': row[f'{prefix}_failed'] or 0,
+            'first_date': row[f'{prefix}_first_date'],
+            'last_date': row[f'{prefix}_last_date'],
+            'incidents': row[f'{prefix}_incidents'] or 0,
+            'restore_hours': float(row[f'{prefix}_restore_seconds'] or 0) / 3600,
+            'restore_count': row[f'{prefix}_restore_count'] or 0,
+            'restore_p50': 0.0,
+            'restore_p90': 0.0,
+            'restore_p99': 0.0,
+            'lead_time_p50': 0.0,
+            'lead_time_p90': 0.0,
+            'lead_time_count': 0,
+        }
+
+    current_stats = period('cur')
+    previous_stats = period('prev') if previous else None
+    if not current_stats['deploys'] and not (previous_stats and previous_stats['deploys']):
+        return None
+    # Quantiles cannot be summed across days, so lead and restore time percentiles read the raw tables
+    add_restore_percentiles(current_stats, platform, current)
+    add_lead_time_stats(current_stats, previous_stats, platform, current, previous)
+    return build_metrics(current_stats, previous_stats)
+
+
+def deployment_volume_rows(start: Optional[datetime], end: Optional[datetime]):
+    """(platform, day, count) rows for the deployment-volume chart, read from the rollup"""
+    stmt = select(DailyPlatformStats.platform, DailyPlatformStats.day, DailyPlatformStats.deploy_count) \
+        .where(DailyPlatformStats.deploy_count > 0)
+    if start:
+        stmt = stmt.where(DailyPlatformStats.day >= start.date())
+    if end:
+        stmt = stmt.where(DailyPlatformStats.day <= end.date())
+    return db.session.execute(stmt.order_by(DailyPlatformStats.day)).all()
+
+
+@rollup_cli.command('rebuild')
+def rebuild_command():
+    """Recompute daily_platform_stats from releases and incidents."""
+    count = rebuild_rollup()
+    db.session.commit()
+    metrics_cache.clear()
+    click.echo(f'Rebuilt {count} rollup rows')
+
+
+@rollup_cli.command('verify')
+def verify_command():
+    """Compare daily_platform_stats with a fresh recomputation."""
+    mismatches = verify_rollup()
+    for mismatch in mismatches[:20]:
+        click.echo(f"{mismatch['platform']} {mismatch['day']}: stored {mismatch['stored']}, "
+                   f"expected {mismatch['expected']}")
+    if mismatches:
+        raise click.ClickException(f'{len(mismatches)} rollup rows differ; run "flask rollup rebuild"')
+    click.echo('Rollup is consistent')
@@ -1,5 +1,5 @@
 from .auth import bp as auth_bp
 from .releases import bp as releases_bp
-# from .incidents import bp as incidents_bp
+from .incidents import bp as incidents_bp
 from .metrics import bp as metrics_bp
 # from .platforms import bp as platforms_bp
@@ -1,7 +1,10 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_user, logout_user, login_required, current_user
-from app.models import User
-from app import db, bcrypt
+from app.models import ApiToken, User
+from app import db
+from app.api_tokens import SCOPES, api_tokens
+from app.passwords import PasswordHasherBusy, password_hasher
+from app.user_cache import user_cache
 
 bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
@@ -30,7 +33,7 @@ def register():
                 return jsonify({'error': 'Email already registered'}), 400
         
         # Create new user
-        password_hash = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+        password_hash = password_hasher.hash(data['password'])
         user = User(
             username=data['username'],
             email=data.get('email'),  # Email is optional in the database
@@ -51,7 +54,10 @@ def register():
                 'role': user.role
             }
         }), 201
-            
+
+    except PasswordHasherBusy:
+        db.session.rollback()
+        raise
     except Exception as e:
         current_app.logger.error(f"Registration error: {str(e)}")
         db.session.rollback()
@@ -77,8 +83,12 @@ def login():
         user = User.query.filter_by(username=data['username']).first()
         current_app.logger.info(f"Login attempt for user: {data['username']}")
         
-        if user and bcrypt.check_password_hash(user.password_hash, data['password']):
+        if user and password_hasher.check(user.password_hash, data['password']):
+            if password_hasher.needs_rehash(user.password_hash):
+                user.password_hash = password_hasher.hash(data['password'])
+                db.session.commit()
             login_user(user)
+            user_cache.remember(user)
             current_app.logger.info(f"User {user.username} logged in successfully")
             return jsonify({
                 'message': 'Logged in successfully',
@@ -91,7 +101,9 @@ def login():
             
         current_app.logger.warning(f"Failed login attempt for user: {data['username']}")
         return jsonify({'error': 'Invalid credentials'}), 401
-        
+
+    except PasswordHasherBusy:
+        raise
     except Exception as e:
         current_app.logger.error(f"Login error: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -101,7 +113,47 @@ def login():
 def logout():
     try:
         logout_user()
+        user_cache.forget_session()
         return jsonify({'message': 'Logged out successfully'}), 200
     except Exception as e:
         current_app.logger.error(f"Logout error: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
+
+@bp.route('/tokens', methods=['POST'])
+@login_required
+def create_token():
+    if getattr(current_user, 'scopes', None) is not None:
+        return jsonify({'error': 'API tokens cannot create tokens'}), 403
+
+    data = request.get_json(silent=True) or {}
+    name = data.get('name')
+    scopes = data.get('scopes', ['read'])
+    if not isinstance(name, str) or not name.strip():
+        return jsonify({'error': 'Token name required'}), 400
+    if not isinstance(scopes, list) or not scopes or any(scope not in SCOPES for scope in scopes):
+        return jsonify({'error': f"scopes must be a list of {', '.join(SCOPES)}"}), 400
+    if 'write' in scopes and current_user.role not in ['admin', 'writer']:
+        return jsonify({'error': 'Write privileges required'}), 403
+
+    token, row = api_tokens.issue(current_user.id, name.strip(), scopes)
+    db.session.commit()
+    return jsonify(dict(row.to_dict(), token=token)), 201
+
+@bp.route('/tokens', methods=['GET'])
+@login_required
+def list_tokens():
+    rows = ApiToken.query.filter_by(user_id=current_user.id).order_by(ApiToken.id).all()
+    return jsonify([row.to_dict() for row in rows])
+
+@bp.route('/tokens/<int:token_id>', methods=['DELETE'])
+@login_required
+def revoke_token(token_id):
+    if getattr(current_user, 'scopes', None) is not None:
+        return jsonify({'error': 'API tokens cannot revoke tokens'}), 403
+
+    row = db.session.get(ApiToken, token_id)
+    if row is None or (row.user_id != current_user.id and current_user.role != 'admin'):
+        return jsonify({'error': 'Token not found'}), 404
+    if row.revoked_at is None:
+        api_tokens.revoke(row)
+    return jsonify({'message': 'Token revoked'}), 200
@@ -0,0 +1,34 @@
+from flask import Blueprint, Response, jsonify
+from flask_login import login_required
+from app.pool import pool_monitor
+from app.routes.users import admin_required
+from app.timing import request_timing
+
+bp = Blueprint('diagnostics', __name__, url_prefix='/api/diagnostics')
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@bp.route('/pool', methods=['GET'])
+@login_required
+@admin_required
+def get_pool_stats():
+    """Connection pool configuration, checkout latency and in-use gauges"""
+    return jsonify(pool_monitor.report())
+
+
+@bp.route('/metrics', methods=['GET'])
+@login_required
+@admin_required
+def get_prometheus_metrics():
+    """Per-route latency histograms, query counters and pool gauges for a Prometheus scrape"""
+    pool = pool_monitor.stats.snapshot()
+    gauges = [
+        '# HELP sedo_db_pool_in_use Connections checked out of the pool.',
+        '# TYPE sedo_db_pool_in_use gauge',
+        f"sedo_db_pool_in_use {pool['in_use']}",
+        '# HELP sedo_db_pool_checkout_timeouts_total Checkouts that gave up waiting for a connection.',
+        '# TYPE sedo_db_pool_checkout_timeouts_total counter',
+        f"sedo_db_pool_checkout_timeouts_total {pool['timeouts']}",
+    ]
+    return Response(request_timing.prometheus() + '\n'.join(gauges) + '\n', content_type=PROMETHEUS_CONTENT_TYPE)
@@ -0,0 +1,333 @@
+from flask import Blueprint, request, jsonify, abort, current_app
+from flask_login import login_required
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import postgresql, sqlite
+from app.models import Incident, Release, incident_duration_seconds
+from app import db
+from app.changes import commit_release_changes, release_key
+from app.conditional import conditional
+from app.routes.releases import (filter_releases, page_limit, parse_timestamp, read_bulk_items,
+                                 validate_incident, write_required)
+from app.timing import timed
+
+bp = Blueprint('incidents', __name__, url_prefix='/api/incidents')
+
+EXTERNAL_ID_LENGTH = Incident.__table__.c.external_id.type.length
+UPSERT_COLUMNS = ('external_id', 'release_id', 'start_time', 'end_time', 'description', 'duration_seconds')
+
+def validate_external_id(value, required=False):
+    """Return a list of errors for an external_id field"""
+    if value is None:
+        return ['external_id is required'] if required else []
+    if not isinstance(value, str) or not value or len(value) > EXTERNAL_ID_LENGTH:
+        return [f'external_id must be a string of at most {EXTERNAL_ID_LENGTH} characters']
+    return []
+
+def validate_incident_item(data):
+    """Return (values, errors) for an incident with its release_id and optional external_id"""
+    values, errors = validate_incident(data)
+    if values is None:
+        return values, errors
+    values['release_id'] = data.get('release_id')
+    if not isinstance(values['release_id'], int) or isinstance(values['release_id'], bool):
+        errors.append('release_id must be an integer')
+    values['external_id'] = data.get('external_id')
+    errors.extend(validate_external_id(values['external_id']))
+    if values.get('start_time') and values.get('end_time') and values['end_time'] < values['start_time']:
+        errors.append('end_time must not be before start_time')
+    return values, errors
+
+def validate_close(data):
+    """Return (values, errors) for a close event: external_id and end_time"""
+    values = {'external_id': data.get('external_id')}
+    errors = validate_external_id(values['external_id'], required=True)
+    try:
+        values['end_time'] = parse_timestamp(data['end_time'])
+    except (KeyError, TypeError, ValueError):
+        errors.append('end_time must be an ISO-8601 timestamp')
+    return values, errors
+
+def release_keys_by_id(release_ids):
+    """(platform, day) of each existing release in `release_ids`, looked up one chunk at a time"""
+    release_ids = sorted(set(release_ids))
+    chunk_size = current_app.config['BULK_CHUNK_SIZE']
+    keys = {}
+    for offset in range(0, len(release_ids), chunk_size):
+        rows = db.session.execute(select(Release.id, Release.platform, Release.rollout_date)
+                                  .where(Release.id.in_(release_ids[offset:offset + chunk_size])))
+        keys.update((row.id, release_key(row)) for row in rows)
+    return keys
+
+def incidents_by_external_id(external_ids):
+    """Existing incidents keyed by external_id, looked up one chunk at a time"""
+    external_ids = sorted(set(external_ids))
+    chunk_size = current_app.config['BULK_CHUNK_SIZE']
+    found = {}
+    for offset in range(0, len(external_ids), chunk_size):
+        rows = db.session.execute(select(Incident.id, Incident.external_id, Incident.release_id,
+                                         Incident.start_time)
+                                  .where(Incident.external_id.in_(external_ids[offset:offset + chunk_size])))
+        found.update((row.external_id, row) for row in rows)
+    return found
+
+def duplicate_external_id():
+    return jsonify({'error': 'An incident with this external_id already exists'}), 409
+
+def incident_release_key(incident):
+    return release_key(db.session.get(Release, incident.release_id))
+
+@bp.route('/', methods=['GET'])
+@login_required
+@conditional('release', 'incident')
+def get_incidents():
+    """List incidents newest first, filtered by release, platform, day range or open state.
+
+    When more rows exist the X-Next-Cursor header holds the id to pass as
+    `cursor` for the next page.
+    """
+    limit = page_limit(current_app.config['INCIDENTS_PAGE_SIZE'], current_app.config['INCIDENTS_MAX_PAGE_SIZE'])
+    if limit is None:
+        return jsonify({'error': 'Invalid limit'}), 400
+    cursor = request.args.get('cursor')
+    if cursor is not None and not cursor.isdigit():
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    query = db.session.query(Incident)
+    release_id = request.args.get('release_id', type=int)
+    if release_id is not None:
+        query = query.filter(Incident.release_id == release_id)
+    platform = request.args.get('platform', type=str)
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    if platform or start_date or end_date:
+        query = filter_releases(query.join(Release, Incident.release_id == Release.id),
+                                platform, start_date, end_date)
+    is_open = request.args.get('open')
+    if is_open is not None:
+        query = query.filter(Incident.end_time.is_(None) if is_open == 'true' else Incident.end_time.isnot(None))
+    if cursor is not None:
+        query = query.filter(Incident.id < int(cursor))
+
+    incidents = query.order_by(Incident.id.desc()).limit(limit + 1).all()
+    with timed('serialize'):
+        response = jsonify([incident.to_dict() for incident in incidents[:limit]])
+    if len(incidents) > limit:
+        response.headers['X-Next-Cursor'] = str(incidents[limit - 1].id)
+    return response
+
+@bp.route('/<int:incident_id>', methods=['GET'])
+@login_required
+def get_incident(incident_id):
+    incident = db.session.get(Incident, incident_id)
+    if not incident:
+        abort(404)
+    return jsonify(incident.to_dict())
+
+@bp.route('/', methods=['POST'])
+@login_required
+@write_required
+def add_incident():
+    values, errors = validate_incident_item(request.get_json(silent=True))
+    if errors:
+        return jsonify({'error': 'Invalid incident', 'details': errors}), 400
+    release = db.session.get(Release, values['release_id'])
+    if not release:
+        return jsonify({'error': f"Release {values['release_id']} does not exist"}), 400
+    if values['external_id'] is not None and incidents_by_external_id([values['external_id']]):
+        return duplicate_external_id()
+    incident = Incident(**values)
+    db.session.add(incident)
+    try:
+        commit_release_changes([release_key(release)], tables=('incident',))
+    except IntegrityError:
+        # A concurrent request stored the same external_id after the check above
+        db.session.rollback()
+        return duplicate_external_id()
+    return jsonify(incident.to_dict()), 201
+
+@bp.route('/<int:incident_id>', methods=['PUT'])
+@login_required
+@write_required
+def update_incident(incident_id):
+    incident = db.session.get(Incident, incident_id)
+    if not incident:
+        abort(404)
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Invalid incident', 'details': ['incident must be an object']}), 400
+    values, errors = validate_incident_item(dict(incident.to_dict(), **data))
+    if not errors and not db.session.get(Release, values['release_id']):
+        errors.append(f"release {values['release_id']} does not exist")
+    if errors:
+        return jsonify({'error': 'Invalid incident', 'details': errors}), 400
+    if values['external_id'] not in (None, incident.external_id) \
+            and incidents_by_external_id([values['external_id']]):
+        return duplicate_external_id()
+
+    touched = [incident_release_key(incident)]
+    for field, value in values.items():
+        setattr(incident, field, value)
+    touched.append(incident_release_key(incident))
+    try:
+        commit_release_changes(touched, tables=('incident',))
+    except IntegrityError:
+        db.session.rollback()
+        return duplicate_external_id()
+    return jsonify(incident.to_dict())
+
+@bp.route('/<int:incident_id>', methods=['DELETE'])
+@login_required
+@write_required
+def delete_incident(incident_id):
+    incident = db.session.get(Incident, incident_id)
+    if not incident:
+        abort(404)
+    touched = [incident_release_key(incident)]
+    db.session.delete(incident)
+    commit_release_changes(touched, tables=('incident',))
+    return jsonify({'message': 'Incident deleted successfully'})
+
+def upsert_statement():
+    """INSERT ... ON CONFLICT (external_id) DO UPDATE, returning ids in parameter order.
+
+    Rows without an external_id never conflict and are plain inserts. An
+    upsert replaces every field of the existing incident.
+    """
+    dialect = postgresql if db.session.get_bind().dialect.name == 'postgresql' else sqlite
+    table = Incident.__table__
+    stmt = dialect.insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.external_id],
+        set_={column: stmt.excluded[column] for column in UPSERT_COLUMNS if column != 'external_id'})
+    return stmt.returning(table.c.id, sort_by_parameter_order=True)
+
+def write_incident_batch(upserts, closes):
+    """Write validated upsert rows and {id, end_time, duration_seconds} closes in chunks; returns upserted ids.
+
+    A chunk costs one executemany upsert and one executemany update. The
+    caller owns the transaction.
+    """
+    chunk_size = current_app.config['BULK_CHUNK_SIZE']
+    ids = []
+    if upserts:
+        stmt = upsert_statement()
+        for offset in range(0, len(upserts), chunk_size):
+            ids.extend(db.session.scalars(stmt, upserts[offset:offset + chunk_size]).all())
+    for offset in range(0, len(closes), chunk_size):
+        db.session.execute(update(Incident), closes[offset:offset + chunk_size])
+    return ids
+
+def validate_event(payload):
+    """Return (op, values, errors) for one batch event"""
+    op = payload.get('op', 'upsert') if isinstance(payload, dict) else 'upsert'
+    if op == 'close':
+        return op, *validate_close(payload)
+    if op == 'upsert':
+        return op, *validate_incident_item(payload)
+    return op, None, ['op must be "upsert" or "close"']
+
+@bp.route('/batch', methods=['POST'])
+@login_required
+@write_required
+def write_incidents_batch():
+    """Create, upsert and close many incidents in one transaction.
+
+    Accepts a JSON array or application/x-ndjson of events. An event with
+    "op": "close" sets end_time on the incident with its external_id; any
+    other event is an upsert keyed by external_id, or a plain create when it
+    has none. Events for the same external_id take effect in arrival order.
+    Either every event is applied (200) or none are (400; 409 if a concurrent
+    writer got in between), and the derived data of all touched releases is
+    refreshed once.
+    """
+    try:
+        payloads = read_bulk_items('incidents')
+    except ValueError as e:
+        return jsonify({'error': f'Invalid bulk payload: {e}'}), 400
+    if len(payloads) > current_app.config['BULK_MAX_ITEMS']:
+        return jsonify({'error': f"At most {current_app.config['BULK_MAX_ITEMS']} incidents per request"}), 413
+
+    events = [validate_event(payload) for payload in payloads]
+    valid = [values for _, values, errors in events if not errors]
+    releases = release_keys_by_id(values['release_id'] for values in valid if 'release_id' in values)
+    existing = incidents_by_external_id(values['external_id'] for values in valid
+                                        if values['external_id'] is not None)
+
+    # Events are folded in arrival order into one row per external_id: an upsert replaces every
+    # field of what came before it, a close sets end_time on the latest state
+    results, upserts, closes = [], [], {}
+    positions, pending, touched = {}, {}, set()
+    for index, (op, values, errors) in enumerate(events):
+        results.append({'index': index})
+        if errors:
+            continue
+        external_id = values['external_id']
+        current = existing.get(external_id)
+        if op == 'upsert':
+            if values['release_id'] not in releases:
+                errors.append(f"release {values['release_id']} does not exist")
+                continue
+            touched.add(values['release_id'])
+            if current is not None:
+                touched.add(current.release_id)
+                # A close of the stored incident earlier in the batch is superseded
+                closes.pop(external_id, None)
+            results[index]['status'] = 'updated' if current is not None or external_id in pending else 'created'
+            if external_id in pending:
+                upserts[pending[external_id]] = values
+            else:
+                if external_id is not None:
+                    pending[external_id] = len(upserts)
+                upserts.append(values)
+            positions[index] = pending.get(external_id, len(upserts) - 1)
+        elif external_id in pending:
+            row = upserts[pending[external_id]]
+            if row['start_time'] and values['end_time'] < row['start_time']:
+                errors.append('end_time must not be before start_time')
+            else:
+                row['end_time'] = values['end_time']
+                results[index]['status'] = 'closed'
+                positions[index] = pending[external_id]
+        elif current is None:
+            errors.append(f"no incident with external_id {external_id}")
+        elif current.start_time and values['end_time'] < current.start_time:
+            errors.append('end_time must not be before start_time')
+        else:
+            touched.add(current.release_id)
+            closes[external_id] = {'id': current.id, 'end_time': values['end_time'],
+                                   'duration_seconds': incident_duration_seconds(current.start_time,
+                                                                                 values['end_time'])}
+            results[index].update(status='closed', id=current.id)
+
+    if any(errors for _, _, errors in events):
+        return jsonify({'error': 'Invalid incidents in batch, nothing was written',
+                        'results': [{'index': index, 'status': 'invalid', 'errors': errors} if errors
+                                    else {'index': index, 'status': 'valid'}
+                                    for index, (_, _, errors) in enumerate(events)]}), 400
+
+    # Releases that updated and closed incidents were attached to before this batch
+    releases.update(release_keys_by_id(touched - releases.keys()))
+    # Durations come from each row's final start and end, after every event has been folded in
+    rows = [dict({column: row[column] for column in UPSERT_COLUMNS if column != 'duration_seconds'},
+                 duration_seconds=incident_duration_seconds(row['start_time'], row['end_time']))
+            for row in upserts]
+    try:
+        with timed('write'):
+            ids = write_incident_batch(rows, list(closes.values()))
+            commit_release_changes((releases[release_id] for release_id in touched), tables=('incident',))
+    except IntegrityError:
+        # Another writer changed a referenced release or incident between validation and commit
+        db.session.rollback()
+        return jsonify({'error': 'Incidents in this batch were changed concurrently, nothing was written'}), 409
+    except Exception as e:
+        current_app.logger.error(f"Incident batch write failed: {str(e)}")
+        db.session.rollback()
+        return jsonify({'error': 'Internal server error'}), 500
+
+    for index, position in positions.items():
+        results[index]['id'] = ids[position]
+    counts = {status: sum(result['status'] == status for result in results)
+              for status in ('created', 'updated', 'closed')}
+    return jsonify({'message': ', '.join(f'{count} {status}' for status, count in counts.items()),
+                    'results': results})
@@ -1,20 +1,22 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, g
 from flask_login import login_required
 from app import db
 from app.models import Release, Incident
 from datetime import datetime
+from app.aggregates import GRANULARITIES, calculate_metrics_by_platform, calculate_metrics_sql, get_metric_history
+from app.cache import metrics_cache
+from app.conditional import conditional
+from app.timing import timed
+from app.rollup import calculate_metrics_rollup, deployment_volume_rows
+from app.vectorized import calculate_metrics_vectorized
+from app.routes.users import admin_required
 from app.utils import (
-    calculate_change_failure_rate_trend,
-    calculate_deployment_frequency,
-    calculate_deployment_frequency_trend,
-    calculate_lead_time,
-    calculate_change_failure_rate,
-    calculate_lead_time_trend,
-    calculate_time_to_restore,
-    calculate_time_to_restore_trend,
-    get_filtered_releases,
-    get_filtered_incidents,
-    get_previous_period_dates
+    bucket_window_stats,
+    build_metrics,
+    empty_metrics,
+    get_incident_records,
+    get_release_records,
+    get_metric_windows
 )
 
 bp = Blueprint('metrics', __name__, url_prefix='/api/metrics')
@@ -26,112 +28,207 @@ def parse_date(date_str):
     except ValueError:
         return None
 
+def calculate_metrics_in_memory(platform, start_date, end_date, start, end):
+    """Metrics computed from loaded release/incident rows; None when no releases match"""
+    releases = get_release_records(platform, start_date, end_date)
+    if not releases:
+        return None
+
+    incidents = get_incident_records(platform, start_date, end_date)
+    current, previous = bucket_window_stats(releases, incidents, start, end)
+    return build_metrics(current, previous)
+
+def cache_params(platform, start, end, **extra):
+    """Normalized cache key parameters, so equivalent date spellings share an entry"""
+    return dict(extra, platform=platform or None,
+                start=start.isoformat() if start else None,
+                end=end.isoformat() if end else None)
+
+def metrics_scope(platform, start, end):
+    """(platform, first_day, last_day) of the rows a metrics response depends on, previous period included"""
+    current, previous = get_metric_windows(start, end)
+    return platform or None, (previous or current)[0], current[1]
+
+def pivot_deployment_volume(rows):
+    """[{date, <platform>: count}] records from (platform, day, count) rows sorted by day"""
+    data = {}
+    for platform, day, count in rows:
+        date_str = day.isoformat()
+        if date_str not in data:
+            data[date_str] = {'date': date_str}
+        data[date_str][platform] = count
+    return list(data.values())
+
+def columnar_deployment_volume(rows):
+    """{dates, platforms, series} from (platform, day, count) rows sorted by day, in a single pass.
+
+    series[platform][i] is the count on dates[i]; platforms without releases on
+    a date get 0 so every series has len(dates) entries.
+    """
+    dates = []
+    series = {}
+    last_day = None
+    for platform, day, count in rows:
+        if day != last_day:
+            dates.append(day.isoformat())
+            last_day = day
+        values = series.get(platform)
+        if values is None:
+            values = series[platform] = []
+        missing = len(dates) - 1 - len(values)
+        if missing:
+            values.extend([0] * missing)
+        values.append(count)
+    for values in series.values():
+        if len(values) < len(dates):
+            values.extend([0] * (len(dates) - len(values)))
+    platforms = sorted(series)
+    return {'dates': dates, 'platforms': platforms, 'series': {platform: series[platform] for platform in platforms}}
+
+def invalid_granularity():
+    return jsonify({'error': f"Invalid granularity, expected one of {', '.join(GRANULARITIES)}"}), 400
+
 @bp.route('/', methods=['GET'])
 @login_required
+@conditional('release', 'incident')
 def calculate_metrics():
     platform = request.args.get('platform', type=str)
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
+    granularity = request.args.get('granularity')
 
     start = parse_date(start_date)
     end = parse_date(end_date)
 
     if (start_date and not start) or (end_date and not end):
         return jsonify({'error': 'Invalid date format, expected ISO-8601'}), 400
+    if granularity and granularity not in GRANULARITIES:
+        return invalid_granularity()
 
-    releases = get_filtered_releases(platform, start_date, end_date)
-    if not releases:
-        return jsonify({
-            "deployment_frequency": { "value": 0, "trend": 0, "history": [] },
-            "lead_time": { "value": 0, "trend": 0, "history": [] },
-            "change_failure_rate": { "value": 0, "trend": 0, "history": [] },
-            "time_to_restore": { "value": 0, "trend": 0, "history": [] },
-            "note": "No releases found for the given criteria"
-        }), 200
-
-    release_ids = [r.id for r in releases]
-    incidents = get_filtered_incidents(release_ids, start_date, end_date)
-
-    # Calculate current period metrics
-    current_releases = [r for r in releases if 
-                       (not start or datetime.combine(r.rollout_date, datetime.min.time()) >= start) and
-                       (not end or datetime.combine(r.rollout_date, datetime.min.time()) <= end)]
-    current_release_ids = [r.id for r in current_releases]
-    current_incidents = [i for i in incidents if 
-                    i.release_id in current_release_ids and
-                    (not start or i.start_time >= start) and
-                    (not end or i.end_time <= end)]
-
-    # Calculate previous period metrics
-    if start and end:
-        prev_start, prev_end = get_previous_period_dates(start, end)
-        prev_releases = [r for r in releases if 
-                        datetime.combine(r.rollout_date, datetime.min.time()) >= prev_start and
-                        datetime.combine(r.rollout_date, datetime.min.time()) <= prev_end]
-        prev_release_ids = [r.id for r in prev_releases]
-        prev_incidents = [i for i in incidents if i.release_id in prev_release_ids]
-    else:
-        prev_releases = []
-        prev_incidents = []
-
-    metrics = {
-        'deployment_frequency': {
-            'value': calculate_deployment_frequency(current_releases, start, end),
-            'trend': calculate_deployment_frequency_trend(current_releases, start, end) if start and end else 0,
-            'history': []
-        },
-        'lead_time': {
-            'value': calculate_lead_time(current_releases),
-            'trend': calculate_lead_time_trend(current_releases, prev_releases) if prev_releases else 0,
-            'history': []
-        },
-        'change_failure_rate': {
-            'value': calculate_change_failure_rate(current_releases),
-            'trend': calculate_change_failure_rate_trend(current_releases, prev_releases) if prev_releases else 0,
-            'history': []
-        },
-        'time_to_restore': {
-            'value': calculate_time_to_restore(current_incidents),
-            'trend': calculate_time_to_restore_trend(current_incidents, prev_incidents) if prev_incidents else 0,
-            'history': []
-        }
-    }
-
-    return jsonify(metrics)
+    engine = current_app.config.get('METRICS_ENGINE')
+
+    @timed('compute')
+    def compute():
+        if engine == 'python':
+            metrics = calculate_metrics_in_memory(platform, start_date, end_date, start, end)
+        elif engine == 'rollup':
+            metrics = calculate_metrics_rollup(platform, start, end)
+        elif engine == 'vectorized':
+            # History buckets are computed from the same columns
+            metrics = calculate_metrics_vectorized(platform, start, end, granularity)
+        else:
+            metrics = calculate_metrics_sql(platform, start, end)
+
+        if metrics is None:
+            return empty_metrics()
+
+        if granularity and engine != 'vectorized':
+            history = get_metric_history(platform, start, end, granularity)
+            for name, metric in metrics.items():
+                metric['history'] = [{'date': bucket, 'value': value}
+                                     for bucket, value in zip(history['buckets'], history[name])]
+        return metrics
+
+    params = cache_params(platform, start, end, granularity=granularity, engine=engine)
+    metrics = metrics_cache.get_or_compute('metrics', params, metrics_scope(platform, start, end), compute,
+                                           g.data_versions)
+    with timed('serialize'):
+        return jsonify(metrics)
+
+@bp.route('/by-platform', methods=['GET'])
+@login_required
+@conditional('release', 'incident')
+def get_metrics_by_platform():
+    """Metrics and trends for every platform, or the comma separated `platforms`, keyed by platform"""
+    platforms = request.args.get('platforms')
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+
+    start = parse_date(start_date)
+    end = parse_date(end_date)
+
+    if (start_date and not start) or (end_date and not end):
+        return jsonify({'error': 'Invalid date format, expected ISO-8601'}), 400
+
+    platforms = sorted({p.strip() for p in platforms.split(',') if p.strip()}) if platforms else None
+    params = cache_params(None, start, end, platforms=','.join(platforms) if platforms else None)
+    metrics = metrics_cache.get_or_compute(
+        'by-platform', params, metrics_scope(None, start, end),
+        timed('compute')(lambda: calculate_metrics_by_platform(platforms, start, end)), g.data_versions)
+    with timed('serialize'):
+        return jsonify(metrics)
+
+@bp.route('/history', methods=['GET'])
+@login_required
+@conditional('release', 'incident')
+def get_history():
+    platform = request.args.get('platform', type=str)
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    granularity = request.args.get('granularity', 'day')
+
+    start = parse_date(start_date)
+    end = parse_date(end_date)
+
+    if (start_date and not start) or (end_date and not end):
+        return jsonify({'error': 'Invalid date format, expected ISO-8601'}), 400
+    if granularity not in GRANULARITIES:
+        return invalid_granularity()
+
+    (first_day, last_day), _ = get_metric_windows(start, end)
+    params = cache_params(platform, start, end, granularity=granularity)
+    history = metrics_cache.get_or_compute(
+        'history', params, (platform or None, first_day, last_day),
+        timed('compute')(lambda: get_metric_history(platform, start, end, granularity)), g.data_versions)
+    with timed('serialize'):
+        return jsonify(history)
 
 @bp.route('/deployment-volume', methods=['GET'])
 @login_required
+@conditional('release', 'incident')
 def get_deployment_volume():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
-    
+    # 'rows' (default): one object per date; 'columnar': dates array plus one dense array per platform
+    fmt = request.args.get('format', 'rows')
+
     # Parse dates
     start = parse_date(start_date)
     end = parse_date(end_date)
     
     if (start_date and not start) or (end_date and not end):
         return jsonify({'error': 'Invalid date format, expected ISO-8601'}), 400
+    if fmt not in ('rows', 'columnar'):
+        return jsonify({'error': 'Invalid format, expected rows or columnar'}), 400
     
-    query = db.session.query(
-        Release.platform,
-        Release.rollout_date,
-        db.func.count(Release.id).label('count')
-    ).group_by(Release.platform, Release.rollout_date)
-    
-    if start:
-        query = query.filter(Release.rollout_date >= start)
-    if end:
-        query = query.filter(Release.rollout_date <= end)
-    
-    query = query.order_by(Release.rollout_date)  # Add ordering
-    results = query.all()
-    
-    # Transform into format needed by chart
-    data = {}
-    for platform, date, count in results:
-        date_str = date.isoformat()
-        if date_str not in data:
-            data[date_str] = {'date': date_str}
-        data[date_str][platform] = count
-    
-    return jsonify(list(data.values()))
+    def compute():
+        if current_app.config.get('METRICS_ENGINE') == 'rollup':
+            results = deployment_volume_rows(start, end)
+        else:
+            query = db.session.query(
+                Release.platform,
+                Release.rollout_date,
+                db.func.count(Release.id).label('count')
+            ).group_by(Release.platform, Release.rollout_date)
+
+            if start:
+                query = query.filter(Release.rollout_date >= start.date())
+            if end:
+                query = query.filter(Release.rollout_date <= end.date())
+
+            query = query.order_by(Release.rollout_date)  # Add ordering
+            results = query.all()
+
+        if fmt == 'columnar':
+            return columnar_deployment_volume(results)
+        return pivot_deployment_volume(results)
+
+    scope = (None, start.date() if start else None, end.date() if end else None)
+    params = cache_params(None, start, end, engine=current_app.config.get('METRICS_ENGINE'), format=fmt)
+    return jsonify(metrics_cache.get_or_compute('deployment-volume', params, scope, compute, g.data_versions))
+
+@bp.route('/cache', methods=['GET'])
+@login_required
+@admin_required
+def get_cache_stats():
+    return jsonify(metrics_cache.stats())
@@ -1,56 +1,316 @@
-from flask import Blueprint, request, jsonify, abort
+import base64
+import json
+from datetime import date, datetime, timezone
+from flask import Blueprint, request, jsonify, abort, current_app
 from flask_login import login_required, current_user
-from app.models import Release
+from sqlalchemy import insert, select, tuple_
+from app.models import Commit, Release, Incident
 from app import db
+from app.changes import commit_release_changes, release_key
+from app.conditional import conditional
+from app.export import EXPORT_FORMATS, stream_export
+from app.timing import timed
 from functools import wraps
 
 bp = Blueprint('releases', __name__, url_prefix='/api/releases')
 
+RELEASE_FIELDS = ('id', 'platform', 'version', 'release_type', 'is_successful', 'rollout_date',
+                  'mcm_link', 'ci_job_link', 'commit_list_link')
+INCIDENT_EXPORT_FIELDS = ('id', 'external_id', 'release_id', 'platform', 'start_time', 'end_time', 'duration_seconds',
+                          'description')
+
 def write_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         if not current_user.is_authenticated or current_user.role not in ['admin', 'writer']:
             return jsonify({'error': 'Write privileges required'}), 403
+        if getattr(current_user, 'scopes', None) is not None and 'write' not in current_user.scopes:
+            return jsonify({'error': 'Token lacks the write scope'}), 403
         return f(*args, **kwargs)
     return decorated_function
 
+def parse_timestamp(value):
+    """Parse an ISO-8601 string to a naive UTC datetime"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def validate_incident(data):
+    """Return (values, errors) for one incident payload"""
+    if not isinstance(data, dict):
+        return None, ['incident must be an object']
+    values, errors = {'description': data.get('description')}, []
+    for field in ('start_time', 'end_time'):
+        try:
+            values[field] = parse_timestamp(data[field]) if data.get(field) else None
+        except (TypeError, ValueError):
+            errors.append(f'{field} must be an ISO-8601 timestamp')
+    if values['description'] is not None and not isinstance(values['description'], str):
+        errors.append('description must be a string')
+    return values, errors
+
+def validate_commit(data):
+    """Return (values, errors) for one commit payload"""
+    if not isinstance(data, dict):
+        return None, ['commit must be an object']
+    values, errors = {'sha': data.get('sha')}, []
+    try:
+        values['committed_at'] = parse_timestamp(data['committed_at'])
+    except (KeyError, TypeError, ValueError):
+        errors.append('committed_at must be an ISO-8601 timestamp')
+    if values['sha'] is not None and (not isinstance(values['sha'], str) or len(values['sha']) > 40):
+        errors.append('sha must be a string of at most 40 characters')
+    return values, errors
+
+def validate_nested(data, field, validate):
+    """Validate the optional list data[field] of child objects; returns (values, errors)"""
+    items = data.get(field) or []
+    if not isinstance(items, list):
+        return [], [f'{field} must be a list']
+    values, errors = [], []
+    for item in items:
+        item_values, item_errors = validate(item)
+        errors.extend(f'{field}: {error}' for error in item_errors)
+        values.append(item_values)
+    return values, errors
+
+def validate_release(data):
+    """Return (values, errors) for one release payload, ready for Release(**values)"""
+    if not isinstance(data, dict):
+        return None, ['release must be an object']
+    values, errors = {}, []
+    for field in ('platform', 'release_type', 'version'):
+        if not isinstance(data.get(field), str) or not data[field]:
+            errors.append(f'{field} is required')
+        values[field] = data.get(field)
+    if not isinstance(data.get('is_successful'), bool):
+        errors.append('is_successful must be a boolean')
+    values['is_successful'] = data.get('is_successful')
+    try:
+        values['rollout_date'] = (parse_timestamp(data['rollout_date']).date() if data.get('rollout_date')
+                                  else datetime.utcnow().date())
+    except (TypeError, ValueError):
+        errors.append('rollout_date must be an ISO-8601 date')
+    for field in ('mcm_link', 'ci_job_link', 'commit_list_link'):
+        value = data.get(field)
+        if value is not None and (not isinstance(value, str) or len(value) > 512):
+            errors.append(f'{field} must be a string of at most 512 characters')
+        values[field] = value
+    return values, errors
+
 @bp.route('/', methods=['POST'])
 @login_required
 @write_required
 def add_release():
-    data = request.get_json()
-    release = Release(
-        platform=data['platform'],
-        release_type=data['release_type'],
-        is_successful=data['is_successful'],
-        version=data['version'],
-        mcm_link=data.get('mcm_link'),
-        ci_job_link=data.get('ci_job_link'),
-        commit_list_link=data.get('commit_list_link')
-    )
+    data = request.get_json(silent=True)
+    values, errors = validate_release(data)
+    commits = []
+    if values is not None:
+        commits, commit_errors = validate_nested(data, 'commits', validate_commit)
+        errors.extend(commit_errors)
+    if errors:
+        return jsonify({'error': 'Invalid release', 'details': errors}), 400
+    release = Release(**values, commits=[Commit(**commit) for commit in commits])
     db.session.add(release)
-    db.session.commit()
+    commit_release_changes([release_key(release)])
     return jsonify({'message': 'Release added'}), 201
 
-@bp.route('/', methods=['GET'])
+def read_bulk_items(kind='releases'):
+    """Payloads from a JSON array or an NDJSON body; raises ValueError on malformed input"""
+    if request.mimetype == 'application/x-ndjson':
+        return [json.loads(line) for line in request.get_data().splitlines() if line.strip()]
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        raise ValueError(f'expected a JSON array of {kind}')
+    return data
+
+def insert_releases(items):
+    """Insert validated releases with their incidents and commits in chunks; returns the new ids in input order.
+
+    Uses executemany INSERT ... RETURNING, so a chunk costs one round trip for
+    releases and one each for incidents and commits. The caller owns the
+    transaction.
+    """
+    chunk_size = current_app.config['BULK_CHUNK_SIZE']
+    ids = []
+    for offset in range(0, len(items), chunk_size):
+        chunk = items[offset:offset + chunk_size]
+        release_ids = db.session.scalars(
+            insert(Release).returning(Release.id, sort_by_parameter_order=True),
+            [release for release, _, _ in chunk]).all()
+        for model, position in ((Incident, 1), (Commit, 2)):
+            rows = [dict(child, release_id=release_id)
+                    for release_id, item in zip(release_ids, chunk)
+                    for child in item[position]]
+            if rows:
+                db.session.execute(insert(model), rows)
+        ids.extend(release_ids)
+    return ids
+
+@bp.route('/bulk', methods=['POST'])
 @login_required
-def get_releases():
-    platform = request.args.get('platform', type=str)
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    
-    query = Release.query
-    
+@write_required
+def add_releases_bulk():
+    """Create many releases (with optional nested incidents and commits) in one transaction.
+
+    Accepts a JSON array or application/x-ndjson. The batch is validated up
+    front and either every release is created (201) or none are (400); the
+    results list reports each item by its index.
+    """
+    try:
+        payloads = read_bulk_items()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid bulk payload: {e}'}), 400
+    if len(payloads) > current_app.config['BULK_MAX_ITEMS']:
+        return jsonify({'error': f"At most {current_app.config['BULK_MAX_ITEMS']} releases per request"}), 413
+
+    items, results = [], []
+    for index, payload in enumerate(payloads):
+        release, errors = validate_release(payload)
+        incidents, commits = [], []
+        if release is not None:
+            incidents, incident_errors = validate_nested(payload, 'incidents', validate_incident)
+            commits, commit_errors = validate_nested(payload, 'commits', validate_commit)
+            errors.extend(incident_errors + commit_errors)
+        results.append({'index': index, 'status': 'invalid', 'errors': errors} if errors
+                       else {'index': index, 'status': 'valid'})
+        items.append((release, incidents, commits))
+
+    if any(result['status'] == 'invalid' for result in results):
+        return jsonify({'error': 'Invalid releases in batch, nothing was created', 'results': results}), 400
+
+    try:
+        ids = insert_releases(items)
+        commit_release_changes(((release['platform'], release['rollout_date']) for release, _, _ in items),
+                               tables=('release', 'incident'))
+    except Exception as e:
+        current_app.logger.error(f"Bulk release insert failed: {str(e)}")
+        db.session.rollback()
+        return jsonify({'error': 'Internal server error'}), 500
+
+    return jsonify({
+        'message': f'{len(ids)} releases added',
+        'results': [{'index': index, 'status': 'created', 'id': release_id}
+                    for index, release_id in enumerate(ids)]
+    }), 201
+
+def filter_releases(query, platform=None, start_date=None, end_date=None):
+    """Apply the platform/date filters shared by the listing and export endpoints"""
     if platform:
-        query = query.filter_by(platform=platform)
+        query = query.filter(Release.platform == platform)
     if start_date:
         query = query.filter(Release.rollout_date >= start_date)
     if end_date:
         query = query.filter(Release.rollout_date <= end_date)
-        
-    releases = query.all()
-    result = [r.to_dict() for r in releases]
-    return jsonify(result)
+    return query
+
+def encode_cursor(rollout_date, release_id):
+    raw = f'{rollout_date.isoformat()}|{release_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Return (rollout_date, id) from an opaque cursor, or None if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        rollout_date, release_id = raw.split('|')
+        return date.fromisoformat(rollout_date), int(release_id)
+    except ValueError:
+        return None
+
+def page_limit(default, maximum):
+    """The `limit` query argument capped at `maximum`, or None when it is not a positive integer"""
+    raw = request.args.get('limit')
+    if raw is None:
+        return default
+    try:
+        limit = int(raw)
+    except ValueError:
+        return None
+    return min(limit, maximum) if limit >= 1 else None
+
+def serialize_release_row(row, fields):
+    result = {}
+    for field in fields:
+        value = getattr(row, field)
+        result[field] = value.isoformat() if field == 'rollout_date' else value
+    return result
+
+@bp.route('/', methods=['GET'])
+@login_required
+@conditional('release')
+def get_releases():
+    """List releases newest first, one page at a time.
+
+    Pages are keyed on (rollout_date, id); when more rows exist the
+    X-Next-Cursor header holds the cursor for the next request. `fields`
+    limits the selected columns, e.g. fields=id,platform,version.
+    """
+    platform = request.args.get('platform', type=str)
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    cursor = request.args.get('cursor')
+    fields = request.args.get('fields')
+
+    limit = page_limit(current_app.config['RELEASES_PAGE_SIZE'], current_app.config['RELEASES_MAX_PAGE_SIZE'])
+    if limit is None:
+        return jsonify({'error': 'Invalid limit'}), 400
+
+    if fields:
+        fields = [f.strip() for f in fields.split(',') if f.strip()]
+        unknown = [f for f in fields if f not in RELEASE_FIELDS]
+        if unknown:
+            return jsonify({'error': f"Unknown fields: {', '.join(unknown)}"}), 400
+    else:
+        fields = list(RELEASE_FIELDS)
+
+    # id and rollout_date are always selected because the cursor is built from them
+    columns = [getattr(Release, f) for f in RELEASE_FIELDS if f in fields or f in ('id', 'rollout_date')]
+    query = filter_releases(db.session.query(*columns), platform, start_date, end_date)
+
+    if cursor:
+        position = decode_cursor(cursor)
+        if position is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        last_date, last_id = position
+        query = query.filter(tuple_(Release.rollout_date, Release.id) < tuple_(last_date, last_id))
+
+    rows = query.order_by(Release.rollout_date.desc(), Release.id.desc()).limit(limit + 1).all()
+    with timed('serialize'):
+        response = jsonify([serialize_release_row(row, fields) for row in rows[:limit]])
+    if len(rows) > limit:
+        response.headers['X-Next-Cursor'] = encode_cursor(rows[limit - 1].rollout_date, rows[limit - 1].id)
+    return response
+
+def invalid_export_format():
+    return jsonify({'error': f"Invalid format, expected one of {', '.join(EXPORT_FORMATS)}"}), 400
+
+@bp.route('/export', methods=['GET'])
+@login_required
+def export_releases():
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return invalid_export_format()
+
+    stmt = select(*[getattr(Release, f) for f in RELEASE_FIELDS]).order_by(Release.id)
+    stmt = filter_releases(stmt, request.args.get('platform', type=str),
+                           request.args.get('start_date'), request.args.get('end_date'))
+    return stream_export(stmt, RELEASE_FIELDS, fmt, 'releases', 'gzip' in request.accept_encodings)
+
+@bp.route('/export/incidents', methods=['GET'])
+@login_required
+def export_incidents():
+    """Export incidents of the releases matching the same filters as /export"""
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return invalid_export_format()
+
+    stmt = select(Incident.id, Incident.external_id, Incident.release_id, Release.platform, Incident.start_time,
+                  Incident.end_time, Incident.duration_seconds, Incident.description) \
+        .join(Release, Incident.release_id == Release.id).order_by(Incident.id)
+    stmt = filter_releases(stmt, request.args.get('platform', type=str),
+                           request.args.get('start_date'), request.args.get('end_date'))
+    return stream_export(stmt, INCIDENT_EXPORT_FIELDS, fmt, 'incidents', 'gzip' in request.accept_encodings)
 
 @bp.route('/<int:release_id>', methods=['PUT'])
 @login_required
@@ -60,6 +320,7 @@ def update_release(release_id):
     if not release:
         abort(404)
     data = request.get_json()
+    touched = [release_key(release)]
 
     if 'platform' in data:
         release.platform = data['platform']
@@ -76,7 +337,8 @@ def update_release(release_id):
     if 'commit_list_link' in data:
         release.commit_list_link = data['commit_list_link']
 
-    db.session.commit()
+    touched.append(release_key(release))
+    commit_release_changes(touched)
     return jsonify({'message': 'Release updated successfully'})
 
 @bp.route('/<int:release_id>', methods=['DELETE'])
@@ -86,6 +348,7 @@ def delete_release(release_id):
     release = db.session.get(Release, release_id)
     if not release:
         abort(404)
+    touched = [release_key(release)]
     db.session.delete(release)
-    db.session.commit()
+    commit_release_changes(touched, tables=('release', 'incident'))
     return jsonify({'message': 'Release deleted successfully'})
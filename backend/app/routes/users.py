@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify, abort
 from flask_login import login_required, current_user
 from app.models import User
-from app import db, bcrypt
+from app import db
+from app.passwords import password_hasher
+from app.user_cache import user_cache
 from functools import wraps
 
 bp = Blueprint('users', __name__, url_prefix='/api/users')
@@ -11,6 +13,8 @@ def admin_required(f):
     def decorated_function(*args, **kwargs):
         if not current_user.is_authenticated or current_user.role != 'admin':
             return jsonify({'error': 'Admin privileges required'}), 403
+        if getattr(current_user, 'scopes', None) is not None:
+            return jsonify({'error': 'API tokens cannot be used for administration'}), 403
         return f(*args, **kwargs)
     return decorated_function
 
@@ -36,7 +40,7 @@ def create_user():
     if User.query.filter_by(username=data['username']).first():
         return jsonify({'error': 'Username already exists'}), 400
     
-    password_hash = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+    password_hash = password_hasher.hash(data['password'])
     user = User(
         username=data['username'],
         password_hash=password_hash,
@@ -62,11 +66,12 @@ def update_user(user_id):
         user.username = data['username']
     
     if 'password' in data:
-        user.password_hash = bcrypt.generate_password_hash(data['password']).decode('utf-8')
+        user.password_hash = password_hasher.hash(data['password'])
     
     if 'role' in data:
         user.role = data['role']
     
+    user_cache.invalidate(user.id)
     db.session.commit()
     return jsonify({'message': 'User updated successfully'})
 
@@ -80,5 +85,6 @@ def delete_user(user_id):
     if user.id == current_user.id:
         return jsonify({'error': 'Cannot delete your own account'}), 400
     db.session.delete(user)
+    user_cache.invalidate(user_id)
     db.session.commit()
     return jsonify({'message': 'User deleted successfully'})
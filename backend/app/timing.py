@@ -0,0 +1,176 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Tuple
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from . import db
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_LOGGED_PARAMETERS = 1000
+
+
+class RequestTimer:
+    """Where one request's time went: database work plus named segments"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.segments = {}
+        # Parallel metrics queries report from worker threads
+        self.lock = threading.Lock()
+
+    def add_query(self, seconds: float) -> None:
+        with self.lock:
+            self.queries += 1
+            self.db_seconds += seconds
+
+    def add(self, name: str, seconds: float) -> None:
+        self.segments[name] = self.segments.get(name, 0.0) + seconds
+
+    def server_timing(self, total: float) -> str:
+        entries = [f'db;dur={self.db_seconds * 1000:.2f};desc="{self.queries} queries"']
+        entries += [f'{name};dur={seconds * 1000:.2f}' for name, seconds in self.segments.items()]
+        entries.append(f'total;dur={total * 1000:.2f}')
+        return ', '.join(entries)
+
+
+class RouteStats:
+    """Cumulative latency histogram and query totals of one route"""
+
+    def __init__(self):
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.count = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.db_seconds = 0.0
+
+    def observe(self, seconds: float, timer: RequestTimer) -> None:
+        index = bisect_left(DURATION_BUCKETS, seconds)
+        if index < len(self.buckets):
+            self.buckets[index] += 1
+        self.count += 1
+        self.seconds += seconds
+        self.queries += timer.queries
+        self.db_seconds += timer.db_seconds
+
+
+class TimingState:
+    def __init__(self, server_timing: bool, slow_query_seconds: float, logger):
+        self.server_timing = server_timing
+        self.slow_query_seconds = slow_query_seconds
+        self.logger = logger
+        self.slow_queries = 0
+        self.routes: Dict[Tuple[str, str], RouteStats] = {}
+        self.lock = threading.Lock()
+
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RequestTiming:
+    """Per-request timing of database work, metric computation and serialization.
+
+    Cursor events add every statement's duration to the current request's
+    RequestTimer and log statements slower than SLOW_QUERY_MS with their
+    parameters. After each request the breakdown is sent as a Server-Timing
+    header and folded into a per-route histogram, rendered in Prometheus
+    text format by prometheus().
+    """
+
+    def init_app(self, app):
+        state = TimingState(app.config['SERVER_TIMING_ENABLED'], app.config['SLOW_QUERY_MS'] / 1000,
+                            app.logger.getChild('slow_queries'))
+        app.extensions['request_timing'] = state
+        with app.app_context():
+            engine = db.engine
+
+        # The start time lives on the statement's execution context, so a statement that
+        # raises leaves nothing behind on the pooled connection
+        @event.listens_for(engine, 'before_cursor_execute')
+        def start_query(conn, cursor, statement, parameters, context, executemany):
+            if context is not None:
+                context._query_started = time.perf_counter()
+
+        @event.listens_for(engine, 'after_cursor_execute')
+        def end_query(conn, cursor, statement, parameters, context, executemany):
+            started = getattr(context, '_query_started', None)
+            if started is None:
+                return
+            seconds = time.perf_counter() - started
+            timer = g.get('_request_timer') if has_request_context() else None
+            if timer is not None:
+                timer.add_query(seconds)
+            if seconds >= state.slow_query_seconds:
+                with state.lock:
+                    state.slow_queries += 1
+                state.logger.warning('Slow query (%.1f ms%s): %s; parameters: %.*r', seconds * 1000,
+                                     f', {request.method} {request.path}' if has_request_context() else '',
+                                     statement, MAX_LOGGED_PARAMETERS, parameters)
+
+        @app.before_request
+        def start_timer():
+            g._request_timer = RequestTimer()
+
+        @app.after_request
+        def finish_timer(response):
+            timer = g.pop('_request_timer', None)
+            if timer is None:
+                return response
+            total = time.perf_counter() - timer.started
+            if state.server_timing:
+                response.headers['Server-Timing'] = timer.server_timing(total)
+            key = (request.url_rule.rule if request.url_rule else '<unmatched>', request.method)
+            with state.lock:
+                route = state.routes.get(key)
+                if route is None:
+                    route = state.routes[key] = RouteStats()
+                route.observe(total, timer)
+            return response
+
+    @property
+    def state(self) -> TimingState:
+        return current_app.extensions['request_timing']
+
+    def prometheus(self) -> str:
+        """Route latency histograms and query counters in Prometheus text exposition format"""
+        state = self.state
+        lines = ['# HELP sedo_request_duration_seconds Request latency by route.',
+                 '# TYPE sedo_request_duration_seconds histogram']
+        queries = ['# HELP sedo_request_db_queries_total SQL statements executed by route.',
+                   '# TYPE sedo_request_db_queries_total counter']
+        db_seconds = ['# HELP sedo_request_db_seconds_total Time spent in SQL statements by route.',
+                      '# TYPE sedo_request_db_seconds_total counter']
+        with state.lock:
+            for (rule, method), route in sorted(state.routes.items()):
+                labels = f'route="{_label(rule)}",method="{method}"'
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS, route.buckets):
+                    cumulative += count
+                    lines.append(f'sedo_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'sedo_request_duration_seconds_bucket{{{labels},le="+Inf"}} {route.count}')
+                lines.append(f'sedo_request_duration_seconds_sum{{{labels}}} {route.seconds}')
+                lines.append(f'sedo_request_duration_seconds_count{{{labels}}} {route.count}')
+                queries.append(f'sedo_request_db_queries_total{{{labels}}} {route.queries}')
+                db_seconds.append(f'sedo_request_db_seconds_total{{{labels}}} {route.db_seconds}')
+            slow = ['# HELP sedo_slow_queries_total SQL statements slower than SLOW_QUERY_MS.',
+                    '# TYPE sedo_slow_queries_total counter', f'sedo_slow_queries_total {state.slow_queries}']
+        return '\n'.join(lines + queries + db_seconds + slow) + '\n'
+
+
+@contextmanager
+def timed(name: str):
+    """Add the enclosed block's duration to the current request's `name` Server-Timing segment"""
+    timer = g.get('_request_timer') if has_request_context() else None
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timer is not None:
+            timer.add(name, time.perf_counter() - started)
+
+
+request_timing = RequestTiming()
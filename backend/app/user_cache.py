@@ -0,0 +1,119 @@
+import threading
+import time
+from typing import Optional
+from flask import current_app, session
+from flask_login import UserMixin
+from . import db
+from .cache import LRUTTLBackend
+from .conditional import bump_data_versions, get_data_versions
+
+SESSION_KEY = '_user_snapshot'
+# DataVersion counter shared by all processes; bumped whenever a user's role, password or existence changes
+DATA_VERSION = 'user'
+
+
+class CachedUser(UserMixin):
+    """Detached snapshot of a User, used as current_user without an ORM lookup"""
+
+    def __init__(self, id, username, role, scopes=None):
+        self.id = id
+        self.username = username
+        self.role = role
+        # None for session logins; the granted scopes when authenticated with an API token
+        self.scopes = scopes
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'username': self.username,
+            'role': self.role
+        }
+
+
+class UserCacheState:
+    def __init__(self, backend, ttl, session_snapshots, version_interval=0.0):
+        self.backend = backend
+        self.ttl = ttl
+        self.session_snapshots = session_snapshots
+        self.version_interval = version_interval
+        self.version = None
+        self.version_checked_at = float('-inf')
+        self.lock = threading.Lock()
+
+
+class UserCache:
+    """Short-lived cache behind the Flask-Login user_loader.
+
+    Users are looked up in an in-process LRU+TTL cache first, then in a
+    snapshot stored in the signed session cookie, and only then in the
+    database. Snapshots carry the 'user' data version they were taken at;
+    invalidate() bumps that counter in the caller's transaction. Each process
+    re-reads the counter at most every USER_VERSION_CHECK_INTERVAL seconds, so
+    a role change, password change or deletion is honoured by the writing
+    process at once and by every other process within that interval.
+    """
+
+    def init_app(self, app):
+        app.extensions['user_cache'] = UserCacheState(
+            LRUTTLBackend(app.config['USER_CACHE_MAX_ENTRIES']),
+            app.config['USER_CACHE_TTL'],
+            app.config['USER_SESSION_SNAPSHOT'],
+            app.config['USER_VERSION_CHECK_INTERVAL'])
+
+    @property
+    def state(self) -> UserCacheState:
+        return current_app.extensions['user_cache']
+
+    def _version(self) -> int:
+        state = self.state
+        with state.lock:
+            if time.monotonic() - state.version_checked_at < state.version_interval:
+                return state.version
+        version = get_data_versions([DATA_VERSION]).get(DATA_VERSION, 0)
+        with state.lock:
+            state.version, state.version_checked_at = version, time.monotonic()
+        return version
+
+    def remember(self, user, use_session: bool = True, version: Optional[int] = None) -> CachedUser:
+        """Cache a freshly loaded user and store a snapshot of it in the session"""
+        state = self.state
+        snapshot = {'id': user.id, 'username': user.username, 'role': user.role,
+                    'version': self._version() if version is None else version, 'issued_at': time.time()}
+        state.backend.set(str(user.id), snapshot, state.ttl)
+        if state.session_snapshots and use_session:
+            session[SESSION_KEY] = snapshot
+        return CachedUser(user.id, user.username, user.role)
+
+    def load(self, user_id: int, use_session: bool = True) -> Optional[CachedUser]:
+        from .models import User
+        state = self.state
+        version = self._version()
+        snapshot = state.backend.get(str(user_id))
+        if snapshot is None and state.session_snapshots and use_session:
+            candidate = session.get(SESSION_KEY)
+            if (candidate and candidate.get('id') == user_id and
+                    candidate.get('version') == version and
+                    time.time() - candidate.get('issued_at', 0) < state.ttl):
+                snapshot = candidate
+        if snapshot is not None and snapshot['version'] == version:
+            return CachedUser(snapshot['id'], snapshot['username'], snapshot['role'])
+
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        return self.remember(user, use_session, version)
+
+    def invalidate(self, user_id: int) -> None:
+        """Reject every snapshot taken so far; call before committing the user change"""
+        state = self.state
+        bump_data_versions([DATA_VERSION])
+        state.backend.delete(str(user_id))
+        with state.lock:
+            # The new counter is only visible once the change commits; read it again on the next load
+            state.version_checked_at = float('-inf')
+
+    def forget_session(self) -> None:
+        session.pop(SESSION_KEY, None)
+
+
+user_cache = UserCache()
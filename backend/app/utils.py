@@ -1,7 +1,15 @@
-from datetime import datetime, timedelta
-from typing import List, Optional
-from sqlalchemy import and_
-from .models import Release, Incident
+from datetime import date, datetime, time, timedelta
+from typing import List, Optional, Tuple
+from sqlalchemy import and_, select
+from sqlalchemy.orm import selectinload
+from . import db
+from .models import Commit, Release, Incident
+from .quantiles import P2Quantile, QuantileSummary
+
+DayRange = Tuple[Optional[date], Optional[date]]
+
+# Restore time percentiles reported next to the mean as time_to_restore.p50/p90/p99
+RESTORE_QUANTILES = (0.5, 0.9, 0.99)
 
 def calculate_deployment_frequency(releases: List[Release], start_date: Optional[datetime] = None, end_date: Optional[datetime] = None) -> float:
     """Calculate deployments per day"""
@@ -21,15 +29,18 @@ def calculate_deployment_frequency(releases: List[Release], start_date: Optional
     
     return len(filtered_releases) / days_diff
 
+def lead_time_hours(rollout_date: date, committed_at: datetime) -> float:
+    """Hours from a commit to the start of its release's rollout day, never negative"""
+    return max((datetime.combine(rollout_date, datetime.min.time()) - committed_at).total_seconds() / 3600, 0.0)
+
 def calculate_lead_time(releases: List[Release]) -> float:
-    """Calculate average time from commit to deploy (in hours)"""
-    successful_releases = [r for r in releases if r.is_successful]
-    if not successful_releases:
-        return 0.0
-    
-    # In a real system, this would calculate time from commit to deploy
-    # For now, we'll use a placeholder average of 24 hours
-    return 24.0
+    """Calculate median time from commit to deploy (in hours) over the commits of successful releases"""
+    estimator = P2Quantile(0.5)
+    for release in releases:
+        if release.is_successful:
+            for commit in release.commits:
+                estimator.add(lead_time_hours(release.rollout_date, commit.committed_at))
+    return estimator.value()
 
 def calculate_change_failure_rate(releases: List[Release]) -> float:
     """Calculate percentage of deployments that failed"""
@@ -44,11 +55,8 @@ def calculate_time_to_restore(incidents: List[Incident]) -> float:
     if not incidents:
         return 0.0
     
-    restoration_times = []
-    for incident in incidents:
-        if incident.start_time and incident.end_time:
-            duration = incident.end_time - incident.start_time
-            restoration_times.append(duration.total_seconds() / 3600)  # Convert to hours
+    restoration_times = [incident.duration_seconds / 3600 for incident in incidents
+                         if incident.duration_seconds is not None]
     
     if not restoration_times:
         return 0.0
@@ -68,6 +76,18 @@ def get_previous_period_dates(start_date: datetime, end_date: datetime) -> tuple
     previous_start = previous_end - period_length
     return previous_start, previous_end
 
+def first_day_on_or_after(dt: datetime) -> date:
+    """First calendar day whose midnight is >= dt (matches datetime.combine filtering)"""
+    return dt.date() if dt.time() == time.min else dt.date() + timedelta(days=1)
+
+def get_metric_windows(start: Optional[datetime], end: Optional[datetime]) -> Tuple[DayRange, Optional[DayRange]]:
+    """Translate request datetimes into inclusive (first_day, last_day) ranges for the current and previous periods"""
+    current = (first_day_on_or_after(start) if start else None, end.date() if end else None)
+    if not (start and end):
+        return current, None
+    prev_start, prev_end = get_previous_period_dates(start, end)
+    return current, (first_day_on_or_after(prev_start), prev_end.date())
+
 def calculate_deployment_frequency_trend(releases: List[Release], start_date: datetime, end_date: datetime) -> float:
     """Calculate trend for deployment frequency"""
     current_freq = calculate_deployment_frequency(releases, start_date, end_date)
@@ -80,11 +100,11 @@ def calculate_deployment_frequency_trend(releases: List[Release], start_date: da
     
     return calculate_trend(current_freq, prev_freq)
 
-def calculate_lead_time_trend(current_releases: List[Release], previous_releases: List[Release]) -> float:
-    """Calculate trend for lead time"""
-    current_lead_time = calculate_lead_time(current_releases)
-    previous_lead_time = calculate_lead_time(previous_releases)
-    return calculate_trend(current_lead_time, previous_lead_time)
+def calculate_lead_time_trend(current: dict, previous: Optional[dict]) -> float:
+    """Trend of the median lead time between two periods' stats; 0 when the previous period shipped no commits"""
+    if not previous or not previous['lead_time_count']:
+        return 0.0
+    return calculate_trend(current['lead_time_p50'], previous['lead_time_p50'])
 
 def calculate_change_failure_rate_trend(current_releases: List[Release], previous_releases: List[Release]) -> float:
     """Calculate trend for change failure rate"""
@@ -98,25 +118,188 @@ def calculate_time_to_restore_trend(current_incidents: List[Incident], previous_
     previous_time = calculate_time_to_restore(previous_incidents)
     return calculate_trend(current_time, previous_time)
 
+def deployment_frequency_from_stats(deploys: int, first_date, last_date) -> float:
+    """Deployments per day from a count and first/last rollout day"""
+    if deploys < 2:
+        return 0.0
+    days_diff = (last_date - first_date).days or 1  # Avoid division by zero
+    return deploys / days_diff
+
+def change_failure_rate_from_stats(deploys: int, failed: int) -> float:
+    """Percentage of failed deployments from aggregated counts"""
+    if not deploys:
+        return 0.0
+    return (failed / deploys) * 100
+
+def time_to_restore_from_stats(restore_hours: float, restore_count: int) -> float:
+    """Average restore time in hours from aggregated incident durations"""
+    if not restore_count:
+        return 0.0
+    return restore_hours / restore_count
+
+def restore_key(q: float) -> str:
+    return f'restore_p{round(q * 100)}'
+
+def interpolated_percentile(ordered, q: float) -> float:
+    """Linearly interpolated percentile of a sorted sequence, as percentile_cont and NumPy compute it"""
+    if not len(ordered):
+        return 0.0
+    rank = q * (len(ordered) - 1)
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return float(ordered[lower] + (rank - lower) * (ordered[upper] - ordered[lower]))
+
+def set_restore_percentiles(stats: dict, seconds: dict) -> None:
+    """Copy {restore_pNN: seconds or None} percentiles into period stats as hours"""
+    stats.update({key: float(seconds.get(key) or 0) / 3600 for key in map(restore_key, RESTORE_QUANTILES)})
+
+def empty_period_stats() -> dict:
+    return {'deploys': 0, 'failed': 0, 'first_date': None, 'last_date': None,
+            'incidents': 0, 'restore_hours': 0.0, 'restore_count': 0,
+            'restore_p50': 0.0, 'restore_p90': 0.0, 'restore_p99': 0.0,
+            'lead_time_p50': 0.0, 'lead_time_p90': 0.0, 'lead_time_count': 0}
+
+def set_lead_time_stats(stats: dict, summary: QuantileSummary) -> None:
+    """Copy p50/p90 commit lead times from a summary into period stats"""
+    stats.update(lead_time_p50=summary.quantile(0.5), lead_time_p90=summary.quantile(0.9),
+                 lead_time_count=summary.count)
+
+def bucket_window_stats(releases, incidents, start: Optional[datetime], end: Optional[datetime]):
+    """Aggregate loaded releases and incidents into current/previous period stats in one pass each.
+
+    Each release is assigned to at most one period by comparing its rollout
+    day against precomputed day bounds, and the commits of successful releases
+    feed that period's lead time quantiles; incidents are then matched to their
+    release's period with a dict lookup instead of a list scan.
+    """
+    (cur_first, cur_last), previous_days = get_metric_windows(start, end)
+    current = empty_period_stats()
+    previous = empty_period_stats() if previous_days else None
+    prev_first, prev_last = previous_days or (None, None)
+
+    period_by_release = {}
+    current_lead_times, previous_lead_times = QuantileSummary(), QuantileSummary()
+    for r in releases:
+        day = r.rollout_date
+        if (cur_first is None or day >= cur_first) and (cur_last is None or day <= cur_last):
+            stats = current
+        elif previous is not None and prev_first <= day <= prev_last:
+            stats = previous
+        else:
+            continue
+        period_by_release[r.id] = stats
+        stats['deploys'] += 1
+        if not r.is_successful:
+            stats['failed'] += 1
+        if stats['first_date'] is None or day < stats['first_date']:
+            stats['first_date'] = day
+        if stats['last_date'] is None or day > stats['last_date']:
+            stats['last_date'] = day
+        if r.is_successful:
+            lead_times = current_lead_times if stats is current else previous_lead_times
+            for commit in r.commits:
+                lead_times.add(lead_time_hours(day, commit.committed_at))
+
+    set_lead_time_stats(current, current_lead_times)
+    if previous is not None:
+        set_lead_time_stats(previous, previous_lead_times)
+
+    restore_seconds = []
+    for i in incidents:
+        stats = period_by_release.get(i.release_id)
+        if stats is None:
+            continue
+        if stats is current and ((start and not (i.start_time and i.start_time >= start)) or
+                                 (end and not (i.end_time and i.end_time <= end))):
+            continue
+        stats['incidents'] += 1
+        if i.duration_seconds is not None:
+            stats['restore_hours'] += i.duration_seconds / 3600
+            stats['restore_count'] += 1
+            if stats is current:
+                restore_seconds.append(i.duration_seconds)
+
+    restore_seconds.sort()
+    set_restore_percentiles(current, {restore_key(q): interpolated_percentile(restore_seconds, q)
+                                      for q in RESTORE_QUANTILES})
+    return current, previous
+
+def build_metrics(current: dict, previous: Optional[dict]) -> dict:
+    """Build the /api/metrics/ payload from per-period aggregates.
+
+    `current` and `previous` hold deploys, failed, first_date, last_date,
+    incidents, restore_hours, restore_count, the restore_p50/p90/p99 hours and
+    the lead_time_p50/p90/count commit quantiles. `previous` is None when the request has no closed date
+    range, in which case no trends are reported.
+    """
+    def values(stats):
+        return {
+            'deployment_frequency': deployment_frequency_from_stats(
+                stats['deploys'], stats['first_date'], stats['last_date']),
+            'lead_time': stats['lead_time_p50'],
+            'change_failure_rate': change_failure_rate_from_stats(stats['deploys'], stats['failed']),
+            'time_to_restore': time_to_restore_from_stats(stats['restore_hours'], stats['restore_count']),
+        }
+
+    current_values = values(current)
+    previous_values = values(previous) if previous else None
+    # Lead time's trend comes from calculate_lead_time_trend below
+    has_trend = {
+        'deployment_frequency': previous is not None,
+        'lead_time': False,
+        'change_failure_rate': bool(previous and previous['deploys']),
+        'time_to_restore': bool(previous and previous['incidents']),
+    }
+    metrics = {
+        name: {
+            'value': value,
+            'trend': calculate_trend(value, previous_values[name]) if has_trend[name] else 0,
+            'history': []
+        }
+        for name, value in current_values.items()
+    }
+    metrics['lead_time'].update(trend=calculate_lead_time_trend(current, previous),
+                                p50=current['lead_time_p50'], p90=current['lead_time_p90'])
+    metrics['time_to_restore'].update(p50=current['restore_p50'], p90=current['restore_p90'],
+                                      p99=current['restore_p99'])
+    return metrics
+
+def empty_metrics() -> dict:
+    """Payload returned when no releases match the request"""
+    return {
+        "deployment_frequency": { "value": 0, "trend": 0, "history": [] },
+        "lead_time": { "value": 0, "trend": 0, "history": [], "p50": 0, "p90": 0 },
+        "change_failure_rate": { "value": 0, "trend": 0, "history": [] },
+        "time_to_restore": { "value": 0, "trend": 0, "history": [], "p50": 0, "p90": 0, "p99": 0 },
+        "note": "No releases found for the given criteria"
+    }
+
+def release_filters(platform: Optional[str] = None,
+                    start_date: Optional[str] = None,
+                    end_date: Optional[str] = None) -> list:
+    """WHERE conditions on Release shared by the ORM and record loaders.
+
+    The rollout day range is exactly the current period plus, when both dates
+    are given, the previous period from get_previous_period_dates.
+    """
+    conditions = []
+    if platform:
+        conditions.append(Release.platform == platform)
+    current, previous = get_metric_windows(datetime.fromisoformat(start_date) if start_date else None,
+                                           datetime.fromisoformat(end_date) if end_date else None)
+    first_day, last_day = (previous or current)[0], current[1]
+    if first_day:
+        conditions.append(Release.rollout_date >= first_day)
+    if last_day:
+        conditions.append(Release.rollout_date <= last_day)
+    return conditions
+
 def get_filtered_releases(platform: Optional[str] = None, 
                          start_date: Optional[str] = None,
                          end_date: Optional[str] = None) -> List[Release]:
     """Get releases filtered by platform and date range"""
-    query = Release.query
-    
-    if platform:
-        query = query.filter_by(platform=platform)
-    
-    if start_date:
-        # Get releases from the previous period as well for trend calculation
-        start_dt = datetime.fromisoformat(start_date)
-        prev_start = start_dt - timedelta(days=30)  # Get extra month of data
-        query = query.filter(Release.rollout_date >= prev_start.date())
-    if end_date:
-        end_dt = datetime.fromisoformat(end_date)
-        query = query.filter(Release.rollout_date <= end_dt.date())
-    
-    return query.order_by(Release.rollout_date).all()
+    query = Release.query.filter(*release_filters(platform, start_date, end_date))
+    return query.options(selectinload(Release.commits)).order_by(Release.rollout_date).all()
 
 def get_filtered_incidents(release_ids: List[int],
                          start_date: Optional[str] = None,
@@ -124,3 +307,53 @@ def get_filtered_incidents(release_ids: List[int],
     """Get incidents for the given releases"""
     return Incident.query.filter(Incident.release_id.in_(release_ids)).all()
 
+class CommitRecord:
+    __slots__ = ('committed_at',)
+
+    def __init__(self, committed_at):
+        self.committed_at = committed_at
+
+class ReleaseRecord:
+    """The Release fields the metrics helpers read, without ORM hydration or identity-map tracking"""
+    __slots__ = ('id', 'rollout_date', 'is_successful', 'commits')
+
+    def __init__(self, id, rollout_date, is_successful):
+        self.id = id
+        self.rollout_date = rollout_date
+        self.is_successful = is_successful
+        self.commits = []
+
+class IncidentRecord:
+    __slots__ = ('release_id', 'start_time', 'end_time', 'duration_seconds')
+
+    def __init__(self, release_id, start_time, end_time, duration_seconds):
+        self.release_id = release_id
+        self.start_time = start_time
+        self.end_time = end_time
+        self.duration_seconds = duration_seconds
+
+def get_release_records(platform: Optional[str] = None,
+                        start_date: Optional[str] = None,
+                        end_date: Optional[str] = None) -> List[ReleaseRecord]:
+    """Same releases as get_filtered_releases as ReleaseRecord rows, with commits of successful releases attached"""
+    conditions = release_filters(platform, start_date, end_date)
+    rows = db.session.execute(select(Release.id, Release.rollout_date, Release.is_successful)
+                              .where(*conditions).order_by(Release.rollout_date))
+    releases = [ReleaseRecord(*row) for row in rows]
+    by_id = {r.id: r for r in releases}
+    commits = db.session.execute(select(Commit.release_id, Commit.committed_at)
+                                 .join(Release, Commit.release_id == Release.id)
+                                 .where(Release.is_successful.is_(True), *conditions))
+    for release_id, committed_at in commits:
+        by_id[release_id].commits.append(CommitRecord(committed_at))
+    return releases
+
+def get_incident_records(platform: Optional[str] = None,
+                         start_date: Optional[str] = None,
+                         end_date: Optional[str] = None) -> List[IncidentRecord]:
+    """Incidents of the releases get_release_records returns, joined on the same filters instead of an IN list"""
+    rows = db.session.execute(select(Incident.release_id, Incident.start_time, Incident.end_time,
+                                     Incident.duration_seconds)
+                              .join(Release, Incident.release_id == Release.id)
+                              .where(*release_filters(platform, start_date, end_date)))
+    return [IncidentRecord(*row) for row in rows]
@@ -0,0 +1,274 @@
+import math
+from array import array
+from datetime import date, datetime, timedelta
+from typing import Optional
+from sqlalchemy import select
+from . import db
+from .aggregates import bucket_start, commit_lead_time_query, in_days, next_bucket, stream_commit_lead_times
+from .models import Incident, Release
+from .utils import (
+    RESTORE_QUANTILES,
+    DayRange,
+    build_metrics,
+    change_failure_rate_from_stats,
+    empty_period_stats,
+    get_metric_windows,
+    interpolated_percentile,
+    restore_key,
+    set_restore_percentiles,
+    time_to_restore_from_stats
+)
+
+try:
+    import numpy as np
+except ImportError:  # the stdlib array path below is used instead
+    np = None
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def _seconds(value: Optional[datetime]) -> float:
+    return (value - EPOCH).total_seconds() if value is not None else math.nan
+
+
+def _ordinal_bounds(days: DayRange):
+    first_day, last_day = days
+    return (first_day.toordinal() if first_day else -math.inf,
+            last_day.toordinal() if last_day else math.inf)
+
+
+class MetricColumns:
+    """Releases, incidents and commits of a metrics window as parallel columns.
+
+    Rows are converted once: rollout days become ordinals, timestamps and
+    incident durations become seconds (NaN when missing) and commits become
+    lead time hours. The
+    columns are NumPy arrays when NumPy is installed, stdlib arrays otherwise.
+    """
+
+    def __init__(self, releases, incidents, commits):
+        """releases: (rollout_date, is_successful),
+        incidents: (rollout_date, start_time, end_time, duration_seconds),
+        commits: (rollout_date, lead_time_hours)"""
+        self.release_days = array('l', (day.toordinal() for day, _ in releases))
+        self.release_ok = array('b', (1 if ok else 0 for _, ok in releases))
+        self.incident_days = array('l', (day.toordinal() for day, _, _, _ in incidents))
+        self.incident_start = array('d', (_seconds(start) for _, start, _, _ in incidents))
+        self.incident_end = array('d', (_seconds(end) for _, _, end, _ in incidents))
+        self.incident_duration = array('d', (math.nan if duration is None else duration
+                                             for _, _, _, duration in incidents))
+        # commits may be a one-shot stream, so both columns are filled in a single pass
+        self.commit_days, self.commit_hours = array('l'), array('d')
+        for day, hours in commits:
+            self.commit_days.append(day.toordinal())
+            self.commit_hours.append(hours)
+        if np is not None:
+            for name, column in vars(self).items():
+                setattr(self, name, np.asarray(column))
+
+
+def load_metric_columns(platform: Optional[str], days: DayRange) -> MetricColumns:
+    """Select the rows of `days` as plain tuples and convert them into columns"""
+    in_span = in_days(Release.rollout_date, days)
+    release_stmt = select(Release.rollout_date, Release.is_successful).where(in_span)
+    incident_stmt = select(Release.rollout_date, Incident.start_time, Incident.end_time, Incident.duration_seconds) \
+        .join(Release, Incident.release_id == Release.id).where(in_span)
+    if platform:
+        release_stmt = release_stmt.where(Release.platform == platform)
+        incident_stmt = incident_stmt.where(Release.platform == platform)
+    return MetricColumns(db.session.execute(release_stmt).all(), db.session.execute(incident_stmt).all(),
+                         stream_commit_lead_times(commit_lead_time_query(platform, days, None)))
+
+
+def _numpy_period_stats(columns: MetricColumns, days: DayRange, start_s=None, end_s=None) -> dict:
+    low, high = _ordinal_bounds(days)
+    stats = empty_period_stats()
+
+    released = (columns.release_days >= low) & (columns.release_days <= high)
+    stats['deploys'] = int(released.sum())
+    stats['failed'] = int((released & (columns.release_ok == 0)).sum())
+    if stats['deploys']:
+        release_days = columns.release_days[released]
+        stats['first_date'] = date.fromordinal(int(release_days.min()))
+        stats['last_date'] = date.fromordinal(int(release_days.max()))
+
+    # NaN timestamps compare False, so open incidents drop out of a clipped window
+    matched = (columns.incident_days >= low) & (columns.incident_days <= high)
+    if start_s is not None:
+        matched &= columns.incident_start >= start_s
+    if end_s is not None:
+        matched &= columns.incident_end <= end_s
+    durations = columns.incident_duration[matched]
+    durations = durations[~np.isnan(durations)]
+    stats.update(incidents=int(matched.sum()), restore_hours=float(durations.sum()) / 3600,
+                 restore_count=len(durations))
+    if len(durations):
+        set_restore_percentiles(stats, dict(zip(map(restore_key, RESTORE_QUANTILES),
+                                                np.percentile(durations, [q * 100 for q in RESTORE_QUANTILES]))))
+
+    shipped = (columns.commit_days >= low) & (columns.commit_days <= high)
+    hours = columns.commit_hours[shipped]
+    if len(hours):
+        p50, p90 = np.percentile(hours, [50, 90])
+        stats.update(lead_time_p50=float(p50), lead_time_p90=float(p90), lead_time_count=len(hours))
+    return stats
+
+
+def _python_period_stats(columns: MetricColumns, days: DayRange, start_s=None, end_s=None) -> dict:
+    low, high = _ordinal_bounds(days)
+    stats = empty_period_stats()
+
+    first = last = None
+    for day, ok in zip(columns.release_days, columns.release_ok):
+        if low <= day <= high:
+            stats['deploys'] += 1
+            stats['failed'] += not ok
+            first = day if first is None or day < first else first
+            last = day if last is None or day > last else last
+    if first is not None:
+        stats['first_date'], stats['last_date'] = date.fromordinal(first), date.fromordinal(last)
+
+    durations = []
+    for day, started, ended, duration in zip(columns.incident_days, columns.incident_start,
+                                              columns.incident_end, columns.incident_duration):
+        if not low <= day <= high:
+            continue
+        if (start_s is not None and not started >= start_s) or (end_s is not None and not ended <= end_s):
+            continue
+        stats['incidents'] += 1
+        if not math.isnan(duration):
+            durations.append(duration)
+    durations.sort()
+    stats.update(restore_hours=sum(durations) / 3600, restore_count=len(durations))
+    set_restore_percentiles(stats, {restore_key(q): interpolated_percentile(durations, q)
+                                    for q in RESTORE_QUANTILES})
+
+    hours = sorted(h for day, h in zip(columns.commit_days, columns.commit_hours) if low <= day <= high)
+    if hours:
+        stats.update(lead_time_p50=interpolated_percentile(hours, 0.5), lead_time_p90=interpolated_percentile(hours, 0.9),
+                     lead_time_count=len(hours))
+    return stats
+
+
+def vectorized_window_stats(columns: MetricColumns, start: Optional[datetime], end: Optional[datetime]):
+    """Current and previous period stats, same shape and rules as utils.bucket_window_stats.
+
+    Lead time percentiles are exact, interpolated like restore percentiles,
+    because the commit column is already in memory. The other engines stream
+    commits through P² estimators, which are exact up to five commits and
+    approximate beyond, so lead_time p50/p90 can differ slightly between engines.
+    """
+    current, previous = get_metric_windows(start, end)
+    period_stats = _numpy_period_stats if np is not None else _python_period_stats
+    current_stats = period_stats(columns, current, _seconds(start) if start else None,
+                                 _seconds(end) if end else None)
+    previous_stats = period_stats(columns, previous) if previous else None
+    return current_stats, previous_stats
+
+
+def _bucket_lookup(first_day: date, last_day: date, granularity: str):
+    """Bucket start days covering [first_day, last_day] and, per day offset, the index of its bucket"""
+    buckets, lookup = [], []
+    bucket = bucket_start(first_day, granularity)
+    while bucket <= last_day:
+        following = next_bucket(bucket, granularity)
+        days_in_range = (min(following, last_day + timedelta(days=1)) - max(bucket, first_day)).days
+        lookup.extend([len(buckets)] * days_in_range)
+        buckets.append(bucket)
+        bucket = following
+    return buckets, lookup
+
+
+def vectorized_history(columns: MetricColumns, start: Optional[datetime], end: Optional[datetime],
+                       granularity: str) -> dict:
+    """Per-bucket metrics over the current period, same shape as aggregates.get_metric_history"""
+    history = {'granularity': granularity, 'buckets': [], 'deployment_frequency': [],
+               'lead_time': [], 'change_failure_rate': [], 'time_to_restore': []}
+    current, _ = get_metric_windows(start, end)
+    window_low, window_high = _ordinal_bounds(current)
+    if np is not None:
+        release_days = columns.release_days[(columns.release_days >= window_low) &
+                                            (columns.release_days <= window_high)]
+    else:
+        release_days = [day for day in columns.release_days if window_low <= day <= window_high]
+    if not len(release_days):
+        return history
+    first_day = current[0] or date.fromordinal(int(min(release_days)))
+    last_day = current[1] or date.fromordinal(int(max(release_days)))
+    if first_day > last_day:
+        return history
+
+    buckets, lookup = _bucket_lookup(first_day, last_day, granularity)
+    size, origin = len(buckets), first_day.toordinal()
+    start_s, end_s = (_seconds(start) if start else -math.inf), (_seconds(end) if end else math.inf)
+    low, high = origin, last_day.toordinal()
+
+    if np is not None:
+        lookup = np.asarray(lookup)
+        released = (columns.release_days >= low) & (columns.release_days <= high)
+        release_buckets = lookup[columns.release_days[released] - origin]
+        deploys = np.bincount(release_buckets, minlength=size)
+        failed = np.bincount(release_buckets[columns.release_ok[released] == 0], minlength=size)
+
+        restored = ((columns.incident_days >= low) & (columns.incident_days <= high) &
+                    (columns.incident_start >= start_s) & (columns.incident_end <= end_s))
+        incident_buckets = lookup[columns.incident_days[restored] - origin]
+        durations = columns.incident_duration[restored] / 3600
+        restore_hours = np.bincount(incident_buckets, weights=durations, minlength=size)
+        restore_count = np.bincount(incident_buckets, minlength=size)
+
+        shipped = (columns.commit_days >= low) & (columns.commit_days <= high)
+        commit_buckets = lookup[columns.commit_days[shipped] - origin]
+        order = np.argsort(commit_buckets, kind='stable')
+        bounds = np.searchsorted(commit_buckets[order], np.arange(size + 1))
+        hours = columns.commit_hours[shipped][order]
+        lead_time = [float(np.median(hours[bounds[i]:bounds[i + 1]])) if bounds[i] < bounds[i + 1] else 0.0
+                     for i in range(size)]
+    else:
+        deploys, failed = [0] * size, [0] * size
+        for day, ok in zip(columns.release_days, columns.release_ok):
+            if low <= day <= high:
+                index = lookup[day - origin]
+                deploys[index] += 1
+                failed[index] += not ok
+        restore_hours, restore_count = [0.0] * size, [0] * size
+        for day, started, ended, duration in zip(columns.incident_days, columns.incident_start,
+                                                  columns.incident_end, columns.incident_duration):
+            if low <= day <= high and started >= start_s and ended <= end_s:
+                index = lookup[day - origin]
+                restore_hours[index] += duration / 3600
+                restore_count[index] += 1
+        per_bucket = [[] for _ in range(size)]
+        for day, h in zip(columns.commit_days, columns.commit_hours):
+            if low <= day <= high:
+                per_bucket[lookup[day - origin]].append(h)
+        lead_time = [interpolated_percentile(sorted(values), 0.5) for values in per_bucket]
+
+    for i, bucket in enumerate(buckets):
+        following = next_bucket(bucket, granularity)
+        days_in_bucket = (min(following - timedelta(days=1), last_day) - max(bucket, first_day)).days + 1
+        history['buckets'].append(bucket.isoformat())
+        history['deployment_frequency'].append(round(int(deploys[i]) / days_in_bucket, 4))
+        history['lead_time'].append(round(lead_time[i], 4))
+        history['change_failure_rate'].append(round(change_failure_rate_from_stats(int(deploys[i]),
+                                                                                   int(failed[i])), 4))
+        history['time_to_restore'].append(round(time_to_restore_from_stats(float(restore_hours[i]),
+                                                                           int(restore_count[i])), 4))
+    return history
+
+
+def calculate_metrics_vectorized(platform: Optional[str], start: Optional[datetime], end: Optional[datetime],
+                                 granularity: Optional[str] = None) -> Optional[dict]:
+    """DORA metrics (and history when granularity is given) from columns; None when no releases match"""
+    current, previous = get_metric_windows(start, end)
+    columns = load_metric_columns(platform, (previous[0], current[1]) if previous else current)
+    current_stats, previous_stats = vectorized_window_stats(columns, start, end)
+    if not current_stats['deploys'] and not (previous_stats and previous_stats['deploys']):
+        return None
+    metrics = build_metrics(current_stats, previous_stats)
+    if granularity:
+        history = vectorized_history(columns, start, end, granularity)
+        for name, metric in metrics.items():
+            metric['history'] = [{'date': bucket, 'value': value}
+                                 for bucket, value in zip(history['buckets'], history[name])]
+    return metrics
@@ -0,0 +1,67 @@
+"""Throughput of POST /api/releases/bulk on a temporary SQLite database.
+
+    python -m benchmarks.bench_bulk_ingest --releases 100000 --batch 10000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from app import create_app, db, bcrypt
+from app.models import User
+from benchmarks.seed import PLATFORMS
+
+
+def make_payload(count, rng):
+    items = []
+    for i in range(count):
+        item = {'platform': rng.choice(PLATFORMS), 'release_type': 'feature', 'version': f'{i}.0.0',
+                'is_successful': rng.random() > 0.15, 'rollout_date': f'2024-{rng.randint(1, 12):02d}-01'}
+        if not item['is_successful']:
+            item['incidents'] = [{'start_time': '2024-01-01T10:00:00', 'end_time': '2024-01-01T11:00:00'}]
+        items.append(item)
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--releases', type=int, default=100_000)
+    parser.add_argument('--batch', type=int, default=10_000)
+    parser.add_argument('--ndjson', action='store_true', help='Send application/x-ndjson instead of a JSON array')
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}', 'SECRET_KEY': 'bench',
+                      'TESTING': True, 'SESSION_COOKIE_SECURE': False})
+    try:
+        with app.app_context():
+            db.create_all()
+            db.session.add(User(username='bench', role='writer',
+                                password_hash=bcrypt.generate_password_hash('bench').decode('utf-8')))
+            db.session.commit()
+
+        client = app.test_client()
+        client.post('/api/auth/login', json={'username': 'bench', 'password': 'bench'})
+        rng = random.Random(1)
+        elapsed = 0.0
+        for offset in range(0, args.releases, args.batch):
+            items = make_payload(min(args.batch, args.releases - offset), rng)
+            if args.ndjson:
+                body = '\n'.join(json.dumps(item) for item in items)
+                kwargs = {'data': body, 'headers': {'Content-Type': 'application/x-ndjson'}}
+            else:
+                kwargs = {'json': items}
+            started = time.perf_counter()
+            response = client.post('/api/releases/bulk', **kwargs)
+            elapsed += time.perf_counter() - started
+            assert response.status_code == 201, response.get_json()
+
+        print(f'{args.releases} releases in {elapsed:.2f}s: {args.releases / elapsed:,.0f} releases/s')
+    finally:
+        os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
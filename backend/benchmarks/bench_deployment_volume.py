@@ -0,0 +1,53 @@
+"""Pivot time and JSON payload size of /api/metrics/deployment-volume: the
+per-date row objects against the columnar dates/series format.
+
+    python -m benchmarks.bench_deployment_volume --platforms 50 --days 730
+"""
+import argparse
+import gzip
+import json
+import random
+import time
+from datetime import date, timedelta
+from app.routes.metrics import columnar_deployment_volume, pivot_deployment_volume
+
+
+def make_rows(platforms, days, density, seed=1):
+    """(platform, day, count) rows sorted by day, as the grouped query returns them"""
+    rng = random.Random(seed)
+    names = [f'Platform{i:02d}' for i in range(platforms)]
+    first_day = date.today() - timedelta(days=days)
+    return [(name, first_day + timedelta(days=offset), rng.randint(1, 20))
+            for offset in range(days) for name in names if rng.random() < density]
+
+
+def best_of(f, rows, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        payload = f(rows)
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000, payload
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--platforms', type=int, default=50)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--density', type=float, default=0.6, help='Share of (platform, day) cells with releases')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rows = make_rows(args.platforms, args.days, args.density)
+    print(f'{len(rows)} grouped rows, {args.platforms} platforms x {args.days} days')
+    print(f"{'format':<9} {'pivot ms':>9} {'json ms':>8} {'bytes':>10} {'gzip bytes':>11}")
+    for name, f in (('rows', pivot_deployment_volume), ('columnar', columnar_deployment_volume)):
+        pivot_ms, payload = best_of(f, rows, args.repeat)
+        started = time.perf_counter()
+        body = json.dumps(payload, separators=(',', ':')).encode()
+        json_ms = (time.perf_counter() - started) * 1000
+        print(f'{name:<9} {pivot_ms:9.1f} {json_ms:8.1f} {len(body):>10} {len(gzip.compress(body)):>11}')
+
+
+if __name__ == '__main__':
+    main()
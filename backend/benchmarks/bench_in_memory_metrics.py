@@ -0,0 +1,70 @@
+"""Microbenchmark of the in-memory metrics path: the previous list-membership
+matching against the single-pass hash bucketing in utils.bucket_window_stats.
+
+    python -m benchmarks.bench_in_memory_metrics
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from app.utils import bucket_window_stats, get_previous_period_dates
+
+
+def make_rows(release_count, incident_count, seed=1):
+    rng = random.Random(seed)
+    today = datetime.utcnow().date()
+    releases = [SimpleNamespace(id=i, rollout_date=today - timedelta(days=rng.randrange(60)),
+                                is_successful=rng.random() > 0.15, commits=[])
+                for i in range(release_count)]
+    incidents = []
+    for _ in range(incident_count):
+        release = rng.choice(releases)
+        start_time = datetime.combine(release.rollout_date, datetime.min.time()) + timedelta(hours=rng.randrange(24))
+        incidents.append(SimpleNamespace(release_id=release.id, start_time=start_time,
+                                         end_time=start_time + timedelta(minutes=rng.randrange(5, 600))))
+    return releases, incidents
+
+
+def legacy_window_filter(releases, incidents, start, end):
+    """The list-based filtering calculate_metrics used before bucket_window_stats"""
+    current_releases = [r for r in releases if
+                        datetime.combine(r.rollout_date, datetime.min.time()) >= start and
+                        datetime.combine(r.rollout_date, datetime.min.time()) <= end]
+    current_release_ids = [r.id for r in current_releases]
+    current_incidents = [i for i in incidents if
+                         i.release_id in current_release_ids and i.start_time >= start and i.end_time <= end]
+    prev_start, prev_end = get_previous_period_dates(start, end)
+    prev_releases = [r for r in releases if
+                     datetime.combine(r.rollout_date, datetime.min.time()) >= prev_start and
+                     datetime.combine(r.rollout_date, datetime.min.time()) <= prev_end]
+    prev_release_ids = [r.id for r in prev_releases]
+    prev_incidents = [i for i in incidents if i.release_id in prev_release_ids]
+    return current_releases, current_incidents, prev_releases, prev_incidents
+
+
+def timed(f, *args):
+    started = time.perf_counter()
+    f(*args)
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--legacy-max', type=int, default=20_000,
+                        help='Largest release count to run the quadratic legacy path on')
+    args = parser.parse_args()
+
+    end = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    start = end - timedelta(days=30)
+    print(f"{'releases':>9} {'incidents':>9} {'legacy ms':>10} {'bucketed ms':>12}")
+    for release_count in (12_500, 25_000, 50_000, 100_000):
+        releases, incidents = make_rows(release_count, release_count // 2)
+        legacy = (f'{timed(legacy_window_filter, releases, incidents, start, end):10.1f}'
+                  if release_count <= args.legacy_max else f"{'skipped':>10}")
+        bucketed = timed(bucket_window_stats, releases, incidents, start, end)
+        print(f'{release_count:>9} {len(incidents):>9} {legacy} {bucketed:12.1f}')
+
+
+if __name__ == '__main__':
+    main()
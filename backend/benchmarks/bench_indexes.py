@@ -0,0 +1,123 @@
+"""Compare query plans and latency of the metrics/releases hot queries before and after
+the hot-filter index migration.
+
+    python -m benchmarks.bench_indexes --releases 1000000
+    python -m benchmarks.bench_indexes --database-url postgresql://user:pw@localhost/bench
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import select
+from app import create_app, db
+from app.aggregates import incident_stats_query, release_stats_query
+from app.migrations import MIGRATIONS, upgrade
+from app.models import Release, SchemaVersion
+from app.utils import get_metric_windows
+from benchmarks.seed import seed_releases
+
+INDEX_NAMES = ['ix_release_platform_rollout_date', 'ix_release_rollout_date', 'ix_incident_release_id_start_time']
+
+
+def hot_queries(platform='Android', days=90):
+    end = datetime.combine(date.today(), datetime.min.time())
+    start = end - timedelta(days=days)
+    current, previous = get_metric_windows(start, end)
+    return {
+        'metrics_releases': release_stats_query(platform, current, previous),
+        'metrics_incidents': incident_stats_query(platform, current, previous, start, end),
+        'deployment_volume': select(Release.platform, Release.rollout_date, db.func.count(Release.id))
+            .where(Release.rollout_date >= start.date(), Release.rollout_date <= end.date())
+            .group_by(Release.platform, Release.rollout_date)
+            .order_by(Release.rollout_date),
+        'releases_list': select(Release)
+            .where(Release.platform == platform,
+                   Release.rollout_date >= start.date(), Release.rollout_date <= end.date()),
+    }
+
+
+def explain(connection, stmt):
+    compiled = stmt.compile(bind=connection)
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = connection.exec_driver_sql(prefix + compiled.string, params).fetchall()
+    return [' '.join(str(column) for column in row) for row in rows]
+
+
+def measure(repeat):
+    results = {}
+    with db.engine.connect() as connection:
+        for name, stmt in hot_queries().items():
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                connection.execute(stmt).fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = {'median_ms': round(statistics.median(timings), 3), 'plan': explain(connection, stmt)}
+    return results
+
+
+def drop_indexes():
+    with db.engine.begin() as connection:
+        for name in INDEX_NAMES:
+            connection.exec_driver_sql(f'DROP INDEX IF EXISTS {name}')
+        connection.execute(SchemaVersion.__table__.delete())
+
+
+def analyze():
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql('ANALYZE')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--releases', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database-url', help='Defaults to a temporary SQLite file')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    args = parser.parse_args()
+
+    db_path = None
+    url = args.database_url
+    if not url:
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        url = f'sqlite:///{db_path}'
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'SECRET_KEY': 'bench', 'TESTING': True})
+    try:
+        with app.app_context():
+            db.create_all()
+            if not db.session.query(Release.id).first():
+                started = time.perf_counter()
+                releases, incidents = seed_releases(args.releases)
+                print(f'Seeded {releases} releases / {incidents} incidents in {time.perf_counter() - started:.1f}s')
+
+            drop_indexes()
+            analyze()
+            before = measure(args.repeat)
+            upgrade(MIGRATIONS[0][0])
+            analyze()
+            after = measure(args.repeat)
+
+            for name in before:
+                print(f"\n{name}: {before[name]['median_ms']} ms -> {after[name]['median_ms']} ms")
+                print('  before: ' + '\n          '.join(before[name]['plan']))
+                print('  after:  ' + '\n          '.join(after[name]['plan']))
+
+            if args.output:
+                with open(args.output, 'w') as f:
+                    json.dump({'releases': args.releases, 'before': before, 'after': after}, f, indent=2)
+    finally:
+        if db_path:
+            os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
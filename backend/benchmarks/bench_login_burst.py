@@ -0,0 +1,97 @@
+"""Metrics latency during a login burst, with bcrypt inline versus in the hashing process pool.
+
+A fixed pool of request threads stands in for a gunicorn worker's threads.
+Metrics requests arrive at a steady rate while a burst of logins is queued
+behind them; the reported latency includes time spent waiting for a thread.
+
+    python -m benchmarks.bench_login_burst --threads 8 --logins 64
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app import create_app, db
+from app.models import User
+from app.passwords import password_hasher
+from benchmarks.seed import seed_releases
+
+
+def make_app(db_path, workers, queue_depth, rounds):
+    return create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}', 'SECRET_KEY': 'bench',
+                       'TESTING': True, 'SESSION_COOKIE_SECURE': False, 'METRICS_CACHE_ENABLED': False,
+                       'BCRYPT_LOG_ROUNDS': rounds, 'PASSWORD_HASH_WORKERS': workers,
+                       'PASSWORD_HASH_QUEUE_DEPTH': queue_depth})
+
+
+def run(app, threads, logins, metrics_requests, interval):
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, 'client'):
+            local.client = app.test_client()
+            local.client.post('/api/auth/login', json={'username': 'bench', 'password': 'bench'})
+        return local.client
+
+    def timed_metrics(queued_at):
+        client().get('/api/metrics/?platform=Android')
+        return time.perf_counter() - queued_at
+
+    def login():
+        return app.test_client().post('/api/auth/login',
+                                      json={'username': 'bench', 'password': 'bench'}).status_code
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        # Warm every thread's session before measuring
+        list(executor.map(lambda _: client(), range(threads * 2)))
+        burst = [executor.submit(login) for _ in range(logins)]
+        latencies = []
+        for _ in range(metrics_requests):
+            latencies.append(executor.submit(timed_metrics, time.perf_counter()))
+            time.sleep(interval)
+        latencies = sorted(future.result() * 1000 for future in latencies)
+        statuses = [future.result() for future in burst]
+    return latencies, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--metrics', type=int, default=100, help='Metrics requests sent during the burst')
+    parser.add_argument('--interval', type=float, default=0.01, help='Seconds between metrics requests')
+    parser.add_argument('--rounds', type=int, default=12)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        setup = make_app(db_path, 0, 0, args.rounds)
+        with setup.app_context():
+            db.create_all()
+            db.session.add(User(username='bench', role='user', password_hash=password_hasher.hash('bench')))
+            db.session.commit()
+            seed_releases(20_000)
+
+        scenarios = [
+            ('no burst', make_app(db_path, 0, 0, args.rounds), 0),
+            ('burst, inline bcrypt', make_app(db_path, 0, 0, args.rounds), args.logins),
+            ('burst, process pool', make_app(db_path, args.workers, max(1, args.threads // 2), args.rounds),
+             args.logins),
+        ]
+        print(f"{'scenario':<22} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'logins ok':>10} {'503s':>6}")
+        for name, app, logins in scenarios:
+            latencies, statuses = run(app, args.threads, logins, args.metrics, args.interval)
+            password_hasher.shutdown(app)
+            print(f'{name:<22} {statistics.median(latencies):8.1f} '
+                  f'{latencies[int(len(latencies) * 0.95) - 1]:8.1f} {latencies[-1]:8.1f} '
+                  f'{statuses.count(200):>10} {statuses.count(503):>6}')
+    finally:
+        os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Window stats from loaded rows: the per-object utils functions against the
+columnar engine in app.vectorized, with NumPy and with the stdlib fallback.
+
+    python -m benchmarks.bench_vectorized_metrics --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from app import vectorized
+from app.utils import (
+    bucket_window_stats,
+    calculate_change_failure_rate,
+    calculate_deployment_frequency,
+    calculate_time_to_restore,
+    lead_time_hours
+)
+
+
+def make_rows(release_count, seed=1):
+    """ORM-like objects for the utils functions and plain tuples for MetricColumns"""
+    rng = random.Random(seed)
+    today = datetime.utcnow().date()
+    releases, incidents, commits = [], [], []
+    for i in range(release_count):
+        day = today - timedelta(days=rng.randrange(730))
+        ok = rng.random() > 0.15
+        release_commits = [SimpleNamespace(committed_at=datetime.combine(day, datetime.min.time()) -
+                                           timedelta(minutes=rng.lognormvariate(7, 1)))
+                           for _ in range(rng.randint(1, 4))] if ok else []
+        releases.append(SimpleNamespace(id=i, rollout_date=day, is_successful=ok, commits=release_commits))
+        commits.extend((day, lead_time_hours(day, c.committed_at)) for c in release_commits)
+        if not ok:
+            start = datetime.combine(day, datetime.min.time()) + timedelta(minutes=rng.randrange(1440))
+            incidents.append(SimpleNamespace(release_id=i, rollout_date=day, start_time=start,
+                                             end_time=start + timedelta(minutes=rng.lognormvariate(4, 1))))
+    return releases, incidents, commits
+
+
+def per_object_functions(releases, incidents, start, end):
+    """The original calculate_* helpers over the current window's objects"""
+    current = [r for r in releases if start.date() <= r.rollout_date <= end.date()]
+    ids = {r.id for r in current}
+    calculate_deployment_frequency(current, start, end)
+    calculate_change_failure_rate(current)
+    calculate_time_to_restore([i for i in incidents if i.release_id in ids])
+
+
+def timed(f, *args):
+    started = time.perf_counter()
+    result = f(*args)
+    return (time.perf_counter() - started) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--days', type=int, default=90, help='Length of the requested window')
+    args = parser.parse_args()
+
+    numpy = vectorized.np
+    end = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+    start = end - timedelta(days=args.days)
+    print(f"{'releases':>9} {'calc_* ms':>10} {'bucketed ms':>12} {'columns ms':>11} "
+          f"{'numpy ms':>9} {'stdlib ms':>10}")
+    for size in args.sizes:
+        releases, incidents, commits = make_rows(size)
+        legacy_ms, _ = timed(per_object_functions, releases, incidents, start, end)
+        bucketed_ms, _ = timed(bucket_window_stats, releases, incidents, start, end)
+
+        incident_rows = [(i.rollout_date, i.start_time, i.end_time) for i in incidents]
+        release_rows = [(r.rollout_date, r.is_successful) for r in releases]
+        vectorized.np = numpy
+        columns_ms, columns = timed(vectorized.MetricColumns, release_rows, incident_rows, commits)
+        numpy_ms = (f'{timed(vectorized.vectorized_window_stats, columns, start, end)[0]:9.1f}'
+                    if numpy is not None else f"{'n/a':>9}")
+        vectorized.np = None
+        stdlib_columns = vectorized.MetricColumns(release_rows, incident_rows, commits)
+        stdlib_ms, _ = timed(vectorized.vectorized_window_stats, stdlib_columns, start, end)
+        vectorized.np = numpy
+        print(f'{size:>9} {legacy_ms:10.1f} {bucketed_ms:12.1f} {columns_ms:11.1f} {numpy_ms} {stdlib_ms:10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Time and allocations of the in-memory metrics path: ORM Release/Incident
+instances against the column-only ReleaseRecord/IncidentRecord loaders.
+
+    python -m benchmarks.profile_metrics_rows --releases 100000 --days 365
+"""
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from app import create_app, db
+from app.utils import (
+    bucket_window_stats,
+    get_filtered_incidents,
+    get_filtered_releases,
+    get_incident_records,
+    get_release_records
+)
+from benchmarks.seed import seed_releases
+
+
+def orm_path(start_date, end_date, start, end):
+    releases = get_filtered_releases(None, start_date, end_date)
+    incidents = get_filtered_incidents([r.id for r in releases], start_date, end_date)
+    return bucket_window_stats(releases, incidents, start, end)
+
+
+def record_path(start_date, end_date, start, end):
+    releases = get_release_records(None, start_date, end_date)
+    incidents = get_incident_records(None, start_date, end_date)
+    return bucket_window_stats(releases, incidents, start, end)
+
+
+def profile(f, *args):
+    """(untraced seconds, traced seconds, peak traced bytes, blocks still allocated after the call).
+
+    Retained blocks include ORM instances held by the session's identity map.
+    """
+    db.session.expunge_all()
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    f(*args)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+    db.session.expunge_all()
+    started = time.perf_counter()
+    f(*args)
+    return time.perf_counter() - started, elapsed, peak, blocks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--releases', type=int, default=100_000)
+    parser.add_argument('--days', type=int, default=365, help='Length of the requested window')
+    args = parser.parse_args()
+
+    fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{db_path}', 'SECRET_KEY': 'bench'})
+    try:
+        with app.app_context():
+            db.create_all()
+            seed_releases(args.releases)
+            end = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+            start = end - timedelta(days=args.days)
+            dates = (start.isoformat(), end.isoformat(), start, end)
+
+            print(f"{'path':<8} {'ms':>8} {'ms (traced)':>12} {'peak MB':>8} {'retained blocks':>16}")
+            for name, f in (('orm', orm_path), ('records', record_path)):
+                seconds, traced, peak, blocks = profile(f, *dates)
+                print(f'{name:<8} {seconds * 1000:8.1f} {traced * 1000:12.1f} {peak / 2**20:8.1f} {blocks:>16}')
+    finally:
+        os.unlink(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""Seeded synthetic DORA datasets: releases, incidents and commits bulk-inserted for benchmarks."""
+import math
+import random
+from datetime import date, datetime, timedelta
+from app import db
+from app.models import Commit, Incident, Release
+
+PLATFORMS = ['Android', 'iOS', 'Web', 'Roku', 'Samsung', 'Xbox', 'PS4', 'PS5',
+             'FireTV', 'AppleTV', 'Tizen', 'WebOS']
+
+
+class DatasetSpec:
+    """Shape of a generated dataset; the same spec and seed always produce the same rows.
+
+    platform_skew: release volume of the i-th platform is proportional to 1 / (i + 1) ** skew.
+    failure_spread: concentration of the Beta distribution each platform's failure rate is
+        drawn from around failure_rate; 0 gives every platform exactly failure_rate.
+    incident_rate: share of failed releases with an incident; open_incident_rate of those
+        have no end_time yet.
+    Restore times and commit lead times are log-normal around the given medians, and
+    weekend days get weekend_weight of a weekday's releases.
+    """
+
+    def __init__(self, releases=10_000, days=730, platforms=PLATFORMS, platform_skew=0.8,
+                 failure_rate=0.15, failure_spread=20.0, incident_rate=0.9, open_incident_rate=0.01,
+                 median_restore_minutes=60.0, restore_sigma=1.2, commits_per_release=4.0,
+                 median_lead_time_hours=30.0, lead_time_sigma=1.0, weekend_weight=0.3,
+                 end_date=None, seed=1, chunk_size=20_000):
+        self.releases = releases
+        self.days = days
+        self.platforms = list(platforms)
+        self.platform_skew = platform_skew
+        self.failure_rate = failure_rate
+        self.failure_spread = failure_spread
+        self.incident_rate = incident_rate
+        self.open_incident_rate = open_incident_rate
+        self.median_restore_minutes = median_restore_minutes
+        self.restore_sigma = restore_sigma
+        self.commits_per_release = commits_per_release
+        self.median_lead_time_hours = median_lead_time_hours
+        self.lead_time_sigma = lead_time_sigma
+        self.weekend_weight = weekend_weight
+        self.end_date = end_date or date.today()
+        self.seed = seed
+        self.chunk_size = chunk_size
+
+    def describe(self) -> dict:
+        """JSON-friendly parameters, recorded next to benchmark results"""
+        return {name: value.isoformat() if isinstance(value, date) else value
+                for name, value in vars(self).items() if name != 'chunk_size'}
+
+
+def _platform_failure_rates(spec, rng):
+    if not spec.failure_spread or not 0 < spec.failure_rate < 1:
+        return {platform: spec.failure_rate for platform in spec.platforms}
+    alpha = spec.failure_rate * spec.failure_spread
+    beta = (1 - spec.failure_rate) * spec.failure_spread
+    return {platform: rng.betavariate(alpha, beta) for platform in spec.platforms}
+
+
+def seed_dataset(spec: DatasetSpec) -> dict:
+    """Insert the rows described by `spec` in chunks; returns the number of rows per table"""
+    rng = random.Random(spec.seed)
+    failure_rates = _platform_failure_rates(spec, rng)
+    platform_weights = [1 / (i + 1) ** spec.platform_skew for i in range(len(spec.platforms))]
+    day_offsets = list(range(spec.days))
+    day_weights = [spec.weekend_weight if (spec.end_date - timedelta(days=offset)).weekday() >= 5 else 1.0
+                   for offset in day_offsets]
+    restore_mu = math.log(spec.median_restore_minutes)
+    lead_time_mu = math.log(spec.median_lead_time_hours)
+    # Geometric commit counts starting at 1 with the requested mean
+    more_commits = 1 - 1 / spec.commits_per_release if spec.commits_per_release > 1 else 0
+
+    start_id = (db.session.query(db.func.max(Release.id)).scalar() or 0) + 1
+    counts = {'releases': 0, 'incidents': 0, 'commits': 0}
+    for offset in range(0, spec.releases, spec.chunk_size):
+        release_rows, incident_rows, commit_rows = [], [], []
+        size = min(spec.chunk_size, spec.releases - offset)
+        platforms = rng.choices(spec.platforms, platform_weights, k=size)
+        days = rng.choices(day_offsets, day_weights, k=size)
+        for release_id, platform, day in zip(range(start_id + offset, start_id + offset + size), platforms, days):
+            rollout_date = spec.end_date - timedelta(days=day)
+            is_successful = rng.random() >= failure_rates[platform]
+            release_rows.append({
+                'id': release_id,
+                'platform': platform,
+                'release_type': rng.choice(('feature', 'hotfix', 'patch')),
+                'is_successful': is_successful,
+                'version': f'{release_id // 1000}.{release_id % 1000}.0',
+                'rollout_date': rollout_date,
+            })
+            if not is_successful and rng.random() < spec.incident_rate:
+                start_time = datetime.combine(rollout_date, datetime.min.time()) + timedelta(
+                    minutes=rng.randrange(24 * 60))
+                is_open = rng.random() < spec.open_incident_rate
+                incident_rows.append({
+                    'release_id': release_id,
+                    'start_time': start_time,
+                    'end_time': None if is_open else start_time + timedelta(
+                        minutes=rng.lognormvariate(restore_mu, spec.restore_sigma)),
+                    'description': 'Synthetic incident',
+                })
+            if spec.commits_per_release:
+                rollout = datetime.combine(rollout_date, datetime.min.time())
+                while True:
+                    commit_rows.append({
+                        'release_id': release_id,
+                        'sha': f'{rng.getrandbits(160):040x}',
+                        'committed_at': rollout - timedelta(
+                            hours=rng.lognormvariate(lead_time_mu, spec.lead_time_sigma)),
+                    })
+                    if rng.random() >= more_commits:
+                        break
+        db.session.execute(Release.__table__.insert(), release_rows)
+        if incident_rows:
+            db.session.execute(Incident.__table__.insert(), incident_rows)
+        if commit_rows:
+            db.session.execute(Commit.__table__.insert(), commit_rows)
+        db.session.commit()
+        counts['releases'] += len(release_rows)
+        counts['incidents'] += len(incident_rows)
+        counts['commits'] += len(commit_rows)
+    return counts
+
+
+def seed_releases(count, days=730, platforms=PLATFORMS, failure_rate=0.15,
+                  end_date=None, seed=1, chunk_size=20000):
+    """Insert `count` uniformly spread releases, with an incident per failed release and no commits.
+
+    Returns (release_count, incident_count).
+    """
+    counts = seed_dataset(DatasetSpec(
+        releases=count, days=days, platforms=platforms, platform_skew=0, failure_rate=failure_rate,
+        failure_spread=0, incident_rate=1, open_incident_rate=0, median_restore_minutes=math.exp(4),
+        restore_sigma=1, commits_per_release=0, weekend_weight=1, end_date=end_date, seed=seed,
+        chunk_size=chunk_size))
+    return counts['releases'], counts['incidents']
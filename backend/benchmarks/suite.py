@@ -0,0 +1,198 @@
+"""Endpoint benchmark suite over seeded synthetic datasets, with JSON results for comparing commits.
+
+For every dataset size a fresh database is seeded with benchmarks.seed.seed_dataset,
+then each scenario is requested through the Flask test client with the metrics
+cache disabled. Latency percentiles and the SQL statement count (from the
+Server-Timing header) are recorded per (size, scenario).
+
+    python -m benchmarks.suite --sizes 10000 100000 1000000 --output results.json
+    python -m benchmarks.suite --database-url postgresql://user:pw@localhost/bench --sizes 100000
+    python -m benchmarks.suite --sizes 10000 --output new.json --compare old.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+import sqlalchemy
+from app import create_app, db
+from app.models import User
+from app.passwords import password_hasher
+from app.quantiles import nearest_rank
+from app.rollup import rebuild_rollup
+from benchmarks.seed import DatasetSpec, seed_dataset
+
+USERNAME = 'bench'
+PASSWORD = 'bench-password'
+
+
+def scenarios(today):
+    """(name, method, path, json body) of every scenario; login posts credentials, the rest are GETs"""
+    month = f'start_date={today - timedelta(days=30)}&end_date={today}'
+    quarter = f'start_date={today - timedelta(days=90)}&end_date={today}'
+    return [
+        ('metrics_all_time', 'GET', '/api/metrics/', None),
+        ('metrics_30d_platform', 'GET', f'/api/metrics/?platform=Android&{month}', None),
+        ('metrics_90d_weekly_history', 'GET', f'/api/metrics/?{quarter}&granularity=week', None),
+        ('deployment_volume_90d', 'GET', f'/api/metrics/deployment-volume?{quarter}', None),
+        ('deployment_volume_90d_columnar', 'GET', f'/api/metrics/deployment-volume?{quarter}&format=columnar',
+         None),
+        ('releases_first_page', 'GET', '/api/releases/?limit=100', None),
+        ('releases_platform_page', 'GET', f'/api/releases/?platform=Roku&limit=100&{quarter}', None),
+        ('login', 'POST', '/api/auth/login', {'username': USERNAME, 'password': PASSWORD}),
+    ]
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_app(url, engine, rounds, parallel=False):
+    return create_app({'SQLALCHEMY_DATABASE_URI': url, 'SECRET_KEY': 'bench', 'TESTING': True,
+                       'SESSION_COOKIE_SECURE': False, 'METRICS_CACHE_ENABLED': False, 'METRICS_ENGINE': engine,
+                       'METRICS_PARALLEL_QUERIES': parallel, 'BCRYPT_LOG_ROUNDS': rounds,
+                       'PASSWORD_HASH_WORKERS': 0, 'SLOW_QUERY_MS': float('inf')})
+
+
+def prepare(app, spec):
+    """Recreate the schema and seed `spec`; returns the row counts and seconds spent"""
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        counts = seed_dataset(spec)
+        db.session.add(User(username=USERNAME, role='user', password_hash=password_hasher.hash(PASSWORD)))
+        db.session.commit()
+        rebuild_rollup()
+        db.session.execute(sqlalchemy.text('ANALYZE'))
+        db.session.commit()
+        return counts, time.perf_counter() - started
+
+
+def query_count(response):
+    db_entry = response.headers.get('Server-Timing', '').split(',')[0]
+    return int(db_entry.split('desc="')[1].split()[0]) if 'desc="' in db_entry else None
+
+
+def measure(app, method, path, body, repeat, warmup):
+    client = app.test_client()
+    if method == 'GET':
+        client.post('/api/auth/login', json={'username': USERNAME, 'password': PASSWORD})
+    timings, response = [], None
+    for i in range(warmup + repeat):
+        started = time.perf_counter()
+        response = client.open(path, method=method, json=body)
+        elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise RuntimeError(f'{method} {path} returned {response.status_code}')
+        if i >= warmup:
+            timings.append(elapsed * 1000)
+    timings.sort()
+    return {
+        'p50_ms': round(statistics.median(timings), 3),
+        # Nearest rank, so small --repeat values never report a p95 below the median
+        'p95_ms': round(nearest_rank(timings, 0.95), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'min_ms': round(timings[0], 3),
+        'queries': query_count(response),
+        'response_bytes': len(response.get_data()),
+    }
+
+
+def compare(baseline, results, threshold):
+    """Print p50 ratios against a previous run; returns the (size, scenario) pairs slower than threshold"""
+    previous = {(r['size'], r['engine'], r['scenario']): r for r in baseline['results']}
+    regressions = []
+    print(f"\nAgainst {baseline['meta'].get('revision') or 'baseline'}:")
+    print(f"{'size':>9} {'scenario':<32} {'old p50':>9} {'new p50':>9} {'ratio':>6}")
+    for result in results:
+        old = previous.get((result['size'], result['engine'], result['scenario']))
+        if old is None:
+            continue
+        ratio = result['p50_ms'] / old['p50_ms'] if old['p50_ms'] else float('inf')
+        flag = ' !' if ratio > 1 + threshold else ''
+        print(f"{result['size']:>9} {result['scenario']:<32} {old['p50_ms']:9.2f} {result['p50_ms']:9.2f} "
+              f'{ratio:6.2f}{flag}')
+        if flag:
+            regressions.append((result['size'], result['scenario']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--engines', nargs='+', default=['sql'], help='METRICS_ENGINE values to run')
+    parser.add_argument('--scenarios', nargs='+', help='Run only these scenarios')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--days', type=int, default=730)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--parallel', action='store_true', help='Turn on METRICS_PARALLEL_QUERIES')
+    parser.add_argument('--rounds', type=int, default=12, help='bcrypt work factor for the login scenario')
+    parser.add_argument('--database-url', help='Defaults to a temporary SQLite file; its tables are dropped')
+    parser.add_argument('--output', help='Write results as JSON to this path')
+    parser.add_argument('--compare', help='A previous --output file to compare p50 latencies against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Slowdown ratio reported as a regression')
+    args = parser.parse_args()
+
+    db_path = None
+    url = args.database_url
+    if not url:
+        fd, db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        url = f'sqlite:///{db_path}'
+
+    today = date.today()
+    selected = [s for s in scenarios(today) if not args.scenarios or s[0] in args.scenarios]
+    meta = {'revision': git_revision(), 'database': sqlalchemy.engine.make_url(url).get_backend_name(),
+            'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'python': platform.python_version(), 'sqlalchemy': sqlalchemy.__version__,
+            'repeat': args.repeat, 'warmup': args.warmup, 'bcrypt_rounds': args.rounds,
+            'parallel_queries': args.parallel}
+    results, datasets = [], []
+    try:
+        for size in args.sizes:
+            spec = DatasetSpec(releases=size, days=args.days, end_date=today, seed=args.seed)
+            for index, engine in enumerate(args.engines):
+                app = make_app(url, engine, args.rounds, args.parallel)
+                if index == 0:
+                    counts, seconds = prepare(app, spec)
+                    datasets.append(dict(counts, size=size, seed_seconds=round(seconds, 1), spec=spec.describe()))
+                    print(f"\n{size} releases: {counts['incidents']} incidents, {counts['commits']} commits "
+                          f'seeded in {seconds:.1f}s')
+                    print(f"{'engine':<10} {'scenario':<32} {'p50 ms':>9} {'p95 ms':>9} {'queries':>8}")
+                for name, method, path, body in selected:
+                    if name == 'login' and index:
+                        continue
+                    result = measure(app, method, path, body, args.repeat, args.warmup)
+                    results.append(dict(result, size=size, engine=engine, scenario=name))
+                    print(f"{engine:<10} {name:<32} {result['p50_ms']:9.2f} {result['p95_ms']:9.2f} "
+                          f"{result['queries'] if result['queries'] is not None else '-':>8}")
+                with app.app_context():
+                    db.engine.dispose()
+    finally:
+        if db_path:
+            os.unlink(db_path)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'meta': meta, 'datasets': datasets, 'results': results}, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} scenario(s) slower than {1 + args.threshold:.2f}x the baseline')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,3 +7,44 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY')
     SQLALCHEMY_DATABASE_URI = os.getenv('SQLALCHEMY_DATABASE_URI')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # 'sql' aggregates raw tables in the database, 'rollup' reads daily_platform_stats,
+    # 'python' loads rows and computes in memory, 'vectorized' loads rows into columns
+    # (NumPy arrays when installed) and computes with masks
+    METRICS_ENGINE = os.getenv('METRICS_ENGINE', 'sql')
+    RELEASES_PAGE_SIZE = int(os.getenv('RELEASES_PAGE_SIZE', 100))
+    RELEASES_MAX_PAGE_SIZE = int(os.getenv('RELEASES_MAX_PAGE_SIZE', 1000))
+    INCIDENTS_PAGE_SIZE = int(os.getenv('INCIDENTS_PAGE_SIZE', 100))
+    INCIDENTS_MAX_PAGE_SIZE = int(os.getenv('INCIDENTS_MAX_PAGE_SIZE', 1000))
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+    BULK_CHUNK_SIZE = int(os.getenv('BULK_CHUNK_SIZE', 1000))
+    BULK_MAX_ITEMS = int(os.getenv('BULK_MAX_ITEMS', 50000))
+    METRICS_CACHE_ENABLED = os.getenv('METRICS_CACHE_ENABLED', 'true').lower() == 'true'
+    METRICS_CACHE_MAX_ENTRIES = int(os.getenv('METRICS_CACHE_MAX_ENTRIES', 512))
+    METRICS_CACHE_TTL = float(os.getenv('METRICS_CACHE_TTL', 300))
+    USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', 30))
+    USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', 1024))
+    # Seconds a process reuses the shared 'user' data version before reading it again
+    USER_VERSION_CHECK_INTERVAL = float(os.getenv('USER_VERSION_CHECK_INTERVAL', 5))
+    USER_SESSION_SNAPSHOT = os.getenv('USER_SESSION_SNAPSHOT', 'true').lower() == 'true'
+    API_TOKEN_CACHE_TTL = float(os.getenv('API_TOKEN_CACHE_TTL', 60))
+    API_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv('API_TOKEN_CACHE_MAX_ENTRIES', 1024))
+    # bcrypt work factor; hashes with a different cost are upgraded on the next login
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE_DEPTH = int(os.getenv('PASSWORD_HASH_QUEUE_DEPTH', 4))
+    PASSWORD_HASH_RETRY_AFTER = int(os.getenv('PASSWORD_HASH_RETRY_AFTER', 2))
+    # Connection pool; recycle and pre-ping drop connections the server closed while idle
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    # Run a metrics response's independent queries on a thread pool, each on its own connection;
+    # the process then needs up to METRICS_QUERY_WORKERS connections beyond one per request thread
+    METRICS_PARALLEL_QUERIES = os.getenv('METRICS_PARALLEL_QUERIES', 'false').lower() == 'true'
+    METRICS_QUERY_WORKERS = int(os.getenv('METRICS_QUERY_WORKERS', 4))
+    # Queries of one request in flight at once, the request thread included
+    METRICS_QUERY_CONCURRENCY = int(os.getenv('METRICS_QUERY_CONCURRENCY', 3))
+    SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'true').lower() == 'true'
+    # Statements at least this slow are logged with their parameters
+    SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 250))
@@ -17,7 +17,9 @@ def app():
         'SECRET_KEY': 'test-secret-key',
         'WTF_CSRF_ENABLED': False,
         'SESSION_COOKIE_SECURE': False,
-        'SESSION_COOKIE_DOMAIN': None
+        'SESSION_COOKIE_DOMAIN': None,
+        'BCRYPT_LOG_ROUNDS': 4,
+        'PASSWORD_HASH_WORKERS': 0
     }
     app = create_app(config)
 
@@ -63,6 +65,11 @@ def test_admin(app):
         db.session.commit()
         return admin.id
 
+@pytest.fixture
+def release_payload():
+    """Minimal valid body for POST /api/releases/; a fresh dict per test"""
+    return {'platform': 'Android', 'release_type': 'feature', 'is_successful': True, 'version': '1.0.0'}
+
 @pytest.fixture
 def test_release(app):
     with app.app_context():
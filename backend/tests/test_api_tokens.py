@@ -0,0 +1,103 @@
+import pytest
+from flask import g
+from app import db, bcrypt
+from app.api_tokens import api_tokens
+from app.models import ApiToken, User
+
+@pytest.fixture
+def writer(app):
+    user = User(username='ci', role='writer',
+                password_hash=bcrypt.generate_password_hash('ci-password').decode('utf-8'))
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def call(client, method, url, token=None, **kwargs):
+    # The test app context is shared by all requests, so drop Flask-Login's per-context user
+    g.pop('_login_user', None)
+    headers = {'Authorization': f'Bearer {token}'} if token else {}
+    return client.open(url, method=method, headers=headers, **kwargs)
+
+
+def issue(client, scopes):
+    call(client, 'POST', '/api/auth/login', json={'username': 'ci', 'password': 'ci-password'})
+    response = call(client, 'POST', '/api/auth/tokens', json={'name': 'pipeline', 'scopes': scopes})
+    assert response.status_code == 201
+    call(client, 'POST', '/api/auth/logout')
+    return response.get_json()
+
+
+def test_create_and_list_tokens(client, writer):
+    """Test a token is shown once and only its prefix is listed."""
+    created = issue(client, ['read', 'write'])
+    assert created['token'].startswith(created['prefix'])
+    assert created['scopes'] == ['read', 'write']
+
+    call(client, 'POST', '/api/auth/login', json={'username': 'ci', 'password': 'ci-password'})
+    listed = call(client, 'GET', '/api/auth/tokens').get_json()
+    assert [token['id'] for token in listed] == [created['id']]
+    assert 'token' not in listed[0]
+    assert db.session.get(ApiToken, created['id']).token_hash != created['token']
+
+
+def test_write_token_can_post_releases(app, writer, release_payload):
+    """Test a bearer token with the write scope authenticates without a session."""
+    token = issue(app.test_client(), ['write'])['token']
+    client = app.test_client()
+    response = call(client, 'POST', '/api/releases/', token, json=release_payload)
+    assert response.status_code == 201
+    assert 'Set-Cookie' not in response.headers
+
+
+def test_read_token_cannot_write(app, writer, release_payload):
+    """Test write_required rejects tokens without the write scope."""
+    token = issue(app.test_client(), ['read'])['token']
+    client = app.test_client()
+    assert call(client, 'GET', '/api/releases/', token).status_code == 200
+    assert call(client, 'POST', '/api/releases/', token, json=release_payload).status_code == 403
+
+
+def test_tokens_cannot_revoke_tokens(app, writer):
+    """Test token callers, even with the write scope, cannot revoke tokens."""
+    target = issue(app.test_client(), ['read'])
+    client = app.test_client()
+    for scopes in (['read'], ['read', 'write']):
+        token = issue(app.test_client(), scopes)['token']
+        response = call(client, 'DELETE', f"/api/auth/tokens/{target['id']}", token)
+        assert response.status_code == 403
+    assert db.session.get(ApiToken, target['id']).revoked_at is None
+
+
+def test_reader_cannot_mint_write_token(client, test_user, auth_headers):
+    """Test the write scope is limited to users who can write."""
+    response = client.post('/api/auth/tokens', json={'name': 'ci', 'scopes': ['write']})
+    assert response.status_code == 403
+
+
+def test_invalid_and_revoked_tokens(app, writer):
+    """Test unknown and revoked tokens are rejected, including cached ones."""
+    created = issue(app.test_client(), ['write'])
+    client = app.test_client()
+    assert call(client, 'GET', '/api/releases/', 'sedo_not-a-token').status_code == 401
+    assert call(client, 'GET', '/api/releases/', created['token']).status_code == 200
+
+    owner = app.test_client()
+    call(owner, 'POST', '/api/auth/login', json={'username': 'ci', 'password': 'ci-password'})
+    assert call(owner, 'DELETE', f"/api/auth/tokens/{created['id']}").status_code == 200
+    assert call(client, 'GET', '/api/releases/', created['token']).status_code == 401
+
+
+def test_verified_tokens_are_cached(app, writer):
+    """Test repeated verification skips the token lookup."""
+    token, _ = api_tokens.issue(writer, 'cached', ['read'])
+    db.session.commit()
+    with app.test_request_context():
+        assert api_tokens.verify(token).scopes == ('read',)
+    db.session.execute(db.delete(ApiToken))
+    db.session.commit()
+    with app.test_request_context():
+        assert api_tokens.verify(token) is not None
+    app.extensions['api_tokens'].backend.clear()
+    with app.test_request_context():
+        assert api_tokens.verify(token) is None
@@ -0,0 +1,113 @@
+import time
+import pytest
+from datetime import date, datetime, timedelta
+from app import db
+from app.cache import CacheBackend, LRUTTLBackend, metrics_cache
+from app.conditional import bump_data_versions
+from app.models import Release
+from app.rollup import refresh_rollup
+
+
+def test_lru_evicts_least_recently_used():
+    backend = LRUTTLBackend(max_entries=2)
+    backend.set('a', {'value': 1}, ttl=60)
+    backend.set('b', {'value': 2}, ttl=60)
+    backend.get('a')
+    backend.set('c', {'value': 3}, ttl=60)
+    assert backend.get('b') is None
+    assert backend.get('a') == {'value': 1}
+    assert backend.evictions == 1
+
+
+def test_incomplete_backend_cannot_be_created():
+    class GetOnlyBackend(CacheBackend):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnlyBackend()
+
+
+def test_ttl_expiry():
+    backend = LRUTTLBackend()
+    backend.set('a', {'value': 1}, ttl=0.01)
+    time.sleep(0.02)
+    assert backend.get('a') is None
+    assert len(backend) == 0
+
+
+def test_invalidate_matches_platform_and_day_range(app):
+    with app.app_context():
+        metrics_cache.get_or_compute('m', {'p': 'a'}, ('Android', date(2024, 1, 1), date(2024, 1, 31)), lambda: 1)
+        metrics_cache.get_or_compute('m', {'p': 'b'}, ('Roku', date(2024, 1, 1), date(2024, 1, 31)), lambda: 2)
+        metrics_cache.get_or_compute('m', {'p': 'c'}, (None, date(2024, 2, 1), None), lambda: 3)
+
+        assert metrics_cache.invalidate([('Android', date(2024, 3, 1))]) == 1  # only the open-ended entry
+        assert metrics_cache.invalidate([('Android', date(2024, 1, 15))]) == 1
+        assert metrics_cache.stats()['entries'] == 1
+
+
+def test_metrics_cached_until_release_written(client, admin_headers, release_payload):
+    today = datetime.utcnow().date()
+    query = f'/api/metrics/?platform=Android&start_date={today - timedelta(days=7)}&end_date={today}'
+    assert client.post('/api/releases/', json=release_payload, headers=admin_headers).status_code == 201
+
+    first = client.get(query).get_json()
+    assert client.get(query).get_json() == first
+    stats = client.get('/api/metrics/cache').get_json()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+    # a write on another platform keeps the entry in scope, but it is recomputed at the new data version
+    client.post('/api/releases/', json=dict(release_payload, platform='Roku'), headers=admin_headers)
+    client.get(query)
+    client.get(query)
+    stats = client.get('/api/metrics/cache').get_json()
+    assert (stats['hits'], stats['misses'], stats['invalidations']) == (2, 2, 0)
+
+    client.post('/api/releases/', json=dict(release_payload, is_successful=False), headers=admin_headers)
+    refreshed = client.get(query).get_json()
+    assert refreshed['change_failure_rate']['value'] == 50
+    assert client.get('/api/metrics/cache').get_json()['invalidations'] >= 1
+
+
+def test_write_from_another_process_misses(app, client, admin_headers, release_payload):
+    """Test an entry computed before another process committed a write is not served under the new tag."""
+    today = datetime.utcnow().date()
+    query = f'/api/metrics/?platform=Android&start_date={today - timedelta(days=7)}&end_date={today}'
+    client.post('/api/releases/', json=release_payload, headers=admin_headers)
+    etag = client.get(query).headers['ETag']
+
+    # The other process commits through its own session and only clears its own cache
+    with app.app_context():
+        db.session.add(Release(**dict(release_payload, is_successful=False), rollout_date=datetime.utcnow()))
+        refresh_rollup([('Android', today)])
+        bump_data_versions(['release'])
+        db.session.commit()
+
+    response = client.get(query, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['change_failure_rate']['value'] == 50
+
+
+def test_update_and_delete_invalidate(app, client, admin_headers, release_payload):
+    client.post('/api/releases/', json=release_payload, headers=admin_headers)
+    with app.app_context():
+        release_id = Release.query.first().id
+
+    assert client.get('/api/metrics/deployment-volume').get_json()[0]['Android'] == 1
+    client.put(f'/api/releases/{release_id}', json={'platform': 'Roku'}, headers=admin_headers)
+    assert 'Roku' in client.get('/api/metrics/deployment-volume').get_json()[0]
+
+    client.delete(f'/api/releases/{release_id}', headers=admin_headers)
+    assert client.get('/api/metrics/deployment-volume').get_json() == []
+
+
+def test_cache_disabled(app, client, admin_headers):
+    app.extensions['metrics_cache'].enabled = False
+    client.get('/api/metrics/')
+    client.get('/api/metrics/')
+    assert client.get('/api/metrics/cache').get_json()['misses'] == 0
+
+
+def test_cache_stats_admin_only(client, auth_headers):
+    assert client.get('/api/metrics/cache').status_code == 403
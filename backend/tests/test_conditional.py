@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+from sqlalchemy.dialects import postgresql
+from app import db
+from app.conditional import bump_data_versions, get_data_versions
+
+
+def test_bump_data_versions(app):
+    with app.app_context():
+        bump_data_versions(['release'])
+        bump_data_versions(['release', 'incident'])
+        db.session.commit()
+        assert get_data_versions(['release', 'incident', 'user']) == {'release': 2, 'incident': 1}
+
+
+def test_bump_is_a_single_upsert():
+    """Test counters are bumped with one ON CONFLICT statement, so concurrent first writes cannot collide."""
+    executed = []
+    executor = SimpleNamespace(dialect=postgresql.dialect(), execute=lambda stmt, rows: executed.append((stmt, rows)))
+    bump_data_versions(['release', 'incident', 'release'], executor)
+    [(stmt, rows)] = executed
+    assert 'ON CONFLICT (name) DO UPDATE' in str(stmt.compile(dialect=postgresql.dialect()))
+    assert rows == [{'name': 'incident', 'version': 1}, {'name': 'release', 'version': 1}]
+
+
+def test_metrics_not_modified(client, auth_headers):
+    response = client.get('/api/metrics/?platform=Android')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    response = client.get('/api/metrics/?platform=Android', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert response.get_data() == b''
+
+    # a different query has a different tag
+    other = client.get('/api/metrics/?platform=Roku', headers={'If-None-Match': etag})
+    assert other.status_code == 200
+    assert other.headers['ETag'] != etag
+
+
+def test_write_changes_etag(client, admin_headers, release_payload):
+    etag = client.get('/api/releases/').headers['ETag']
+    assert client.post('/api/releases/', json=release_payload, headers=admin_headers).status_code == 201
+
+    response = client.get('/api/releases/', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert len(response.get_json()) == 1
+    assert response.headers['ETag'] != etag
+
+
+def test_deployment_volume_and_history_tagged(client, auth_headers):
+    for url in ('/api/metrics/deployment-volume', '/api/metrics/history'):
+        etag = client.get(url).headers['ETag']
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_errors_are_not_tagged(client, auth_headers):
+    response = client.get('/api/metrics/?start_date=invalid')
+    assert response.status_code == 400
+    assert 'ETag' not in response.headers
+
+
+def test_unauthenticated_request_is_rejected_first(client):
+    assert client.get('/api/metrics/', headers={'If-None-Match': '*'}).status_code == 401
@@ -0,0 +1,111 @@
+import pytest
+from sqlalchemy import exc, text
+from app import create_app, db
+from app.pool import TimedQueuePool, engine_options
+
+
+def test_pool_requires_admin(client, auth_headers):
+    assert client.get('/api/diagnostics/pool').status_code == 403
+
+
+def test_pool_stats(client, admin_headers):
+    client.get('/api/metrics/')
+    data = client.get('/api/diagnostics/pool').get_json()
+    assert data['pool']['class'] == 'TimedQueuePool'
+    assert data['checkouts'] >= 1
+    assert data['connects'] >= 1
+    assert data['in_use'] >= 0
+    assert set(data['checkout_ms']) == {'mean', 'p50', 'p95', 'max'}
+
+
+def test_pool_config(app):
+    pool = db.engine.pool
+    assert isinstance(pool, TimedQueuePool)
+    assert pool.size() == app.config['DB_POOL_SIZE']
+    assert pool.timeout() == app.config['DB_POOL_TIMEOUT']
+    assert pool._pre_ping is app.config['DB_POOL_PRE_PING']
+
+
+def test_memory_sqlite_keeps_default_pool():
+    options = engine_options({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'DB_POOL_PRE_PING': True,
+                              'DB_POOL_RECYCLE': 60})
+    assert options == {'pool_pre_ping': True, 'pool_recycle': 60}
+
+
+def test_checkout_timeout_counted(tmp_path):
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "pool.db"}', 'SECRET_KEY': 'test',
+                      'TESTING': True, 'DB_POOL_SIZE': 1, 'DB_MAX_OVERFLOW': 0, 'DB_POOL_TIMEOUT': 0.05})
+    with app.app_context():
+        held = db.engine.connect()
+        try:
+            assert app.extensions['pool_monitor'].in_use == 1
+            with pytest.raises(exc.TimeoutError):
+                db.engine.connect()
+        finally:
+            held.close()
+        with db.engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+        stats = app.extensions['pool_monitor'].snapshot()
+        assert stats['timeouts'] == 1
+        assert stats['peak_in_use'] == 1
+        assert stats['in_use'] == 0
+        db.engine.dispose()
+        assert db.engine.pool.stats is app.extensions['pool_monitor']
+
+
+def test_server_timing_header(client, auth_headers):
+    response = client.get('/api/metrics/')
+    entries = [entry.strip().split(';')[0] for entry in response.headers['Server-Timing'].split(',')]
+    assert entries[0] == 'db' and entries[-1] == 'total'
+    assert 'compute' in entries and 'serialize' in entries
+    assert 'queries"' in response.headers['Server-Timing']
+
+    cached = client.get('/api/metrics/')
+    assert 'compute;' not in cached.headers['Server-Timing']
+
+
+def test_server_timing_counts_queries(app, client, auth_headers, test_release):
+    response = client.get('/api/releases/')
+    db_entry = response.headers['Server-Timing'].split(',')[0]
+    queries = int(db_entry.split('desc="')[1].split()[0])
+    assert queries >= 1
+
+
+def test_slow_query_log(app, client, auth_headers, caplog):
+    app.extensions['request_timing'].slow_query_seconds = 0
+    with caplog.at_level('WARNING', logger=app.logger.getChild('slow_queries').name):
+        client.get('/api/releases/?platform=Slowest')
+    slow = [record.getMessage() for record in caplog.records if 'Slow query' in record.getMessage()]
+    assert any('GET /api/releases/' in message and 'Slowest' in message for message in slow)
+
+
+def test_failed_query_does_not_skew_timing(app, caplog):
+    state = app.extensions['request_timing']
+    state.slow_query_seconds = 3600
+    with db.engine.connect() as connection:
+        with pytest.raises(exc.OperationalError):
+            connection.execute(text('SELECT * FROM no_such_table'))
+        assert 'query_started' not in connection.info
+        state.slow_query_seconds = 0
+        with caplog.at_level('WARNING', logger=state.logger.name):
+            connection.execute(text('SELECT 1'))
+    assert state.slow_queries == 1
+    assert any('SELECT 1' in record.getMessage() for record in caplog.records)
+
+
+def test_prometheus_metrics(client, admin_headers):
+    client.get('/api/metrics/')
+    client.get('/api/metrics/')
+    response = client.get('/api/diagnostics/metrics')
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    body = response.get_data(as_text=True)
+    assert '# TYPE sedo_request_duration_seconds histogram' in body
+    assert 'sedo_request_duration_seconds_count{route="/api/metrics/",method="GET"} 2' in body
+    assert 'sedo_request_duration_seconds_bucket{route="/api/metrics/",method="GET",le="+Inf"} 2' in body
+    assert 'sedo_request_db_queries_total{route="/api/metrics/",method="GET"}' in body
+    assert 'sedo_db_pool_in_use' in body
+
+
+def test_prometheus_requires_admin(client, auth_headers):
+    assert client.get('/api/diagnostics/metrics').status_code == 403
@@ -0,0 +1,213 @@
+import json
+from datetime import date, datetime
+import pytest
+from app import db
+from app.models import DailyPlatformStats, Incident, Release
+from app.routes import incidents as incidents_module
+
+
+@pytest.fixture
+def releases(app):
+    with app.app_context():
+        rows = [Release(platform=platform, release_type='feature', version=f'1.{i}.0', is_successful=False,
+                        rollout_date=date(2024, 3, 1 + i))
+                for i, platform in enumerate(['Android', 'iOS', 'Android'])]
+        db.session.add_all(rows)
+        db.session.commit()
+        return [release.id for release in rows]
+
+
+def restore_seconds(platform, day):
+    stats = db.session.get(DailyPlatformStats, (platform, day))
+    return stats.incident_count, stats.restore_seconds
+
+
+class TestIncidents:
+    def test_incident_crud(self, client, admin_headers, releases):
+        """Test creating, reading, updating and deleting one incident."""
+        response = client.post('/api/incidents/', json={
+            'release_id': releases[0], 'external_id': 'PD-1', 'start_time': '2024-03-01T10:00:00Z',
+            'end_time': '2024-03-01T10:30:00Z', 'description': 'Crash on start'}, headers=admin_headers)
+        assert response.status_code == 201
+        incident = response.get_json()
+        assert incident['duration_seconds'] == 1800
+        assert client.get(f"/api/incidents/{incident['id']}").get_json()['external_id'] == 'PD-1'
+
+        response = client.put(f"/api/incidents/{incident['id']}", json={
+            'release_id': releases[1], 'end_time': '2024-03-01T11:00:00'}, headers=admin_headers)
+        assert response.status_code == 200
+        assert response.get_json()['duration_seconds'] == 3600
+        with client.application.app_context():
+            assert restore_seconds('Android', date(2024, 3, 1)) == (0, 0)
+            assert restore_seconds('iOS', date(2024, 3, 2)) == (1, 3600)
+
+        assert client.delete(f"/api/incidents/{incident['id']}").status_code == 200
+        assert client.get(f"/api/incidents/{incident['id']}").status_code == 404
+        with client.application.app_context():
+            assert restore_seconds('iOS', date(2024, 3, 2)) == (0, 0)
+
+    def test_add_incident_validation(self, client, admin_headers, releases):
+        """Test invalid payloads, unknown releases and duplicate external ids are rejected."""
+        response = client.post('/api/incidents/', json={'start_time': 'yesterday'}, headers=admin_headers)
+        assert response.status_code == 400
+        assert response.get_json()['details'] == ['start_time must be an ISO-8601 timestamp',
+                                                  'release_id must be an integer']
+        response = client.post('/api/incidents/', json={'release_id': 999}, headers=admin_headers)
+        assert response.status_code == 400
+
+        incident = {'release_id': releases[0], 'external_id': 'PD-1'}
+        assert client.post('/api/incidents/', json=incident, headers=admin_headers).status_code == 201
+        assert client.post('/api/incidents/', json=incident, headers=admin_headers).status_code == 409
+
+    def test_concurrent_duplicate_is_conflict(self, app, client, admin_headers, releases, monkeypatch):
+        """Test an external_id stored by another writer after the duplicate check returns 409, not 500."""
+        monkeypatch.setattr(incidents_module, 'incidents_by_external_id', lambda external_ids: {})
+        with app.app_context():
+            db.session.add(Incident(release_id=releases[0], external_id='PD-1'))
+            db.session.commit()
+        response = client.post('/api/incidents/', json={'release_id': releases[0], 'external_id': 'PD-1'},
+                               headers=admin_headers)
+        assert response.status_code == 409
+        assert response.get_json()['error'] == 'An incident with this external_id already exists'
+
+    def test_writes_require_write_role(self, client, auth_headers, releases):
+        """Test readers can list incidents but not write them."""
+        assert client.get('/api/incidents/').status_code == 200
+        response = client.post('/api/incidents/', json={'release_id': releases[0]}, headers=auth_headers)
+        assert response.status_code == 403
+        assert client.post('/api/incidents/batch', json=[], headers=auth_headers).status_code == 403
+
+    def test_list_filters_and_pages(self, app, client, admin_headers, releases):
+        """Test platform and open filters and cursor paging."""
+        with app.app_context():
+            db.session.add_all([Incident(release_id=releases[i % 3], start_time=datetime(2024, 3, 1),
+                                         end_time=datetime(2024, 3, 2) if i % 2 else None) for i in range(6)])
+            db.session.commit()
+
+        android = client.get('/api/incidents/?platform=Android').get_json()
+        assert {incident['release_id'] for incident in android} == {releases[0], releases[2]}
+        assert len(android) == 4
+        assert all(incident['end_time'] is None for incident in client.get('/api/incidents/?open=true').get_json())
+
+        assert client.get('/api/incidents/?limit=abc').status_code == 400
+        first = client.get('/api/incidents/?limit=4')
+        second = client.get(f"/api/incidents/?limit=4&cursor={first.headers['X-Next-Cursor']}")
+        ids = [incident['id'] for incident in first.get_json() + second.get_json()]
+        assert ids == sorted(ids, reverse=True) and len(ids) == 6
+        assert 'X-Next-Cursor' not in second.headers
+
+
+class TestIncidentBatch:
+    def test_batch_upserts_and_closes(self, client, admin_headers, releases):
+        """Test a batch creates, updates by external id and closes existing incidents."""
+        response = client.post('/api/incidents/batch', json=[
+            {'release_id': releases[0], 'external_id': 'PD-1', 'start_time': '2024-03-01T10:00:00'},
+            {'release_id': releases[1], 'external_id': 'PD-2', 'start_time': '2024-03-02T10:00:00'},
+            {'release_id': releases[1], 'start_time': '2024-03-02T12:00:00', 'end_time': '2024-03-02T12:01:00'},
+        ], headers=admin_headers)
+        assert response.status_code == 200
+        created = response.get_json()['results']
+        assert [result['status'] for result in created] == ['created'] * 3
+
+        response = client.post('/api/incidents/batch', json=[
+            {'op': 'close', 'external_id': 'PD-1', 'end_time': '2024-03-01T12:00:00'},
+            {'release_id': releases[2], 'external_id': 'PD-2', 'start_time': '2024-03-03T10:00:00',
+             'end_time': '2024-03-03T10:15:00', 'description': 'Moved'},
+        ], headers=admin_headers)
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body['message'] == '0 created, 1 updated, 1 closed'
+        assert [(r['status'], r['id']) for r in body['results']] == [('closed', created[0]['id']),
+                                                                     ('updated', created[1]['id'])]
+
+        with client.application.app_context():
+            assert db.session.get(Incident, created[0]['id']).duration_seconds == 7200
+            moved = db.session.get(Incident, created[1]['id'])
+            assert (moved.release_id, moved.description, moved.duration_seconds) == (releases[2], 'Moved', 900)
+            assert restore_seconds('Android', date(2024, 3, 1)) == (1, 7200)
+            assert restore_seconds('iOS', date(2024, 3, 2)) == (1, 60)
+            assert restore_seconds('Android', date(2024, 3, 3)) == (1, 900)
+
+    def test_batch_ndjson_in_chunks(self, app, client, admin_headers, releases, monkeypatch):
+        """Test an NDJSON batch spanning chunks commits and refreshes derived data once."""
+        app.config['BULK_CHUNK_SIZE'] = 2
+        commits = []
+        original = incidents_module.commit_release_changes
+
+        def commit_release_changes(touched, tables):
+            commits.append(set(touched))
+            original(commits[-1], tables)
+        monkeypatch.setattr(incidents_module, 'commit_release_changes', commit_release_changes)
+        events = [{'release_id': releases[i % 2], 'external_id': f'PD-{i}', 'start_time': '2024-03-01T10:00:00'}
+                  for i in range(5)]
+        # A close of an incident opened earlier in the batch folds into its insert
+        events.append({'op': 'close', 'external_id': 'PD-3', 'end_time': '2024-03-01T10:10:00'})
+        response = client.post('/api/incidents/batch', data='\n'.join(json.dumps(e) for e in events),
+                               headers={'Content-Type': 'application/x-ndjson'})
+        assert response.status_code == 200
+        results = response.get_json()['results']
+        assert [r['status'] for r in results] == ['created'] * 5 + ['closed']
+        assert results[5]['id'] == results[3]['id']
+        assert commits == [{('Android', date(2024, 3, 1)), ('iOS', date(2024, 3, 2))}]
+
+        with app.app_context():
+            assert db.session.get(Incident, results[3]['id']).duration_seconds == 600
+            assert restore_seconds('iOS', date(2024, 3, 2)) == (2, 600)
+
+    def test_invalid_batch_writes_nothing(self, app, client, admin_headers, releases):
+        """Test a batch with any invalid event is rejected as a whole."""
+        response = client.post('/api/incidents/batch', json=[
+            {'release_id': releases[0], 'external_id': 'PD-1'},
+            {'release_id': 999},
+            {'op': 'close', 'external_id': 'PD-404', 'end_time': '2024-03-01T10:00:00'},
+            {'op': 'close', 'external_id': 'PD-1', 'end_time': '2024-03-01T10:00:00'},
+            {'op': 'reopen'},
+        ], headers=admin_headers)
+        assert response.status_code == 400
+        results = response.get_json()['results']
+        assert [r['status'] for r in results] == ['valid', 'invalid', 'invalid', 'valid', 'invalid']
+        assert results[1]['errors'] == ['release 999 does not exist']
+        assert results[2]['errors'] == ['no incident with external_id PD-404']
+        with app.app_context():
+            assert db.session.query(Incident).count() == 0
+
+    @pytest.fixture
+    def stored_incident(self, app, releases):
+        with app.app_context():
+            incident = Incident(release_id=releases[0], external_id='PD-1', start_time=datetime(2024, 3, 1, 1))
+            db.session.add(incident)
+            db.session.commit()
+            return incident.id
+
+    def test_batch_applies_events_in_order(self, app, client, admin_headers, releases, stored_incident):
+        """Test a close before an upsert is replaced by it, and a close after an upsert ends the new state."""
+        response = client.post('/api/incidents/batch', json=[
+            {'op': 'close', 'external_id': 'PD-1', 'end_time': '2024-03-01T05:00:00'},
+            {'release_id': releases[0], 'external_id': 'PD-1', 'start_time': '2024-03-01T04:00:00'},
+        ], headers=admin_headers)
+        assert response.status_code == 200
+        assert [r['id'] for r in response.get_json()['results']] == [stored_incident] * 2
+        with app.app_context():
+            incident = db.session.get(Incident, stored_incident)
+            assert (incident.start_time, incident.end_time, incident.duration_seconds) == \
+                (datetime(2024, 3, 1, 4), None, None)
+
+        response = client.post('/api/incidents/batch', json=[
+            {'release_id': releases[0], 'external_id': 'PD-1', 'start_time': '2024-03-01T04:00:00'},
+            {'op': 'close', 'external_id': 'PD-1', 'end_time': '2024-03-01T05:00:00'},
+            {'release_id': releases[0], 'external_id': 'PD-1', 'start_time': '2024-03-01T04:30:00'},
+            {'op': 'close', 'external_id': 'PD-1', 'end_time': '2024-03-01T06:00:00'},
+        ], headers=admin_headers)
+        assert response.status_code == 200
+        assert [r['status'] for r in response.get_json()['results']] == ['updated', 'closed', 'updated', 'closed']
+        with app.app_context():
+            incident = db.session.get(Incident, stored_incident)
+            assert (incident.start_time, incident.end_time, incident.duration_seconds) == \
+                (datetime(2024, 3, 1, 4, 30), datetime(2024, 3, 1, 6), 5400)
+            assert restore_seconds('Android', date(2024, 3, 1)) == (1, 5400)
+
+    def test_batch_rejects_non_array(self, client, admin_headers):
+        """Test the batch endpoint requires an array."""
+        response = client.post('/api/incidents/batch', json={'release_id': 1}, headers=admin_headers)
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'Invalid bulk payload: expected a JSON array of incidents'
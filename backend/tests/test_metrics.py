@@ -1,5 +1,7 @@
+import random
+import threading
 import pytest
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from app.models import Release, Incident
 from app import db
 
@@ -138,3 +140,494 @@ class TestMetrics:
             assert r2.get_json()['change_failure_rate']['value'] == 100
             assert r1.get_json()['time_to_restore']['value'] == 0
             assert r2.get_json()['time_to_restore']['value'] > 0
+
+
+@pytest.fixture
+def random_data(app):
+    """Releases and incidents spread over the last few weeks on two platforms."""
+    rng = random.Random(42)
+    with app.app_context():
+        now = datetime.utcnow()
+        for i in range(60):
+            rollout = (now - timedelta(days=rng.randint(0, 25))).date()
+            release = Release(
+                platform=rng.choice(['A', 'B']),
+                release_type='feature',
+                version=f'3.0.{i}',
+                is_successful=rng.random() > 0.3,
+                rollout_date=rollout
+            )
+            db.session.add(release)
+            db.session.flush()
+            if not release.is_successful:
+                start_time = datetime.combine(rollout, datetime.min.time()) + timedelta(hours=rng.randint(0, 30))
+                db.session.add(Incident(
+                    release_id=release.id,
+                    start_time=start_time,
+                    end_time=start_time + timedelta(minutes=rng.randint(5, 600)),
+                    description='Random failure'
+                ))
+        db.session.commit()
+
+
+class TestMetricsEngines:
+
+    QUERIES = [
+        '',
+        'platform=A',
+        'start_date={ten_days_ago}&end_date={now}',
+        'platform=B&start_date={ten_days_ago}&end_date={now}',
+        'start_date={week_ago_midnight}&end_date={today}',
+        'start_date={ten_days_ago}',
+        'end_date={ten_days_ago}',
+    ]
+
+    def _get(self, client, app, engine, query):
+        app.config['METRICS_ENGINE'] = engine
+        response = client.get(f'/api/metrics/?{query}')
+        assert response.status_code == 200
+        return response.get_json()
+
+    def test_sql_engine_matches_in_memory(self, app, login_test_user, random_data):
+        now = datetime.utcnow()
+        params = {
+            'now': now.isoformat(),
+            'ten_days_ago': (now - timedelta(days=10)).isoformat(),
+            'week_ago_midnight': (now - timedelta(days=7)).date().isoformat(),
+            'today': now.date().isoformat(),
+        }
+        for template in self.QUERIES:
+            query = template.format(**params)
+            expected = self._get(login_test_user, app, 'python', query)
+            actual = self._get(login_test_user, app, 'sql', query)
+            for name in ('deployment_frequency', 'lead_time', 'change_failure_rate', 'time_to_restore'):
+                assert actual[name]['value'] == pytest.approx(expected[name]['value'], rel=1e-6), (query, name)
+                assert actual[name]['trend'] == pytest.approx(expected[name]['trend'], rel=1e-6), (query, name)
+
+    def test_records_match_orm_rows(self, app, random_data):
+        """Test the record loaders return the ORM loaders' rows without adding to the identity map."""
+        from app.utils import (get_filtered_incidents, get_filtered_releases, get_incident_records,
+                               get_release_records)
+        db.session.expunge_all()
+        start_date = (datetime.utcnow() - timedelta(days=10)).isoformat()
+        records = get_release_records('A', start_date)
+        incidents = get_incident_records('A', start_date)
+        assert len(db.session.identity_map) == 0
+
+        releases = get_filtered_releases('A', start_date)
+        assert [(r.id, r.rollout_date, r.is_successful, [c.committed_at for c in r.commits])
+                for r in records] == [(r.id, r.rollout_date, r.is_successful, [c.committed_at for c in r.commits])
+                                      for r in releases]
+        orm_incidents = get_filtered_incidents([r.id for r in releases])
+        assert sorted((i.release_id, i.start_time, i.end_time) for i in incidents) == \
+            sorted((i.release_id, i.start_time, i.end_time) for i in orm_incidents)
+
+    def test_sql_engine_no_releases(self, app, login_test_user):
+        app.config['METRICS_ENGINE'] = 'sql'
+        response = login_test_user.get('/api/metrics/?platform=Missing')
+        assert response.status_code == 200
+        assert response.get_json()['note'] == 'No releases found for the given criteria'
+
+    def test_deployment_frequency_trend_uses_previous_period(self, app, login_test_user):
+        with app.app_context():
+            for days_ago in (1, 2, 3, 4, 6, 7, 8):
+                db.session.add(Release(
+                    platform=PLATFORM_NAME,
+                    release_type='feature',
+                    is_successful=True,
+                    version=f'4.0.{days_ago}',
+                    rollout_date=date.today() - timedelta(days=days_ago)
+                ))
+            db.session.commit()
+
+        start_date = (date.today() - timedelta(days=4)).isoformat()
+        end_date = (date.today() - timedelta(days=1)).isoformat()
+        for engine in ('sql', 'python'):
+            metrics = self._get(login_test_user, app, engine,
+                                f'platform={PLATFORM_NAME}&start_date={start_date}&end_date={end_date}')
+            # 4 deploys over 3 days against 3 deploys over 2 days
+            assert metrics['deployment_frequency']['value'] == pytest.approx(4 / 3)
+            assert metrics['deployment_frequency']['trend'] == pytest.approx((4 / 3 - 1.5) / 1.5 * 100)
+
+    def test_in_memory_engine_skips_open_incidents(self, app, login_test_user):
+        with app.app_context():
+            release = Release(platform=PLATFORM_NAME, release_type='feature', is_successful=False,
+                              version='5.0.0', rollout_date=date.today())
+            db.session.add(release)
+            db.session.flush()
+            db.session.add(Incident(release_id=release.id, start_time=datetime.utcnow(), description='Still open'))
+            db.session.commit()
+
+        start_date = (date.today() - timedelta(days=1)).isoformat()
+        end_date = (datetime.utcnow() + timedelta(hours=1)).isoformat()
+        for engine in ('sql', 'python'):
+            metrics = self._get(login_test_user, app, engine,
+                                f'platform={PLATFORM_NAME}&start_date={start_date}&end_date={end_date}')
+            assert metrics['change_failure_rate']['value'] == 100
+            assert metrics['time_to_restore']['value'] == 0
+
+
+class TestMetricsHistory:
+
+    @pytest.fixture
+    def history_data(self, app):
+        # Monday 2024-01-01 .. Sunday 2024-01-14, one release per day, every third one failed
+        with app.app_context():
+            for offset in range(14):
+                rollout = date(2024, 1, 1) + timedelta(days=offset)
+                release = Release(platform=PLATFORM_NAME, release_type='feature', version=f'6.0.{offset}',
+                                  is_successful=offset % 3 != 0, rollout_date=rollout)
+                db.session.add(release)
+                db.session.flush()
+                if not release.is_successful:
+                    start_time = datetime.combine(rollout, datetime.min.time()) + timedelta(hours=2)
+                    db.session.add(Incident(release_id=release.id, start_time=start_time,
+                                            end_time=start_time + timedelta(hours=offset + 1)))
+            db.session.commit()
+
+    def test_weekly_history(self, login_test_user, history_data):
+        response = login_test_user.get(
+            '/api/metrics/history?granularity=week&start_date=2024-01-01&end_date=2024-01-14')
+        assert response.status_code == 200
+        history = response.get_json()
+        assert history['granularity'] == 'week'
+        assert history['buckets'] == ['2024-01-01', '2024-01-08']
+        assert history['deployment_frequency'] == [1.0, 1.0]
+        # failed offsets 0, 3, 6 in week one and 9, 12 in week two
+        assert history['change_failure_rate'] == pytest.approx([3 / 7 * 100, 2 / 7 * 100], rel=1e-3)
+        assert history['time_to_restore'] == pytest.approx([(1 + 4 + 7) / 3, (10 + 13) / 2], rel=1e-3)
+
+    def test_daily_history_is_dense(self, login_test_user, history_data):
+        response = login_test_user.get(
+            '/api/metrics/history?granularity=day&start_date=2023-12-30&end_date=2024-01-02')
+        history = response.get_json()
+        assert history['buckets'] == ['2023-12-30', '2023-12-31', '2024-01-01', '2024-01-02']
+        assert history['deployment_frequency'] == [0, 0, 1.0, 1.0]
+
+    def test_monthly_history_clips_partial_bucket(self, login_test_user, history_data):
+        response = login_test_user.get('/api/metrics/history?granularity=month&end_date=2024-01-31')
+        history = response.get_json()
+        assert history['buckets'] == ['2024-01-01']
+        # no start date: the range starts at the first release
+        assert history['deployment_frequency'] == [pytest.approx(14 / 31, rel=1e-3)]
+
+    def test_metrics_history_arrays(self, login_test_user, history_data):
+        response = login_test_user.get(
+            f'/api/metrics/?platform={PLATFORM_NAME}&start_date=2024-01-08&end_date=2024-01-14&granularity=week')
+        metrics = response.get_json()
+        assert metrics['change_failure_rate']['history'] == [
+            {'date': '2024-01-08', 'value': pytest.approx(2 / 7 * 100, rel=1e-3)}]
+
+    def test_invalid_granularity(self, login_test_user):
+        response = login_test_user.get('/api/metrics/history?granularity=hour')
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'Invalid granularity, expected one of day, week, month'
+
+
+class TestDeploymentVolume:
+
+    def test_columnar_matches_rows(self, app, login_test_user, random_data):
+        """Test the columnar format carries the same counts as the row format."""
+        from app.rollup import rebuild_rollup
+        rebuild_rollup()
+        db.session.commit()
+        for engine in ('sql', 'rollup'):
+            app.config['METRICS_ENGINE'] = engine
+            rows = login_test_user.get('/api/metrics/deployment-volume').get_json()
+            columnar = login_test_user.get('/api/metrics/deployment-volume?format=columnar').get_json()
+
+            assert columnar['dates'] == [row['date'] for row in rows]
+            assert columnar['platforms'] == ['A', 'B']
+            for platform, values in columnar['series'].items():
+                assert values == [row.get(platform, 0) for row in rows]
+
+    def test_columnar_pads_missing_platforms(self):
+        from app.routes.metrics import columnar_deployment_volume
+        rows = [('A', date(2024, 1, 1), 2), ('B', date(2024, 1, 2), 1), ('A', date(2024, 1, 3), 4)]
+        assert columnar_deployment_volume(rows) == {
+            'dates': ['2024-01-01', '2024-01-02', '2024-01-03'],
+            'platforms': ['A', 'B'],
+            'series': {'A': [2, 0, 4], 'B': [0, 1, 0]},
+        }
+
+    def test_invalid_format(self, login_test_user):
+        response = login_test_user.get('/api/metrics/deployment-volume?format=xml')
+        assert response.status_code == 400
+
+
+class TestLeadTime:
+
+    @pytest.fixture
+    def commit_data(self, app):
+        """Commits of releases in 2024-01-08..14 and the previous week."""
+        from app.models import Commit
+        from app.rollup import rebuild_rollup
+        releases = [
+            (date(2024, 1, 10), True, [datetime(2024, 1, 9), datetime(2024, 1, 8), datetime(2024, 1, 9, 12)]),
+            (date(2024, 1, 12), False, [datetime(2024, 1, 1)]),
+            (date(2024, 1, 5), True, [datetime(2024, 1, 4, 12)]),
+        ]
+        for i, (rollout, ok, commits) in enumerate(releases):
+            db.session.add(Release(platform=PLATFORM_NAME, release_type='feature', version=f'5.0.{i}',
+                                   is_successful=ok, rollout_date=rollout,
+                                   commits=[Commit(sha=f'{i}{n}', committed_at=c) for n, c in enumerate(commits)]))
+        db.session.commit()
+        rebuild_rollup()
+        db.session.commit()
+
+    @pytest.mark.parametrize('engine', ['sql', 'python', 'rollup', 'vectorized'])
+    def test_lead_time_quantiles(self, app, login_test_user, commit_data, engine):
+        """Test lead time is the median commit age of successful releases, with p90 and a trend."""
+        app.config['METRICS_ENGINE'] = engine
+        response = login_test_user.get('/api/metrics/?start_date=2024-01-08&end_date=2024-01-14')
+        lead_time = response.get_json()['lead_time']
+        assert lead_time['value'] == lead_time['p50'] == 24.0
+        assert lead_time['p90'] == pytest.approx(43.2)
+        assert lead_time['trend'] == 100.0
+
+    def test_lead_time_history(self, login_test_user, commit_data):
+        response = login_test_user.get('/api/metrics/history?granularity=week&start_date=2024-01-01&end_date=2024-01-14')
+        assert response.get_json()['lead_time'] == [12.0, 24.0]
+
+    def test_calculate_lead_time(self, app, commit_data):
+        from app.utils import calculate_lead_time, calculate_lead_time_trend, empty_period_stats
+        releases = Release.query.order_by(Release.rollout_date).all()
+        assert calculate_lead_time(releases[1:]) == 24.0
+        current = dict(empty_period_stats(), lead_time_p50=24.0, lead_time_count=3)
+        previous = dict(empty_period_stats(), lead_time_p50=12.0, lead_time_count=1)
+        assert calculate_lead_time_trend(current, previous) == 100.0
+        assert calculate_lead_time_trend(current, dict(previous, lead_time_count=0)) == 0.0
+        assert calculate_lead_time_trend(current, None) == 0.0
+
+
+class TestVectorizedEngine:
+
+    @pytest.fixture(params=['numpy', 'stdlib'])
+    def columns_backend(self, request, monkeypatch):
+        """Run with NumPy when installed and with the stdlib array fallback."""
+        from app import vectorized
+        if request.param == 'numpy':
+            pytest.importorskip('numpy')
+        else:
+            monkeypatch.setattr(vectorized, 'np', None)
+        return request.param
+
+    def test_matches_sql_engine(self, app, login_test_user, random_data, columns_backend):
+        """Test vectorized metrics and history match the SQL engine."""
+        today = datetime.utcnow().date()
+        queries = ['', 'platform=A', f'start_date={today - timedelta(days=10)}&end_date={today}&granularity=week',
+                   f'platform=B&start_date={today - timedelta(days=20)}&end_date={today - timedelta(days=3)}'
+                   '&granularity=day']
+        for query in queries:
+            results = {}
+            for engine in ('sql', 'vectorized'):
+                app.config['METRICS_ENGINE'] = engine
+                results[engine] = login_test_user.get(f'/api/metrics/?{query}').get_json()
+            for name in ('deployment_frequency', 'lead_time', 'change_failure_rate', 'time_to_restore'):
+                assert results['vectorized'][name]['value'] == pytest.approx(results['sql'][name]['value'], rel=1e-6)
+                assert results['vectorized'][name]['trend'] == pytest.approx(results['sql'][name]['trend'], rel=1e-6)
+                assert results['vectorized'][name]['history'] == results['sql'][name]['history']
+
+    def test_lead_time_quantiles_are_exact(self, app, login_test_user, columns_backend):
+        """Test vectorized lead times are exact percentiles and the streaming engines' P² estimates are close."""
+        from app.models import Commit
+        from app.utils import interpolated_percentile
+        rng = random.Random(7)
+        rollout = datetime(2024, 1, 10)
+        committed = [rollout - timedelta(hours=rng.lognormvariate(3, 1)) for _ in range(300)]
+        db.session.add(Release(platform=PLATFORM_NAME, release_type='feature', version='8.0.0', is_successful=True,
+                               rollout_date=rollout.date(),
+                               commits=[Commit(sha=str(n), committed_at=c) for n, c in enumerate(committed)]))
+        db.session.commit()
+        hours = sorted((rollout - c).total_seconds() / 3600 for c in committed)
+
+        results = {}
+        for engine in ('sql', 'vectorized'):
+            app.config['METRICS_ENGINE'] = engine
+            results[engine] = login_test_user.get('/api/metrics/?start_date=2024-01-08&end_date=2024-01-14') \
+                .get_json()['lead_time']
+        assert results['vectorized']['p50'] == pytest.approx(interpolated_percentile(hours, 0.5))
+        assert results['vectorized']['p90'] == pytest.approx(interpolated_percentile(hours, 0.9))
+        assert results['sql']['p50'] == pytest.approx(results['vectorized']['p50'], rel=0.1)
+        assert results['sql']['p90'] == pytest.approx(results['vectorized']['p90'], rel=0.15)
+
+    def test_no_releases(self, app, login_test_user, columns_backend):
+        app.config['METRICS_ENGINE'] = 'vectorized'
+        response = login_test_user.get('/api/metrics/?granularity=day')
+        assert response.get_json()['note'] == 'No releases found for the given criteria'
+
+
+def reference_metrics(releases, incidents, start, end):
+    """The original route's list-based calculation over every release, without any fetch window"""
+    from app.utils import (calculate_change_failure_rate, calculate_change_failure_rate_trend,
+                           calculate_deployment_frequency, calculate_time_to_restore,
+                           calculate_time_to_restore_trend, calculate_trend, get_previous_period_dates)
+
+    def midnight(r):
+        return datetime.combine(r.rollout_date, datetime.min.time())
+
+    releases = sorted(releases, key=lambda r: r.rollout_date)
+    current = [r for r in releases if start <= midnight(r) <= end]
+    current_ids = {r.id for r in current}
+    current_incidents = [i for i in incidents if i.release_id in current_ids and
+                         i.start_time >= start and i.end_time <= end]
+    prev_start, prev_end = get_previous_period_dates(start, end)
+    previous = [r for r in releases if prev_start <= midnight(r) <= prev_end]
+    previous_ids = {r.id for r in previous}
+    previous_incidents = [i for i in incidents if i.release_id in previous_ids]
+    return {
+        'deployment_frequency': (calculate_deployment_frequency(current, start, end), calculate_trend(
+            calculate_deployment_frequency(current, start, end),
+            calculate_deployment_frequency(previous, prev_start, prev_end))),
+        'change_failure_rate': (calculate_change_failure_rate(current),
+                                calculate_change_failure_rate_trend(current, previous) if previous else 0),
+        'time_to_restore': (calculate_time_to_restore(current_incidents),
+                            calculate_time_to_restore_trend(current_incidents, previous_incidents)
+                            if previous_incidents else 0),
+    }
+
+
+class TestTrendProperty:
+
+    def test_engines_match_reference_on_random_windows(self, app, login_test_user):
+        """Test metrics and trends match the reference for random data and windows, including long ones."""
+        rng = random.Random(2024)
+        first_day = date(2022, 1, 1)
+        for i in range(400):
+            release = Release(platform=rng.choice(['A', 'B']), release_type='feature', version=f'9.{i}',
+                              is_successful=rng.random() > 0.25,
+                              rollout_date=first_day + timedelta(days=rng.randrange(1000)))
+            db.session.add(release)
+            db.session.flush()
+            if not release.is_successful:
+                start_time = datetime.combine(release.rollout_date, datetime.min.time()) + \
+                    timedelta(minutes=rng.randrange(2000))
+                db.session.add(Incident(release_id=release.id, start_time=start_time,
+                                        end_time=start_time + timedelta(minutes=rng.randint(1, 900))))
+        db.session.commit()
+        releases, incidents = Release.query.all(), Incident.query.all()
+
+        for _ in range(40):
+            start = datetime.combine(first_day + timedelta(days=rng.randrange(1000)), datetime.min.time())
+            if rng.random() < 0.5:
+                start += timedelta(hours=rng.randrange(24))
+            end = start + timedelta(days=rng.choice([0, 1, 7, 30, 90, 365, 500]), hours=rng.randrange(24))
+            expected = reference_metrics(releases, incidents, start, end)
+            query = f'start_date={start.isoformat()}&end_date={end.isoformat()}'
+            for engine in ('python', 'sql'):
+                app.config['METRICS_ENGINE'] = engine
+                actual = login_test_user.get(f'/api/metrics/?{query}').get_json()
+                if 'note' in actual:
+                    assert all(value == (0, 0) for value in expected.values()), query
+                    continue
+                for name, (value, trend) in expected.items():
+                    assert actual[name]['value'] == pytest.approx(value, rel=1e-6), (engine, query, name)
+                    assert actual[name]['trend'] == pytest.approx(trend, rel=1e-6), (engine, query, name)
+
+
+class TestMetricsByPlatform:
+
+    def test_matches_per_platform_requests(self, app, login_test_user, random_data):
+        """Test every platform's entry equals the single-platform response."""
+        today = datetime.utcnow().date()
+        for query in ('', f'start_date={today - timedelta(days=10)}&end_date={today}'):
+            combined = login_test_user.get(f'/api/metrics/by-platform?{query}').get_json()
+            assert sorted(combined) == ['A', 'B']
+            for platform, metrics in combined.items():
+                single = login_test_user.get(f'/api/metrics/?platform={platform}&{query}').get_json()
+                for name in ('deployment_frequency', 'lead_time', 'change_failure_rate', 'time_to_restore'):
+                    assert metrics[name]['value'] == pytest.approx(single[name]['value'], rel=1e-6)
+                    assert metrics[name]['trend'] == pytest.approx(single[name]['trend'], rel=1e-6)
+
+    def test_platform_subset(self, login_test_user, random_data):
+        response = login_test_user.get('/api/metrics/by-platform?platforms=B,Missing')
+        assert list(response.get_json()) == ['B']
+
+    def test_grouped_queries(self, app, login_test_user, random_data):
+        """Test the statement count does not grow with the number of platforms."""
+        from sqlalchemy import event
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        event.listen(db.engine, 'before_cursor_execute', listener)
+        try:
+            login_test_user.get('/api/metrics/by-platform')
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', listener)
+        assert len([s for s in statements if 'FROM release' in s or 'FROM incident' in s]) == 4
+
+
+class TestParallelQueries:
+
+    def test_parallel_matches_sequential(self, app, login_test_user, random_data):
+        """Test running the window, history and per-platform queries concurrently changes no result."""
+        app.extensions['metrics_cache'].enabled = False
+        today = datetime.utcnow().date()
+        window = f'start_date={today - timedelta(days=10)}&end_date={today}'
+        paths = ['/api/metrics/', f'/api/metrics/?platform=A&{window}&granularity=week',
+                 f'/api/metrics/history?{window}', '/api/metrics/history', f'/api/metrics/by-platform?{window}']
+        state = app.extensions['parallel_queries']
+        for path in paths:
+            state.enabled = False
+            expected = login_test_user.get(path).get_json()
+            state.enabled = True
+            assert login_test_user.get(path).get_json() == expected, path
+
+    def test_workers_do_not_touch_session(self, app, login_test_user, random_data, monkeypatch):
+        """Test statements are built on the request thread, so workers never consult the scoped session."""
+        app.extensions['metrics_cache'].enabled = False
+        app.extensions['parallel_queries'].enabled = True
+        threads = set()
+        get_bind = db.session.get_bind
+
+        def recording_get_bind(*args, **kwargs):
+            threads.add(threading.get_ident())
+            return get_bind(*args, **kwargs)
+        monkeypatch.setattr(db.session, 'get_bind', recording_get_bind)
+        for path in ['/api/metrics/', '/api/metrics/history?start_date=2024-01-01&end_date=2024-01-31',
+                     '/api/metrics/by-platform']:
+            assert login_test_user.get(path).status_code == 200
+        assert threads == {threading.get_ident()}
+
+
+class TestRestorePercentiles:
+
+    @pytest.fixture
+    def outage_data(self, app):
+        """Four short incidents and one multi-day outage in 2024-01-08..14, one short incident before."""
+        from app.rollup import rebuild_rollup
+        hours = [(date(2024, 1, 9), h) for h in (1, 2, 3, 4, 100)] + [(date(2024, 1, 3), 6)]
+        for i, (rollout, duration) in enumerate(hours):
+            release = Release(platform=PLATFORM_NAME, release_type='feature', version=f'6.0.{i}',
+                              is_successful=False, rollout_date=rollout)
+            db.session.add(release)
+            db.session.flush()
+            start_time = datetime.combine(rollout, datetime.min.time())
+            db.session.add(Incident(release_id=release.id, start_time=start_time,
+                                    end_time=start_time + timedelta(hours=duration)))
+        db.session.add(Incident(release_id=release.id, start_time=start_time))
+        db.session.commit()
+        rebuild_rollup()
+        db.session.commit()
+
+    @pytest.mark.parametrize('engine', ['sql', 'python', 'rollup', 'vectorized'])
+    def test_percentiles(self, app, login_test_user, outage_data, engine):
+        """Test p50/p90/p99 interpolate like percentile_cont while the mean stays skewed by the outage."""
+        app.config['METRICS_ENGINE'] = engine
+        response = login_test_user.get('/api/metrics/?start_date=2024-01-08&end_date=2024-01-14T23:59:59')
+        time_to_restore = response.get_json()['time_to_restore']
+        assert time_to_restore['value'] == pytest.approx(22.0)
+        assert time_to_restore['p50'] == pytest.approx(3.0)
+        assert time_to_restore['p90'] == pytest.approx(61.6)
+        assert time_to_restore['p99'] == pytest.approx(96.16)
+
+    def test_percentiles_by_platform(self, login_test_user, outage_data):
+        response = login_test_user.get('/api/metrics/by-platform?start_date=2024-01-08&end_date=2024-01-14T23:59:59')
+        assert response.get_json()[PLATFORM_NAME]['time_to_restore']['p90'] == pytest.approx(61.6)
+
+    def test_percentiles_stay_in_database(self, app, outage_data):
+        """Test the restore percentiles come back as a single aggregated row."""
+        from app.aggregates import restore_percentiles_query
+        rows = db.session.execute(restore_percentiles_query(
+            PLATFORM_NAME, (date(2024, 1, 8), date(2024, 1, 14)))).mappings().all()
+        assert len(rows) == 1
+        assert rows[0]['restore_p50'] == pytest.approx(3 * 3600)
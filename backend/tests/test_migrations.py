@@ -0,0 +1,78 @@
+from sqlalchemy import inspect
+from app import db
+from app.migrations import MIGRATIONS, current_version, upgrade
+
+
+def index_names(table):
+    return {index['name'] for index in inspect(db.engine).get_indexes(table)}
+
+
+class TestMigrations:
+    def test_models_declare_hot_filter_indexes(self, app):
+        """Test create_all builds the release and incident indexes."""
+        with app.app_context():
+            assert {'ix_release_platform_rollout_date', 'ix_release_rollout_date'} <= index_names('release')
+            assert 'ix_incident_release_id_start_time' in index_names('incident')
+
+    def test_upgrade_creates_missing_indexes(self, app):
+        """Test upgrade adds indexes to a database created before they existed."""
+        with app.app_context():
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql('DROP INDEX ix_release_platform_rollout_date')
+                connection.exec_driver_sql('DROP INDEX ix_incident_release_id_start_time')
+            assert 'ix_release_platform_rollout_date' not in index_names('release')
+
+            applied = upgrade()
+
+            assert applied == [number for number, _, _ in MIGRATIONS]
+            assert current_version() == MIGRATIONS[-1][0]
+            assert 'ix_release_platform_rollout_date' in index_names('release')
+            assert 'ix_incident_release_id_start_time' in index_names('incident')
+
+    def test_upgrade_is_idempotent(self, app):
+        """Test a second upgrade applies nothing."""
+        with app.app_context():
+            upgrade()
+            assert upgrade() == []
+
+    def test_upgrade_cli(self, app, runner):
+        """Test the flask schema commands."""
+        result = runner.invoke(args=['schema', 'upgrade'])
+        assert result.exit_code == 0
+        assert f'Schema version: {MIGRATIONS[-1][0]}' in result.output
+
+        result = runner.invoke(args=['schema', 'current'])
+        assert f'Schema version: {MIGRATIONS[-1][0]}' in result.output
+
+    def test_upgrade_backfills_incident_duration(self, app):
+        """Test upgrade adds duration_seconds to an older incident table and fills it from start/end."""
+        with app.app_context():
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql("INSERT INTO release (id, platform, rollout_date) VALUES (1, 'A', '2024-01-01')")
+                connection.exec_driver_sql('DROP INDEX ix_incident_duration_seconds')
+                connection.exec_driver_sql('ALTER TABLE incident DROP COLUMN duration_seconds')
+                connection.exec_driver_sql(
+                    "INSERT INTO incident (release_id, start_time, end_time) VALUES "
+                    "(1, '2024-01-01 10:00:00.000000', '2024-01-01 11:30:00.000000'), "
+                    "(1, '2024-01-01 10:00:00.000000', NULL)")
+
+            upgrade()
+
+            assert 'ix_incident_duration_seconds' in index_names('incident')
+            with db.engine.connect() as connection:
+                durations = connection.exec_driver_sql(
+                    'SELECT duration_seconds FROM incident ORDER BY id').scalars().all()
+            assert durations == [5400, None]
+
+    def test_upgrade_adds_incident_external_id(self, app):
+        """Test upgrade adds the unique external_id column to an older incident table."""
+        with app.app_context():
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql('DROP INDEX ux_incident_external_id')
+                connection.exec_driver_sql('ALTER TABLE incident DROP COLUMN external_id')
+
+            upgrade()
+
+            assert 'external_id' in {c['name'] for c in inspect(db.engine).get_columns('incident')}
+            unique = {index['name'] for index in inspect(db.engine).get_indexes('incident') if index['unique']}
+            assert 'ux_incident_external_id' in unique
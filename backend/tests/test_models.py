@@ -111,6 +111,28 @@ class TestModels:
             assert retrieved_incident.start_time == start_time
             assert retrieved_incident.end_time == end_time
 
+    def test_incident_duration_kept_in_sync(self, app):
+        """Test duration_seconds follows start/end on ORM inserts and updates and on Core inserts."""
+        with app.app_context():
+            release = Release(platform='Android', version='1.0.0', rollout_date=date(2024, 1, 1))
+            db.session.add(release)
+            db.session.flush()
+            incident = Incident(release_id=release.id, start_time=datetime(2024, 1, 1, 10))
+            db.session.add(incident)
+            db.session.commit()
+            assert incident.duration_seconds is None
+
+            incident.end_time = datetime(2024, 1, 1, 12, 30)
+            db.session.commit()
+            assert incident.duration_seconds == 9000
+
+            db.session.execute(Incident.__table__.insert(), [
+                {'release_id': release.id, 'start_time': datetime(2024, 1, 1), 'end_time': datetime(2024, 1, 1, 0, 1)},
+                {'release_id': release.id, 'start_time': datetime(2024, 1, 1), 'end_time': None},
+            ])
+            durations = db.session.scalars(db.select(Incident.duration_seconds).order_by(Incident.id)).all()
+            assert durations == [9000, 60, None]
+
     def test_cascade_delete(self, app):
         """Test cascade delete behavior between models."""
         with app.app_context():
@@ -0,0 +1,100 @@
+import threading
+import time
+import pytest
+from sqlalchemy import text
+from app.parallel import parallel_queries
+
+
+def query(value, delay=0.0):
+    def task(executor):
+        if delay:
+            time.sleep(delay)
+        return threading.get_ident(), executor.execute(text(f'SELECT {value}')).scalar()
+    return task
+
+
+@pytest.fixture
+def parallel(app):
+    state = app.extensions['parallel_queries']
+    state.enabled = True
+    yield state
+    parallel_queries.shutdown(app)
+
+
+def test_disabled_runs_on_session(app):
+    results = parallel_queries.run(query(1), query(2), query(3))
+    assert [value for _, value in results] == [1, 2, 3]
+    assert {thread for thread, _ in results} == {threading.get_ident()}
+
+
+def test_tasks_run_concurrently(app, parallel):
+    started = time.perf_counter()
+    results = parallel_queries.run(query(1, 0.2), query(2, 0.2), query(3, 0.2))
+    assert time.perf_counter() - started < 0.5
+    assert [value for _, value in results] == [1, 2, 3]
+    assert results[0][0] == threading.get_ident()
+    assert len({thread for thread, _ in results}) == 3
+
+
+def test_concurrency_limit(app, parallel):
+    """Test at most METRICS_QUERY_CONCURRENCY tasks of a request are in flight."""
+    parallel.concurrency = 2
+    in_flight, peak = [0], [0]
+    lock = threading.Lock()
+
+    def task(executor):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+        return executor.execute(text('SELECT 1')).scalar()
+
+    assert parallel_queries.run(*[task] * 5) == [1] * 5
+    assert peak[0] == 2
+
+    parallel.concurrency = 1
+    results = parallel_queries.run(query(1), query(2))
+    assert {thread for thread, _ in results} == {threading.get_ident()}
+
+
+def test_worker_error_propagates(app, parallel):
+    def fail(executor):
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        parallel_queries.run(query(1), fail)
+
+
+def test_failure_waits_for_running_tasks(app, parallel):
+    """Test a failing task cancels queued tasks and waits for running ones before re-raising."""
+    parallel.concurrency = 2
+    finished, started = [], []
+
+    def fail(executor):
+        time.sleep(0.05)
+        raise ValueError('boom')
+
+    def slow(executor):
+        started.append('slow')
+        time.sleep(0.2)
+        finished.append('slow')
+        return executor.execute(text('SELECT 1')).scalar()
+
+    def queued(executor):
+        started.append('queued')
+
+    with pytest.raises(ValueError):
+        parallel_queries.run(fail, slow, queued)
+    assert finished == ['slow']
+    assert started == ['slow']
+
+
+def test_worker_queries_count_in_server_timing(app, client, auth_headers, parallel):
+    app.extensions['metrics_cache'].enabled = False
+    parallel.enabled = False
+    sequential = client.get('/api/metrics/?start_date=2024-01-01&end_date=2024-01-31')
+    parallel.enabled = True
+    concurrent = client.get('/api/metrics/?start_date=2024-01-01&end_date=2024-01-31')
+    assert sequential.headers['Server-Timing'].split(';')[2] == concurrent.headers['Server-Timing'].split(';')[2]
@@ -0,0 +1,70 @@
+import os
+import signal
+from app import db, bcrypt
+from app.models import User
+from app.passwords import hash_rounds, password_hasher
+
+
+def test_hash_is_compatible_with_flask_bcrypt(app):
+    """Test hashes from the hasher verify with Flask-Bcrypt and vice versa."""
+    hashed = password_hasher.hash('secret')
+    assert hash_rounds(hashed) == 4
+    assert bcrypt.check_password_hash(hashed, 'secret')
+    assert password_hasher.check(bcrypt.generate_password_hash('other').decode('utf-8'), 'other')
+    assert not password_hasher.check(hashed, 'wrong')
+
+
+def test_process_pool_hashing(app):
+    """Test hashing through worker processes."""
+    app.extensions['password_hasher'].workers = 1
+    try:
+        hashed = password_hasher.hash('secret')
+        assert password_hasher.check(hashed, 'secret')
+    finally:
+        password_hasher.shutdown(app)
+
+
+def test_pool_recovers_from_killed_worker(app):
+    """Test a hash after a pool worker was killed runs on a fresh pool."""
+    state = app.extensions['password_hasher']
+    state.workers = 1
+    try:
+        hashed = password_hasher.hash('secret')
+        broken = state.pool
+        for pid in list(broken._processes):
+            os.kill(pid, signal.SIGKILL)
+        assert password_hasher.check(hashed, 'secret')
+        assert state.pool is not broken
+    finally:
+        password_hasher.shutdown(app)
+
+
+def test_login_rejected_when_queue_is_full(app, client, test_user):
+    """Test logins get 503 with Retry-After while all hashing slots are taken."""
+    state = app.extensions['password_hasher']
+    depth = app.config['PASSWORD_HASH_QUEUE_DEPTH']
+    for _ in range(depth):
+        state.slots.acquire()
+    try:
+        response = client.post('/api/auth/login', json={'username': 'testuser', 'password': 'password123'})
+    finally:
+        for _ in range(depth):
+            state.slots.release()
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '2'
+    assert state.rejected == 1
+
+    response = client.post('/api/auth/login', json={'username': 'testuser', 'password': 'password123'})
+    assert response.status_code == 200
+
+
+def test_login_rehashes_on_cost_change(app, client, test_user):
+    """Test a login upgrades hashes made with a different work factor."""
+    app.extensions['password_hasher'].rounds = 5
+    response = client.post('/api/auth/login', json={'username': 'testuser', 'password': 'password123'})
+    assert response.status_code == 200
+
+    user = db.session.get(User, test_user)
+    db.session.refresh(user)
+    assert hash_rounds(user.password_hash) == 5
+    assert password_hasher.check(user.password_hash, 'password123')
@@ -0,0 +1,51 @@
+import random
+import pytest
+from app.pool import PoolStats
+from app.quantiles import P2Quantile, QuantileSummary, nearest_rank
+
+
+def exact_quantile(values, q):
+    ordered = sorted(values)
+    return ordered[int(q * (len(ordered) - 1))]
+
+
+@pytest.mark.parametrize('q', [0.5, 0.9, 0.99])
+def test_p2_tracks_exact_quantile(q):
+    """Test the P² estimate stays within 2% of the exact quantile on skewed data."""
+    rng = random.Random(7)
+    values = [rng.lognormvariate(3, 1) for _ in range(50000)]
+    estimator = P2Quantile(q)
+    for value in values:
+        estimator.add(value)
+    assert estimator.value() == pytest.approx(exact_quantile(values, q), rel=0.02)
+
+
+def test_small_samples_are_exact():
+    """Test up to five samples are interpolated exactly."""
+    estimator = P2Quantile(0.5)
+    assert estimator.value() == 0.0
+    for value in (5, 1, 3, 4):
+        estimator.add(value)
+    assert estimator.value() == 3.5
+
+
+def test_summary_feeds_every_quantile():
+    summary = QuantileSummary((0.5, 0.9))
+    for value in range(1, 1001):
+        summary.add(value)
+    assert summary.count == 1000
+    assert summary.quantile(0.5) == pytest.approx(500, rel=0.01)
+    assert summary.quantile(0.9) == pytest.approx(900, rel=0.01)
+
+
+def test_nearest_rank():
+    """Test small samples report the upper value for high quantiles, never one below the median."""
+    assert nearest_rank([1.0, 2.0], 0.95) == 2.0
+    assert nearest_rank([1.0, 2.0], 0.5) == 1.0
+    assert nearest_rank(list(range(1, 101)), 0.95) == 95
+    assert nearest_rank([3.0], 0.01) == 3.0
+
+    stats = PoolStats()
+    stats.record_wait(0.001)
+    stats.record_wait(0.004)
+    assert stats.snapshot()['checkout_ms']['p95'] == 4.0
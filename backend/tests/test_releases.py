@@ -1,6 +1,10 @@
+import csv
+import gzip
+import io
+import json
 import pytest
 from datetime import datetime, timedelta
-from app.models import Release
+from app.models import Release, Incident
 from app import db
 
 # @pytest.fixture
@@ -167,3 +171,224 @@ class TestReleases:
         """Test deleting non-existent release."""
         response = client.delete('/api/releases/9999', headers=admin_headers)
         assert response.status_code == 404
+
+
+class TestReleasePagination:
+    @pytest.fixture
+    def many_releases(self, app):
+        with app.app_context():
+            base = datetime(2024, 1, 1)
+            for i in range(7):
+                # two releases share each date so the id tie-breaker is exercised
+                db.session.add(Release(platform='TestPlatform', release_type='feature', is_successful=True,
+                                       version=f'1.{i}.0', rollout_date=base + timedelta(days=i // 2),
+                                       mcm_link=f'https://mcm/{i}'))
+            db.session.commit()
+
+    def test_pages_follow_cursor(self, client, auth_headers, many_releases):
+        """Test keyset pages cover every release exactly once, newest first."""
+        seen = []
+        url = '/api/releases/?limit=3'
+        pages = 0
+        while url:
+            response = client.get(url, headers=auth_headers)
+            assert response.status_code == 200
+            page = response.get_json()
+            assert len(page) <= 3
+            seen.extend(page)
+            pages += 1
+            cursor = response.headers.get('X-Next-Cursor')
+            url = f'/api/releases/?limit=3&cursor={cursor}' if cursor else None
+
+        assert pages == 3
+        assert len({r['id'] for r in seen}) == 7
+        keys = [(r['rollout_date'], r['id']) for r in seen]
+        assert keys == sorted(keys, reverse=True)
+
+    def test_limit_is_capped(self, app, client, auth_headers, many_releases):
+        """Test the page size never exceeds RELEASES_MAX_PAGE_SIZE."""
+        app.config['RELEASES_MAX_PAGE_SIZE'] = 2
+        response = client.get('/api/releases/?limit=50', headers=auth_headers)
+        assert len(response.get_json()) == 2
+        assert 'X-Next-Cursor' in response.headers
+
+    def test_invalid_limit_and_cursor(self, client, auth_headers):
+        """Test malformed paging parameters are rejected."""
+        for limit in ('0', '-5', 'abc', '1.5'):
+            response = client.get(f'/api/releases/?limit={limit}', headers=auth_headers)
+            assert response.status_code == 400
+            assert response.get_json()['error'] == 'Invalid limit'
+
+        response = client.get('/api/releases/?cursor=not-a-cursor', headers=auth_headers)
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'Invalid cursor'
+
+    def test_field_projection(self, client, auth_headers, many_releases):
+        """Test fields= returns only the requested keys."""
+        response = client.get('/api/releases/?fields=platform,version', headers=auth_headers)
+        assert response.status_code == 200
+        releases = response.get_json()
+        assert len(releases) == 7
+        assert all(set(r) == {'platform', 'version'} for r in releases)
+
+    def test_unknown_field(self, client, auth_headers):
+        """Test fields= rejects columns that are not part of a release."""
+        response = client.get('/api/releases/?fields=platform,password_hash', headers=auth_headers)
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'Unknown fields: password_hash'
+
+
+class TestReleaseExport:
+    @pytest.fixture
+    def export_data(self, app):
+        with app.app_context():
+            for i, platform in enumerate(['Android', 'Android', 'Roku']):
+                release = Release(platform=platform, release_type='feature', is_successful=i != 1,
+                                  version=f'2.{i}.0', rollout_date=datetime(2024, 2, 1 + i))
+                db.session.add(release)
+                db.session.flush()
+                if i == 1:
+                    db.session.add(Incident(release_id=release.id, external_id='PD-7',
+                                            start_time=datetime(2024, 2, 2, 10), end_time=datetime(2024, 2, 2, 12),
+                                            duration_seconds=7200, description='Crash, rollback'))
+            db.session.commit()
+
+    def test_export_ndjson(self, app, client, auth_headers, export_data):
+        """Test NDJSON export streams one release per line."""
+        app.config['EXPORT_BATCH_SIZE'] = 2
+        response = client.get('/api/releases/export?platform=Android', headers=auth_headers)
+        assert response.status_code == 200
+        assert response.mimetype == 'application/x-ndjson'
+        rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert [r['version'] for r in rows] == ['2.0.0', '2.1.0']
+        assert rows[0]['rollout_date'] == '2024-02-01'
+
+    def test_export_csv(self, client, auth_headers, export_data):
+        """Test CSV export has a header row and honours the date filters."""
+        response = client.get('/api/releases/export?format=csv&start_date=2024-02-02', headers=auth_headers)
+        assert response.status_code == 200
+        rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+        assert rows[0][:3] == ['id', 'platform', 'version']
+        assert [r[2] for r in rows[1:]] == ['2.1.0', '2.2.0']
+
+    def test_export_gzip(self, client, auth_headers, export_data):
+        """Test the export is gzip-compressed when the client accepts it."""
+        response = client.get('/api/releases/export',
+                              headers={**auth_headers, 'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        lines = gzip.decompress(response.get_data()).decode().splitlines()
+        assert len(lines) == 3
+
+    def test_export_incidents(self, client, auth_headers, export_data):
+        """Test incident export includes the release platform, external id and duration."""
+        response = client.get('/api/releases/export/incidents?format=csv', headers=auth_headers)
+        rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+        assert rows[0] == ['id', 'external_id', 'release_id', 'platform', 'start_time', 'end_time',
+                           'duration_seconds', 'description']
+        assert rows[1][3:] == ['Android', '2024-02-02T10:00:00', '2024-02-02T12:00:00', '7200.0', 'Crash, rollback']
+        assert rows[1][1] == 'PD-7'
+
+        response = client.get('/api/releases/export/incidents', headers=auth_headers)
+        [incident] = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        assert (incident['external_id'], incident['duration_seconds']) == ('PD-7', 7200)
+
+    def test_export_invalid_format(self, client, auth_headers):
+        """Test unknown export formats are rejected."""
+        response = client.get('/api/releases/export?format=xml', headers=auth_headers)
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'Invalid format, expected one of ndjson, csv'
+
+
+class TestBulkReleases:
+    def test_add_release_missing_fields(self, client, admin_headers):
+        """Test single release creation reports missing fields instead of failing."""
+        response = client.post('/api/releases/', json={'platform': 'TestPlatform'}, headers=admin_headers)
+        assert response.status_code == 400
+        json_data = response.get_json()
+        assert json_data['error'] == 'Invalid release'
+        assert 'version is required' in json_data['details']
+
+    def test_bulk_json_array(self, client, admin_headers):
+        """Test bulk creation of releases with nested incidents."""
+        payload = [
+            {'platform': f'P{i % 3}', 'release_type': 'feature', 'is_successful': i != 2,
+             'version': f'7.{i}.0', 'rollout_date': '2024-03-01'}
+            for i in range(5)
+        ]
+        payload[2]['incidents'] = [{'start_time': '2024-03-01T10:00:00Z', 'end_time': '2024-03-01T11:30:00Z',
+                                    'description': 'Rollback'}]
+        response = client.post('/api/releases/bulk', json=payload, headers=admin_headers)
+        assert response.status_code == 201
+        results = response.get_json()['results']
+        assert [r['status'] for r in results] == ['created'] * 5
+
+        with client.application.app_context():
+            failed = db.session.get(Release, results[2]['id'])
+            assert failed.version == '7.2.0'
+            assert failed.rollout_date.isoformat() == '2024-03-01'
+            assert len(failed.incident) == 1
+            assert failed.incident[0].start_time == datetime(2024, 3, 1, 10)
+
+    def test_bulk_ndjson(self, app, client, admin_headers):
+        """Test bulk creation from an NDJSON body spanning several chunks."""
+        app.config['BULK_CHUNK_SIZE'] = 2
+        body = '\n'.join(json.dumps({'platform': 'Roku', 'release_type': 'patch', 'is_successful': True,
+                                     'version': f'8.{i}.0'}) for i in range(5))
+        response = client.post('/api/releases/bulk', data=body,
+                               headers={'Content-Type': 'application/x-ndjson'})
+        assert response.status_code == 201
+        ids = [r['id'] for r in response.get_json()['results']]
+        assert ids == sorted(ids) and len(set(ids)) == 5
+        with client.application.app_context():
+            versions = [db.session.get(Release, i).version for i in ids]
+            assert versions == [f'8.{i}.0' for i in range(5)]
+
+    def test_bulk_invalid_items_create_nothing(self, client, admin_headers):
+        """Test a batch with an invalid item is rejected as a whole."""
+        payload = [
+            {'platform': 'Roku', 'release_type': 'patch', 'is_successful': True, 'version': '9.0.0'},
+            {'platform': 'Roku', 'release_type': 'patch', 'is_successful': 'yes', 'version': '9.1.0',
+             'incidents': [{'start_time': 'yesterday'}]},
+        ]
+        response = client.post('/api/releases/bulk', json=payload, headers=admin_headers)
+        assert response.status_code == 400
+        results = response.get_json()['results']
+        assert results[0] == {'index': 0, 'status': 'valid'}
+        assert results[1]['errors'] == ['is_successful must be a boolean',
+                                         'incidents: start_time must be an ISO-8601 timestamp']
+        with client.application.app_context():
+            assert Release.query.count() == 0
+
+    def test_bulk_rejects_non_array(self, client, admin_headers):
+        """Test the bulk endpoint requires an array."""
+        response = client.post('/api/releases/bulk', json={'platform': 'Roku'}, headers=admin_headers)
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'Invalid bulk payload: expected a JSON array of releases'
+
+    def test_bulk_unauthorized(self, client, auth_headers):
+        """Test bulk creation requires write privileges."""
+        response = client.post('/api/releases/bulk', json=[], headers=auth_headers)
+        assert response.status_code == 403
+
+    def test_releases_with_commits(self, client, admin_headers):
+        """Test single and bulk creation store commit timestamps."""
+        release = {'platform': 'Roku', 'release_type': 'patch', 'is_successful': True, 'version': '10.0.0',
+                   'rollout_date': '2024-03-02',
+                   'commits': [{'sha': 'a' * 40, 'committed_at': '2024-03-01T12:00:00Z'}]}
+        assert client.post('/api/releases/', json=release, headers=admin_headers).status_code == 201
+        response = client.post('/api/releases/bulk', json=[dict(release, version='10.1.0'),
+                                                           dict(release, version='10.2.0', commits=[])])
+        assert response.status_code == 201
+
+        with client.application.app_context():
+            counts = {r.version: len(r.commits) for r in Release.query.all()}
+            assert counts == {'10.0.0': 1, '10.1.0': 1, '10.2.0': 0}
+            assert Release.query.first().commits[0].committed_at == datetime(2024, 3, 1, 12)
+
+    def test_invalid_commits(self, client, admin_headers):
+        """Test malformed commits are reported with the other validation errors."""
+        release = {'platform': 'Roku', 'release_type': 'patch', 'is_successful': True, 'version': '10.0.0',
+                   'commits': [{'sha': 'abc'}]}
+        response = client.post('/api/releases/', json=release, headers=admin_headers)
+        assert response.status_code == 400
+        assert response.get_json()['details'] == ['commits: committed_at must be an ISO-8601 timestamp']
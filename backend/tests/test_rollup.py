@@ -0,0 +1,138 @@
+import pytest
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from app import db
+from app.cache import metrics_cache
+from app.conditional import get_data_versions
+from app.models import DailyPlatformStats, Release
+from app.rollup import METRICS_TABLES, lock_rollup_keys, rebuild_rollup, refresh_rollup, rollup_lock_id, verify_rollup
+
+
+def rollup_rows():
+    return {(row.platform, row.day): (row.deploy_count, row.failed_count, row.incident_count,
+                                      round(row.restore_seconds), row.restore_count)
+            for row in DailyPlatformStats.query.all()}
+
+
+class TestRollup:
+    def test_write_paths_maintain_rollup(self, app, client, admin_headers, release_payload):
+        """Test add, bulk, update and delete keep daily_platform_stats in sync."""
+        client.post('/api/releases/', json=dict(release_payload, rollout_date='2024-05-01'), headers=admin_headers)
+        client.post('/api/releases/bulk', json=[
+            dict(release_payload, rollout_date='2024-05-01', is_successful=False,
+                 incidents=[{'start_time': '2024-05-01T10:00:00', 'end_time': '2024-05-01T10:30:00'}]),
+            dict(release_payload, platform='Roku', rollout_date='2024-05-02'),
+        ], headers=admin_headers)
+
+        with app.app_context():
+            assert rollup_rows() == {
+                ('Android', date(2024, 5, 1)): (2, 1, 1, 1800, 1),
+                ('Roku', date(2024, 5, 2)): (1, 0, 0, 0, 0),
+            }
+            roku_id = Release.query.filter_by(platform='Roku').one().id
+            failed_id = Release.query.filter_by(is_successful=False).one().id
+
+        client.put(f'/api/releases/{roku_id}', json={'platform': 'Android'}, headers=admin_headers)
+        client.delete(f'/api/releases/{failed_id}', headers=admin_headers)
+
+        with app.app_context():
+            assert rollup_rows() == {
+                ('Android', date(2024, 5, 1)): (1, 0, 0, 0, 0),
+                ('Android', date(2024, 5, 2)): (1, 0, 0, 0, 0),
+            }
+            assert verify_rollup() == []
+
+    def test_refresh_upserts_existing_rows(self, app, release_payload):
+        """Test refresh updates rows another writer already stored and deletes emptied keys."""
+        with app.app_context():
+            db.session.add(Release(**dict(release_payload, rollout_date=date(2024, 5, 1))))
+            db.session.add_all([DailyPlatformStats(platform='Android', day=date(2024, 5, 1), deploy_count=7),
+                                DailyPlatformStats(platform='Android', day=date(2024, 5, 2), deploy_count=3)])
+            db.session.commit()
+
+            refresh_rollup([('Android', date(2024, 5, 1)), ('Android', date(2024, 5, 2))])
+            db.session.commit()
+            assert rollup_rows() == {('Android', date(2024, 5, 1)): (1, 0, 0, 0, 0)}
+
+    def test_refresh_locks_keys_on_postgresql(self):
+        """Test each touched key takes one advisory lock, in id order, before it is recomputed."""
+        keys = [('Android', date(2024, 5, 1)), ('iOS', date(2024, 5, 1)), ('Android', date(2024, 5, 1))]
+        executed = []
+        executor = SimpleNamespace(dialect=SimpleNamespace(name='postgresql'), execute=executed.append)
+        lock_rollup_keys(executor, keys)
+        lock_ids = [next(iter(stmt.compile().params.values())) for stmt in executed]
+        assert lock_ids == sorted({rollup_lock_id(key) for key in keys})
+        assert all('pg_advisory_xact_lock' in str(stmt) for stmt in executed)
+
+        executed.clear()
+        lock_rollup_keys(SimpleNamespace(dialect=SimpleNamespace(name='sqlite'), execute=executed.append), keys)
+        assert executed == []
+
+    def test_verify_detects_drift_and_rebuild_repairs(self, app):
+        """Test verify reports rows written behind the rollup's back and rebuild fixes them."""
+        with app.app_context():
+            db.session.add(Release(platform='Xbox', release_type='feature', version='1.0.0',
+                                   is_successful=True, rollout_date=date(2024, 1, 1)))
+            db.session.commit()
+            mismatches = verify_rollup()
+            assert [m['platform'] for m in mismatches] == ['Xbox']
+
+            assert rebuild_rollup() == 1
+            db.session.commit()
+            assert verify_rollup() == []
+
+    def test_rollup_cli(self, app, runner):
+        """Test the flask rollup commands."""
+        with app.app_context():
+            db.session.add(Release(platform='Xbox', release_type='feature', version='1.0.0',
+                                   is_successful=True, rollout_date=date(2024, 1, 1)))
+            db.session.commit()
+
+        result = runner.invoke(args=['rollup', 'verify'])
+        assert result.exit_code != 0
+        assert '1 rollup rows differ' in result.output
+
+        with app.app_context():
+            metrics_cache.get_or_compute('m', {}, (None, None, None), lambda: 1)
+            before = get_data_versions(METRICS_TABLES)
+        assert 'Rebuilt 1 rollup rows' in runner.invoke(args=['rollup', 'rebuild']).output
+        assert 'Rollup is consistent' in runner.invoke(args=['rollup', 'verify']).output
+        with app.app_context():
+            after = get_data_versions(METRICS_TABLES)
+            assert all(after[table] == before.get(table, 0) + 1 for table in METRICS_TABLES)
+            assert metrics_cache.stats()['entries'] == 0
+
+    def test_rollup_engine_matches_sql(self, app, client, admin_headers, release_payload):
+        """Test the rollup engine returns the same metrics as the raw SQL engine."""
+        today = datetime.utcnow().date()
+        payload = []
+        for offset in range(20):
+            day = today - timedelta(days=offset)
+            item = dict(release_payload, platform=('Android', 'Roku')[offset % 2], version=f'1.{offset}.0',
+                        rollout_date=day.isoformat(), is_successful=offset % 3 != 0)
+            if not item['is_successful']:
+                started = datetime.combine(day, datetime.min.time()) + timedelta(hours=1)
+                item['incidents'] = [{'start_time': started.isoformat(),
+                                      'end_time': (started + timedelta(minutes=30 + offset)).isoformat()}]
+            payload.append(item)
+        assert client.post('/api/releases/bulk', json=payload, headers=admin_headers).status_code == 201
+
+        # end dates cover whole days: the rollup does not clip incidents to the request window
+        queries = ['', 'platform=Roku',
+                   f'start_date={today - timedelta(days=6)}&end_date={today}T23:59:59',
+                   f'platform=Android&start_date={today - timedelta(days=9)}&end_date={today - timedelta(days=1)}T23:59:59']
+        for query in queries:
+            results = {}
+            for engine in ('sql', 'rollup'):
+                app.config['METRICS_ENGINE'] = engine
+                results[engine] = client.get(f'/api/metrics/?{query}').get_json()
+            for name in ('deployment_frequency', 'lead_time', 'change_failure_rate', 'time_to_restore'):
+                for field in ('value', 'trend'):
+                    assert results['rollup'][name][field] == pytest.approx(results['sql'][name][field], rel=1e-6)
+
+        volumes = {}
+        for engine in ('sql', 'rollup'):
+            app.config['METRICS_ENGINE'] = engine
+            volumes[engine] = client.get(f'/api/metrics/deployment-volume?start_date={today - timedelta(days=5)}') \
+                .get_json()
+        assert volumes['rollup'] == volumes['sql']
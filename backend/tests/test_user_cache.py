@@ -0,0 +1,113 @@
+import pytest
+from sqlalchemy import event
+from flask import session
+from app import db
+from app.cache import LRUTTLBackend
+from app.user_cache import SESSION_KEY, UserCacheState, user_cache
+
+
+@pytest.fixture
+def queries(app):
+    """Record every statement sent to the database."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+def test_load_caches_user(app, test_user, queries):
+    """Test repeated loads read the user and its data version once."""
+    for _ in range(3):
+        with app.test_request_context():
+            user = user_cache.load(test_user)
+            assert (user.username, user.role, user.is_authenticated) == ('testuser', 'user', True)
+    assert len(queries) == 2
+
+
+def test_version_rechecked_after_interval(app, test_user, queries):
+    """Test the shared data version is read again once the check interval has passed."""
+    app.extensions['user_cache'].version_interval = 0
+    for _ in range(3):
+        with app.test_request_context():
+            user_cache.load(test_user)
+    assert sum('FROM data_version' in statement for statement in queries) == 3
+    assert sum('FROM user' in statement for statement in queries) == 1
+
+
+def test_session_snapshot_survives_cold_cache(app, test_user, queries):
+    """Test a process with an empty cache trusts the signed session snapshot."""
+    with app.test_request_context():
+        user_cache.load(test_user)
+        snapshot = session[SESSION_KEY]
+
+    app.extensions['user_cache'].backend.clear()
+    with app.test_request_context():
+        session[SESSION_KEY] = snapshot
+        assert user_cache.load(test_user).username == 'testuser'
+    assert len(queries) == 2
+
+
+def test_expired_snapshot_reloads_user(app, test_user, queries):
+    """Test snapshots older than the TTL go back to the database."""
+    app.extensions['user_cache'].ttl = 0
+    for _ in range(2):
+        with app.test_request_context():
+            user_cache.load(test_user)
+    assert len(queries) == 3
+
+
+def test_update_user_invalidates_snapshot(app, client, admin_headers, test_user):
+    """Test a role change rejects cached entries and older session snapshots."""
+    with app.test_request_context():
+        assert user_cache.load(test_user).role == 'user'
+        stale = session[SESSION_KEY]
+
+    assert client.put(f'/api/users/{test_user}', json={'role': 'writer'}).status_code == 200
+
+    with app.test_request_context():
+        session[SESSION_KEY] = stale
+        assert user_cache.load(test_user).role == 'writer'
+
+
+def test_invalidation_reaches_other_processes(app, client, admin_headers, test_user):
+    """Test entries cached by a process that never saw the change are rejected once it commits."""
+    with app.test_request_context():
+        user_cache.load(test_user)
+    backend = app.extensions['user_cache'].backend
+    stale = backend.get(str(test_user))
+
+    assert client.put(f'/api/users/{test_user}', json={'role': 'writer'}).status_code == 200
+
+    # Another worker has its own cache, still holding the old entry
+    other = UserCacheState(LRUTTLBackend(16), 3600, True)
+    other.backend.set(str(test_user), stale, 3600)
+    app.extensions['user_cache'] = other
+    with app.test_request_context():
+        assert user_cache.load(test_user).role == 'writer'
+
+
+def test_delete_user_invalidates(app, client, admin_headers, test_user):
+    """Test a deleted account can no longer be loaded."""
+    with app.test_request_context():
+        assert user_cache.load(test_user) is not None
+
+    assert client.delete(f'/api/users/{test_user}').status_code == 200
+
+    with app.test_request_context():
+        assert user_cache.load(test_user) is None
+
+
+def test_login_and_logout_manage_snapshot(client, test_user):
+    """Test login stores a session snapshot and logout removes it."""
+    client.post('/api/auth/login', json={'username': 'testuser', 'password': 'password123'})
+    with client.session_transaction() as sess:
+        assert sess[SESSION_KEY]['username'] == 'testuser'
+
+    client.post('/api/auth/logout')
+    with client.session_transaction() as sess:
+        assert SESSION_KEY not in sess
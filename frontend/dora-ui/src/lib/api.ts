@@ -21,6 +21,28 @@ export interface CreateReleaseData {
   mcm_link?: string;
   ci_job_link?: string;
   commit_list_link?: string;
+  commits?: Array<{ sha?: string; committed_at: string }>;
+}
+
+export interface Incident {
+  id: number;
+  release_id: number;
+  external_id: string | null;
+  start_time: string | null;
+  end_time: string | null;
+  duration_seconds: number | null;
+  description: string | null;
+}
+
+export type CreateIncidentData = Omit<Incident, 'id' | 'duration_seconds' | 'external_id'> & { external_id?: string };
+
+export type IncidentEvent = (CreateIncidentData & { op?: 'upsert' }) | { op: 'close'; external_id: string; end_time: string };
+
+export interface IncidentBatchResult {
+  index: number;
+  status: 'created' | 'updated' | 'closed' | 'valid' | 'invalid';
+  id?: number;
+  errors?: string[];
 }
 
 export interface LoginResponse {
@@ -45,11 +67,16 @@ export interface MetricsData {
     value: number;
     trend: number;
     history: Array<{ date: string; value: number }>;
+    p50: number;
+    p90: number;
   };
   time_to_restore: {
     value: number;
     trend: number;
     history: Array<{ date: string; value: number }>;
+    p50: number;
+    p90: number;
+    p99: number;
   };
   change_failure_rate: {
     value: number;
@@ -58,6 +85,24 @@ export interface MetricsData {
   };
 }
 
+export type Granularity = 'day' | 'week' | 'month';
+
+export interface MetricsHistory {
+  granularity: Granularity;
+  buckets: string[];
+  deployment_frequency: number[];
+  lead_time: number[];
+  change_failure_rate: number[];
+  time_to_restore: number[];
+}
+
+// series[platform][i] is the number of releases on dates[i]
+export interface DeploymentVolumeColumns {
+  dates: string[];
+  platforms: string[];
+  series: Record<string, number[]>;
+}
+
 const api = axios.create({
   baseURL: import.meta.env.VITE_API_URL,
   withCredentials: true,
@@ -107,8 +152,16 @@ export const auth = {
 // Releases endpoints
 export const releases = {
   getAll: async (): Promise<Release[]> => {
-    const response = await api.get<Release[]>('releases/');
-    return response.data;
+    const all: Release[] = [];
+    let cursor: string | undefined;
+    do {
+      const response = await api.get<Release[]>('releases/', {
+        params: { limit: 1000, cursor }
+      });
+      all.push(...response.data);
+      cursor = response.headers['x-next-cursor'];
+    } while (cursor);
+    return all;
   },
   create: async (data: CreateReleaseData): Promise<Release> => {
     const response = await api.post<Release>('releases/', data);
@@ -123,6 +176,29 @@ export const releases = {
   },
 };
 
+// Incidents endpoints
+export const incidents = {
+  list: async (params: { release_id?: number; platform?: string; open?: boolean; limit?: number; cursor?: string } = {}) => {
+    const response = await api.get<Incident[]>('incidents/', { params });
+    return { incidents: response.data, nextCursor: response.headers['x-next-cursor'] as string | undefined };
+  },
+  create: async (data: CreateIncidentData): Promise<Incident> => {
+    const response = await api.post<Incident>('incidents/', data);
+    return response.data;
+  },
+  update: async (id: number, data: Partial<CreateIncidentData>): Promise<Incident> => {
+    const response = await api.put<Incident>(`incidents/${id}`, data);
+    return response.data;
+  },
+  delete: async (id: number): Promise<void> => {
+    await api.delete(`incidents/${id}`);
+  },
+  batch: async (events: IncidentEvent[]): Promise<IncidentBatchResult[]> => {
+    const response = await api.post<{ message: string; results: IncidentBatchResult[] }>('incidents/batch', events);
+    return response.data.results;
+  },
+};
+
 // Metrics endpoints
 export const metrics = {
   get: async (start_date: string, end_date: string): Promise<MetricsData> => {
@@ -145,6 +221,24 @@ export const metrics = {
   });
   return response.data;
 },
+  getDeploymentVolumeColumns: async (start_date: string, end_date: string): Promise<DeploymentVolumeColumns> => {
+    const response = await api.get<DeploymentVolumeColumns>('metrics/deployment-volume', {
+      params: { start_date, end_date, format: 'columnar' }
+    });
+    return response.data;
+  },
+  getHistory: async (start_date: string, end_date: string, granularity: Granularity = 'week'): Promise<MetricsHistory> => {
+    const response = await api.get<MetricsHistory>('metrics/history', {
+      params: { start_date, end_date, granularity }
+    });
+    return response.data;
+  },
+  getByPlatform: async (start_date: string, end_date: string, platforms?: string[]): Promise<Record<string, MetricsData>> => {
+    const response = await api.get<Record<string, MetricsData>>('metrics/by-platform', {
+      params: { start_date, end_date, platforms: platforms?.join(',') }
+    });
+    return response.data;
+  },
 
 };
 